@@ -1,15 +1,43 @@
+import os
+
 from django.apps import AppConfig as BaseAppConfig
 from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.utils import ConnectionDoesNotExist
 from django.db.backends.signals import connection_created
 from django.utils.translation import ugettext_lazy as _
 
 
+# NOTE: Set by `prepare_atlas_db` while it builds the ATLAS database in a
+# sibling file; processes that load settings from scratch (e.g. "spawn"-started
+# ProcessPoolExecutor workers) would otherwise open the existing database
+BUILD_DB_PATH_ENV_VAR = "SV_ATLAS_BUILD_DB_PATH"
+
+
 class AppConfig(BaseAppConfig):
 
     name = "scaife_viewer.atlas"
     label = "scaife_viewer_atlas"
     verbose_name = _("Scaife Viewer ATLAS")
 
+    def ready(self):
+        use_build_db_path()
+
+
+def use_build_db_path():
+    """
+    Points the ATLAS database at the path in `BUILD_DB_PATH_ENV_VAR`, if set
+    """
+    from .conf import settings  # noqa; avoids race condition
+
+    build_path = os.environ.get(BUILD_DB_PATH_ENV_VAR)
+    if not build_path:
+        return
+    db_settings = settings.DATABASES.get(settings.SV_ATLAS_DB_LABEL)
+    if db_settings is not None:
+        db_settings["NAME"] = build_path
+
 
 def tweak_sqlite_pragma(sender, connection, **kwargs):
     """
@@ -29,4 +57,43 @@ def tweak_sqlite_pragma(sender, connection, **kwargs):
         cursor.execute("PRAGMA case_sensitive_like=ON;")
 
 
+def get_db_file_identity(path):
+    """
+    Returns the inode and modification time of an SQLite database file,
+    which change when `prepare_atlas_db` swaps in a new database
+    """
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError, ValueError):
+        return None
+    return (stat.st_ino, stat.st_mtime_ns)
+
+
+def record_db_file_identity(sender, connection, **kwargs):
+    if connection.vendor == "sqlite" and connection.alias == settings.SV_ATLAS_DB_LABEL:
+        connection.atlas_db_file_identity = get_db_file_identity(
+            connection.settings_dict["NAME"]
+        )
+
+
+def reopen_swapped_atlas_db(sender, **kwargs):
+    """
+    Closes the ATLAS connection if the database file has been replaced since
+    it was opened; the connection is reopened lazily by the next query
+    """
+    try:
+        connection = connections[settings.SV_ATLAS_DB_LABEL]
+    except ConnectionDoesNotExist:
+        return
+    if connection.vendor != "sqlite" or connection.connection is None:
+        return
+    identity = get_db_file_identity(connection.settings_dict["NAME"])
+    if identity is None:
+        return
+    if identity != getattr(connection, "atlas_db_file_identity", None):
+        connection.close()
+
+
 connection_created.connect(tweak_sqlite_pragma)
+connection_created.connect(record_db_file_identity)
+request_started.connect(reopen_swapped_atlas_db)
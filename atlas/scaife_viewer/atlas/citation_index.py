@@ -0,0 +1,147 @@
+import functools
+from array import array
+
+from django.db import connections, router
+
+from scaife_viewer.atlas.conf import settings
+
+from .models import Node
+
+
+class CitationIndex:
+    """
+    A compact, in-memory index of the text parts within a version,
+    stored as arrays in document (`path`) order.
+
+    Used to resolve passage references to `idx` and `pk` ranges
+    without querying the database.
+    """
+
+    def __init__(self, rows):
+        self.refs = []
+        self.idx = array("q")
+        self.pk = array("q")
+        self.rank = array("h")
+        self.depth = array("h")
+        for ref, idx, pk, rank, depth in rows:
+            self.refs.append(ref)
+            self.idx.append(-1 if idx is None else idx)
+            self.pk.append(pk)
+            self.rank.append(rank or 0)
+            self.depth.append(depth)
+        self.positions = {ref: pos for pos, ref in enumerate(self.refs)}
+        self.ends = self.get_subtree_ends(self.depth)
+
+    @classmethod
+    def build(cls, version_urn):
+        # NOTE: A single query for every text part within the version
+        rows = (
+            Node.objects.filter(urn__startswith=version_urn)
+            .exclude(urn=version_urn)
+            .order_by("path")
+            .values_list("ref", "idx", "pk", "rank", "depth")
+        )
+        return cls(rows)
+
+    @staticmethod
+    def get_subtree_ends(depths):
+        """
+        Returns the position following the last descendant of each text part
+        """
+        ends = array("q", [len(depths)] * len(depths))
+        stack = []
+        for pos, depth in enumerate(depths):
+            while stack and depths[stack[-1]] >= depth:
+                ends[stack.pop()] = pos
+            stack.append(pos)
+        return ends
+
+    def __len__(self):
+        return len(self.refs)
+
+    def get_pk(self, ref):
+        pos = self.positions.get(ref)
+        if pos is None:
+            return None
+        return self.pk[pos]
+
+    def find_depth(self, positions, depth):
+        return next((p for p in positions if self.depth[p] == depth), None)
+
+    def get_lowest_range(self, ref, lowest_depth):
+        """
+        Returns the positions of the first and last text parts at
+        `lowest_depth` within the text part identified by `ref`
+        """
+        pos = self.positions.get(ref)
+        if pos is None or self.depth[pos] > lowest_depth:
+            return None
+        if self.depth[pos] == lowest_depth:
+            return pos, pos
+
+        end = self.ends[pos]
+        first = self.find_depth(range(pos + 1, end), lowest_depth)
+        if first is None:
+            return None
+        last = self.find_depth(range(end - 1, first - 1, -1), lowest_depth)
+        return first, last
+
+    def get_idx_range(self, ref, lowest_depth):
+        """
+        Resolves a passage `ref` (e.g. `1.1-1.7`) to the minimum and maximum
+        `idx` of the text parts at `lowest_depth` that it spans.
+
+        Mirrors `build_textpart_predicate` and `filter_via_ref_predicate`:
+        an empty `ref` spans the whole version, and the range spans the
+        start or end text parts that exist.
+        """
+        if not ref:
+            first = self.find_depth(range(len(self)), lowest_depth)
+            if first is None:
+                return None
+            last = self.find_depth(range(len(self) - 1, first - 1, -1), lowest_depth)
+            return self.idx[first], self.idx[last]
+
+        try:
+            start, end = ref.split("-")
+        except ValueError:
+            start = end = ref
+        if not start or not end:
+            raise ValueError(f"Invalid reference: {ref}")
+
+        idxs = []
+        for value in [start, end]:
+            positions = self.get_lowest_range(value, lowest_depth)
+            if positions:
+                idxs.extend(self.idx[p] for p in positions)
+        if not idxs:
+            return None
+        return min(idxs), max(idxs)
+
+
+def get_db_identity():
+    """
+    Returns the identity of the ATLAS database file, which changes when
+    `prepare_atlas_db` swaps in a new database
+    """
+    connection = connections[router.db_for_read(Node)]
+    # NOTE: Opens the connection (without querying), so that the identity is
+    # that of the database used by any subsequent queries
+    connection.ensure_connection()
+    return getattr(connection, "atlas_db_file_identity", None)
+
+
+@functools.lru_cache(maxsize=settings.SV_ATLAS_CITATION_INDEX_CACHE_SIZE)
+def _get_citation_index(version_urn, db_identity):
+    return CitationIndex.build(version_urn)
+
+
+def get_citation_index(version):
+    """
+    Returns the (cached) citation index for `version`
+    """
+    return _get_citation_index(version.urn, get_db_identity())
+
+
+def clear_citation_index_cache():
+    _get_citation_index.cache_clear()
@@ -37,17 +37,35 @@ class ATLASAppConf(AppConf):
     # Data model
     DATA_DIR = None
     INGESTION_CONCURRENCY = None
+    INGESTION_NODE_FLUSH_THRESHOLD = None
+    INGESTION_DICTIONARY_WINDOW_SIZE = 1000
+    LIBRARY_MANIFEST_PATH = None
     INGESTION_PIPELINE = [
         "scaife_viewer.atlas.importers.versions.import_versions",
     ]
+    INGESTION_PIPELINE_CONCURRENCY = 1
+    INGESTION_DEFERRED_INDEX_MODELS = [
+        "scaife_viewer_atlas.AudioAnnotation",
+        "scaife_viewer_atlas.ImageAnnotation",
+        "scaife_viewer_atlas.ImageROI",
+        "scaife_viewer_atlas.MetricalAnnotation",
+        "scaife_viewer_atlas.NamedEntity",
+        "scaife_viewer_atlas.TextAlignmentRecordRelation",
+        "scaife_viewer_atlas.TextAnnotation",
+        "scaife_viewer_atlas.TokenAnnotation",
+    ]
     # TODO: Review alphabet in light of SQLite case-sensitivity
     TREE_PATH_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+    TOKEN_SUBREF_COUNTER = "scaife_viewer.atlas.subrefs.count_subrefs_via_substrings"
 
     # Annotations
     EXPAND_IMAGE_ANNOTATION_REFS = True
 
     # GraphQL settings
     IN_MEMORY_PASSAGE_CHUNK_MAX = 2500
+    CITATION_INDEX_CACHE_SIZE = 128
+    PASSAGE_CACHE_SIZE = 1024
+    KEYSET_PAGINATION = False
 
     # Database settings
     DB_LABEL = "atlas"
@@ -64,6 +82,9 @@ class ATLASAppConf(AppConf):
     def configure_hookset(self, value):
         return load_path_attr(value)()
 
+    def configure_token_subref_counter(self, value):
+        return load_path_attr(value)
+
     def configure_data_dir(self, value):
         # NOTE: We've chosen an explicit `configure` method
         # vs making `DATA_DIR` a required field so we can check
@@ -0,0 +1,138 @@
+from collections import defaultdict
+
+from django.db.models import F
+
+from promise import Promise
+from promise.dataloader import DataLoader
+
+from .hooks import hookset
+from .models import Node, Sense
+from .utils import slice_large_list
+
+
+def get_loader(context, name, factory):
+    """
+    Returns the DataLoader registered as `name` on `context` (the request),
+    creating it via `factory` the first time it is requested.
+
+    Loaders are request-scoped, so loaded values are never shared
+    between requests.
+    """
+    if not hasattr(context, "dataloaders"):
+        context.dataloaders = {}
+    if name not in context.dataloaders:
+        context.dataloaders[name] = factory()
+    return context.dataloaders[name]
+
+
+class QuerysetLoader(DataLoader):
+    """
+    Batches lookups of the objects within `queryset` by `key_field` into a
+    single `IN` query per batch.
+
+    Each key resolves to a list of objects (ordered by pk) when `many` is
+    True, or to a single object (or None) otherwise.
+    """
+
+    def __init__(self, queryset, key_field, many=False):
+        super().__init__()
+        self.queryset = queryset
+        self.key_field = key_field
+        self.many = many
+
+    def get_objects(self, keys):
+        # NOTE: Annotating before filtering ensures that a single join is
+        # used for many-to-many and reverse relations
+        queryset = (
+            self.queryset.annotate(loader_key=F(self.key_field))
+            .filter(loader_key__in=keys)
+            .order_by("loader_key", "pk")
+        )
+        return queryset
+
+    def batch_load_fn(self, keys):
+        lookup = defaultdict(list) if self.many else {}
+        for keys_slice in slice_large_list(list(set(keys))):
+            for obj in self.get_objects(keys_slice):
+                if self.many:
+                    lookup[obj.loader_key].append(obj)
+                else:
+                    lookup[obj.loader_key] = obj
+        default = [] if self.many else None
+        return Promise.resolve([lookup.get(key, default) for key in keys])
+
+
+class AccessLoader(DataLoader):
+    """
+    Batches `hookset.can_access_urns` checks for the URNs resolved
+    within a request
+    """
+
+    def __init__(self, request):
+        super().__init__()
+        self.request = request
+
+    def batch_load_fn(self, urns):
+        return Promise.resolve(hookset.can_access_urns(self.request, urns))
+
+
+class SenseTreeLoader(DataLoader):
+    """
+    Builds the sense trees of dictionary entries from a single query,
+    rather than a `dump_bulk` query per top-level sense
+    """
+
+    def batch_load_fn(self, entry_ids):
+        lookup = defaultdict(list)
+        for ids_slice in slice_large_list(list(set(entry_ids))):
+            senses = (
+                Sense.objects.filter(entry_id__in=ids_slice)
+                .order_by("path")
+                .values_list("entry_id", "urn", "path", "depth")
+            )
+            trees = {}
+            for entry_id, urn, path, depth in senses:
+                # TODO: Prefer GraphQL Ids
+                tree = {"id": urn}
+                parent = trees.get(path[: -Sense.steplen]) if depth > 1 else None
+                if parent is None:
+                    lookup[entry_id].append(tree)
+                else:
+                    parent.setdefault("children", []).append(tree)
+                trees[path] = tree
+        return Promise.resolve([lookup.get(entry_id, []) for entry_id in entry_ids])
+
+
+def get_instance_loader(info, model):
+    """
+    Returns a loader of `model` instances by pk
+    """
+    name = f"{model._meta.label}:pk"
+    return get_loader(info.context, name, lambda: QuerysetLoader(model.objects, "pk"))
+
+
+def get_related_loader(info, model, key_field):
+    """
+    Returns a loader of the lists of `model` instances related
+    to each key via `key_field`
+    """
+    name = f"{model._meta.label}:{key_field}:many"
+    return get_loader(
+        info.context, name, lambda: QuerysetLoader(model.objects, key_field, many=True),
+    )
+
+
+def get_text_part_by_token_loader(info):
+    return get_loader(
+        info.context,
+        "text_part_by_token",
+        lambda: QuerysetLoader(Node.objects.only("urn"), "tokens"),
+    )
+
+
+def get_access_loader(info):
+    return get_loader(info.context, "access", lambda: AccessLoader(info.context))
+
+
+def get_sense_tree_loader(info):
+    return get_loader(info.context, "sense_tree", SenseTreeLoader)
@@ -0,0 +1,146 @@
+from django.db.models.functions import Substr
+
+from . import constants
+from .models import (
+    Citation,
+    GrammaticalEntry,
+    ImageAnnotation,
+    MetricalAnnotation,
+    NamedEntity,
+    Node,
+    TextAnnotation,
+    TokenAnnotation,
+    VersionDisplayModeHints,
+)
+from .utils import chunked_bulk_create
+
+
+VERSION_DEPTH = constants.CTS_URN_DEPTHS["version"]
+
+
+# TODO: These are pretty strongly tied to the constants defined in
+# scaife-viewer/frontend:
+# https://github.com/scaife-viewer/frontend/blob/355522a29b2e3013ee217b590205f778203d72eb/packages/store/src/constants.js#L38
+def get_display_mode_hints(version):
+    """
+    Queries the annotations of `version` to determine the display modes
+    it supports.
+
+    `default` and `fallback` are derived from version metadata and are
+    not included.
+    """
+    has_token_annotations = TokenAnnotation.objects.filter(
+        token__text_part__urn__startswith=version.urn
+    ).exists()
+    return {
+        "grammatical-entries": GrammaticalEntry.objects.filter(
+            tokens__text_part__urn__startswith=version.urn
+        ).exists(),
+        "syntax-trees": TextAnnotation.objects.filter(
+            text_parts__urn__startswith=version.urn
+        )
+        .filter(kind=constants.TEXT_ANNOTATION_KIND_SYNTAX_TREE)
+        .exists(),
+        "interlinear": has_token_annotations,
+        "metrical": MetricalAnnotation.objects.filter(
+            text_parts__urn__startswith=version.urn
+        ).exists(),
+        "dictionary-entries": has_token_annotations
+        or Citation.objects.filter(text_parts__urn__startswith=version.urn).exists(),
+        "commentaries": TextAnnotation.objects.filter(
+            text_parts__urn__startswith=version.urn
+        )
+        .filter(kind=constants.TEXT_ANNOTATION_KIND_COMMENTARY)
+        .exists(),
+        "named-entities": NamedEntity.objects.filter(
+            tokens__text_part__urn__startswith=version.urn
+        ).exists(),
+        "folio": ImageAnnotation.objects.filter(
+            roi__text_parts__urn__startswith=version.urn
+        ).exists(),
+        "alignments": version.text_alignments.exists(),
+    }
+
+
+def get_version_paths(qs, path_field):
+    """
+    Returns the paths of the versions containing the text parts
+    related to `qs` via `path_field`.
+
+    Text parts of exemplars are excluded, as their URNs do not begin with
+    the URN of their version (see `get_display_mode_hints`).
+    """
+    length = VERSION_DEPTH * Node.steplen
+    exemplar_paths = Node.objects.filter(kind="exemplar").values("path")
+    # NOTE: Avoids `path__startswith`, as SQLite's LIKE is case-insensitive
+    version_paths = (
+        qs.annotate(
+            version_path=Substr(path_field, 1, length),
+            exemplar_path=Substr(path_field, 1, length + Node.steplen),
+        )
+        .exclude(exemplar_path__in=exemplar_paths)
+        .order_by()
+        .values_list("version_path", flat=True)
+        .distinct()
+    )
+    return set(version_paths) - {None}
+
+
+def build_display_mode_hints():
+    """
+    Determines the display modes supported by each version with a single
+    query per annotation type, rather than per version.
+
+    Returns a lookup of version pks to hints.
+    """
+    syntax_trees = TextAnnotation.objects.filter(
+        kind=constants.TEXT_ANNOTATION_KIND_SYNTAX_TREE
+    )
+    commentaries = TextAnnotation.objects.filter(
+        kind=constants.TEXT_ANNOTATION_KIND_COMMENTARY
+    )
+    token_annotations = get_version_paths(
+        TokenAnnotation.objects.all(), "token__text_part__path"
+    )
+    paths = {
+        "grammatical-entries": get_version_paths(
+            GrammaticalEntry.objects.all(), "tokens__text_part__path"
+        ),
+        "syntax-trees": get_version_paths(syntax_trees, "text_parts__path"),
+        "interlinear": token_annotations,
+        "metrical": get_version_paths(
+            MetricalAnnotation.objects.all(), "text_parts__path"
+        ),
+        "dictionary-entries": token_annotations
+        | get_version_paths(Citation.objects.all(), "text_parts__path"),
+        "commentaries": get_version_paths(commentaries, "text_parts__path"),
+        "named-entities": get_version_paths(
+            NamedEntity.objects.all(), "tokens__text_part__path"
+        ),
+        "folio": get_version_paths(
+            ImageAnnotation.objects.all(), "roi__text_parts__path"
+        ),
+    }
+    aligned_version_ids = set(
+        Node.objects.filter(text_alignments__isnull=False).values_list("pk", flat=True)
+    )
+
+    hints = {}
+    versions = Node.objects.filter(depth=VERSION_DEPTH).values_list("pk", "path")
+    for pk, path in versions:
+        data = {key: path in version_paths for key, version_paths in paths.items()}
+        data["alignments"] = pk in aligned_version_ids
+        hints[pk] = data
+    return hints
+
+
+def update_display_mode_hints():
+    """
+    Replaces the display mode hints for every version
+    """
+    hints = build_display_mode_hints()
+    VersionDisplayModeHints.objects.all().delete()
+    to_create = [
+        VersionDisplayModeHints(version_id=pk, data=data) for pk, data in hints.items()
+    ]
+    chunked_bulk_create(VersionDisplayModeHints, to_create)
@@ -39,6 +39,17 @@ class DefaultHookSet:
     def can_access_urn(self, request, urn):
         return True
 
+    def can_access_urns(self, request, urns):
+        """
+        Returns whether or not each of `urns` can be accessed; used to batch
+        access checks within a GraphQL request.
+
+        Site developers that override `can_access_urn` with a check that
+        queries the database should override this method to perform the
+        check for all `urns` at once.
+        """
+        return [self.can_access_urn(request, urn) for urn in urns]
+
     def get_human_lang(self, value):
         return constants.HUMAN_FRIENDLY_LANGUAGE_MAP.get(value, value)
 
@@ -131,10 +142,10 @@ class DefaultHookSet:
                     metadata[child_urn] = None
         return metadata
 
-    def run_ingestion_pipeline(self, outf):
+    def run_ingestion_pipeline(self, outf, **kwargs):
         from .ingestion_pipeline import run_ingestion_pipeline
 
-        return run_ingestion_pipeline(outf)
+        return run_ingestion_pipeline(outf, **kwargs)
 
     def get_token_annotation_paths(self):
         from .conf import settings  # noqa; avoids race condition
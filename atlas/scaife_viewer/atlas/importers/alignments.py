@@ -1,3 +1,4 @@
+import itertools
 import json
 import os
 from collections import defaultdict
@@ -6,6 +7,7 @@ from scaife_viewer.atlas.backports.scaife_viewer.cts.utils import natural_keys
 from scaife_viewer.atlas.conf import settings
 from scaife_viewer.atlas.urn import URN
 
+from ..ingestion_pipeline import stage_inputs
 from ..models import (
     Node,
     TextAlignment,
@@ -13,6 +15,7 @@ from ..models import (
     TextAlignmentRecordRelation,
     Token,
 )
+from ..utils import chunked_bulk_create
 
 
 ANNOTATIONS_DATA_PATH = os.path.join(
@@ -20,6 +23,8 @@ ANNOTATIONS_DATA_PATH = os.path.join(
 )
 RAW_PATH = os.path.join(ANNOTATIONS_DATA_PATH, "raw")
 
+RecordRelationTokenThroughModel = TextAlignmentRecordRelation.tokens.through
+
 
 def get_paths():
     if not os.path.exists(ANNOTATIONS_DATA_PATH):
@@ -75,48 +80,54 @@ def build_sorted_records(versions, record_relations):
     return records
 
 
-def set_record_label(record, relation):
+def build_token_lookup(version_obj):
+    """
+    Returns a (text_part_urn, position) -> token_id lookup for the version
+    """
+    token_values = Token.objects.filter(
+        text_part__urn__startswith=version_obj.urn
+    ).values_list("text_part__urn", "position", "pk")
+    lookup = {}
+    for text_part_urn, position, pk in token_values.iterator():
+        lookup[(text_part_urn, position)] = pk
+    return lookup
+
+
+def resolve_relation_tokens(version_obj, relation, token_lookup):
+    """
+    Returns (text_part_ref, token_id) tuples for each entry in the relation
+    """
+    resolved = []
+    # TODO: Can we build up a veref map and validate?
+    for entry in relation:
+        entry_urn = URN(entry)
+        ref = entry_urn.passage
+        # NOTE: this assumes we're always dealing with a tokenized exemplar, which
+        # may not be the case
+        text_part_ref, position = ref.rsplit(".", maxsplit=1)
+        text_part_urn = f"{version_obj.urn}{text_part_ref}"
+        try:
+            token_id = token_lookup[(text_part_urn, int(position))]
+        except KeyError:
+            raise Token.DoesNotExist(
+                f'Could not resolve token [urn="{text_part_urn}" position="{position}"]'
+            )
+        resolved.append((text_part_ref, token_id))
+    return resolved
+
+
+def get_record_label(resolved_tokens):
     # TODO: Add a record.label field
-    if record.metadata.get("label"):
-        # TODO: Allow annotation to supply label rather than calculating it
-        return
     # TODO: Determine how we want to expose the ve_ref value in terms of addressable
     # tokens; we'll just expose text part ref for now
-    tokens = list(relation.tokens.all())
-    if not tokens:
-        return
-    refs = [tokens[0].text_part.ref]
-    if tokens[0].text_part_id != tokens[-1].text_part_id:
-        refs.append(tokens[-1].text_part.ref)
-    record.metadata["label"] = "-".join(refs)
-
-
-def create_record_relations(record, version_objs, relations):
-    first_relation = None
-    # TODO: Enforce that relation / version obj is 1:1; determine if we need to
-    # support an "empty" relation
-    for version_obj, relation in zip(version_objs, relations):
-        relation_obj = TextAlignmentRecordRelation(version=version_obj, record=record)
-        if first_relation is None:
-            first_relation = relation_obj
-        relation_obj.save()
-        tokens = []
-        # TODO: Can we build up a veref map and validate?
-        for entry in relation:
-            entry_urn = URN(entry)
-            ref = entry_urn.passage
-            # NOTE: this assumes we're always dealing with a tokenized exemplar, which
-            # may not be the case
-            text_part_ref, position = ref.rsplit(".", maxsplit=1)
-            text_part_urn = f"{version_obj.urn}{text_part_ref}"
-            # TODO: compound Q objects query to minimize round trips
-            tokens.append(
-                Token.objects.get(text_part__urn=text_part_urn, position=position)
-            )
-        relation_obj.tokens.set(tokens)
-    # TODO: review query counts here and some of our SQL hacks
-
-    set_record_label(record, first_relation)
+    if not resolved_tokens:
+        return None
+    first_ref = resolved_tokens[0][0]
+    last_ref = resolved_tokens[-1][0]
+    refs = [first_ref]
+    if first_ref != last_ref:
+        refs.append(last_ref)
+    return "-".join(refs)
 
 
 def process_cex(metadata):
@@ -143,28 +154,71 @@ def process_cex(metadata):
     alignment.save()
     alignment.versions.set(version_objs)
 
+    token_lookups = [build_token_lookup(version_obj) for version_obj in version_objs]
+
     # # # # # # # # # # # # # # # # # # # # # # # #
-    # Create Record and Relations
+    # Create Records
     # # # # # # # # # # # # # # # # # # # # # # # #
-    idx = 0
     # TODO: review how we might make use of sort key from CEX
     # TODO: sorting versions from Ducat too, especially since Ducat doesn't have 'em
     # maybe something for CITE tools?
-    records_to_update = []
-    for _, record_urn, relations in records:
-        record = TextAlignmentRecord(idx=idx, alignment=alignment, urn=record_urn)
-        record.save()
-        idx += 1
-
-        create_record_relations(record, version_objs, relations)
-        # TODO: Add explicit `label` field
-        if record.metadata.get("label"):
-            records_to_update.append(record)
-
-    if records_to_update:
-        TextAlignmentRecord.objects.bulk_update(records_to_update, fields=["metadata"])
-
+    record_objs = []
+    resolved_relations = []
+    for idx, (_, record_urn, relations) in enumerate(records):
+        # TODO: Enforce that relation / version obj is 1:1; determine if we need to
+        # support an "empty" relation
+        resolved = [
+            resolve_relation_tokens(version_obj, relation, token_lookup)
+            for version_obj, relation, token_lookup in zip(
+                version_objs, relations, token_lookups
+            )
+        ]
+        record_metadata = {}
+        label = get_record_label(resolved[0]) if resolved else None
+        if label:
+            record_metadata["label"] = label
+        record_objs.append(
+            TextAlignmentRecord(
+                idx=idx, alignment=alignment, urn=record_urn, metadata=record_metadata
+            )
+        )
+        resolved_relations.append(resolved)
+    chunked_bulk_create(TextAlignmentRecord, record_objs)
 
+    # # # # # # # # # # # # # # # # # # # # # # # #
+    # Create Relations
+    # # # # # # # # # # # # # # # # # # # # # # # #
+    record_ids = (
+        TextAlignmentRecord.objects.filter(alignment=alignment)
+        .order_by("idx")
+        .values_list("pk", flat=True)
+    )
+    relation_objs = []
+    for record_id, resolved in zip(record_ids, resolved_relations):
+        for version_obj in version_objs[: len(resolved)]:
+            relation_objs.append(
+                TextAlignmentRecordRelation(version=version_obj, record_id=record_id)
+            )
+    chunked_bulk_create(TextAlignmentRecordRelation, relation_objs)
+
+    # NOTE: Relations are inserted in the same order as `resolved_relations`
+    relation_ids = (
+        TextAlignmentRecordRelation.objects.filter(record__alignment=alignment)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+    resolved_tokens = itertools.chain.from_iterable(resolved_relations)
+    through_objs = (
+        RecordRelationTokenThroughModel(
+            textalignmentrecordrelation_id=relation_id, token_id=token_id
+        )
+        for relation_id, relation_tokens in zip(relation_ids, resolved_tokens)
+        for _, token_id in relation_tokens
+    )
+    chunked_bulk_create(RecordRelationTokenThroughModel, through_objs)
+
+
+@stage_inputs(lambda: [ANNOTATIONS_DATA_PATH])
 def process_alignments(reset=False):
     if reset:
         TextAlignment.objects.all().delete()
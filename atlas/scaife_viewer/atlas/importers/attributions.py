@@ -4,11 +4,14 @@ import os
 
 from scaife_viewer.atlas.conf import settings
 
+from ..ingestion_pipeline import stage_inputs
 from ..models import (
     AttributionOrganization,
     AttributionPerson,
     AttributionRecord,
 )
+from ..utils import chunked_bulk_create, slice_large_list
+from .references import resolve_references_bulk
 
 
 ANNOTATIONS_DATA_PATH = os.path.join(
@@ -26,57 +29,77 @@ def get_paths():
     ]
 
 
-def _prepare_attributions(path, counters):
-    data = json.load(open(path))
-    to_create = []
+def _get_or_create_by_name(model, names):
+    """
+    Returns a name to pk lookup for `model`, bulk creating any names
+    that do not already exist
+    """
+
+    def get_lookup():
+        lookup = {}
+        for names_slice in slice_large_list(list(names)):
+            queryset = model.objects.filter(name__in=names_slice)
+            lookup.update(queryset.values_list("name", "pk"))
+        return lookup
+
+    lookup = get_lookup()
+    to_create = [model(name=name) for name in names if name not in lookup]
+    if to_create:
+        chunked_bulk_create(model, to_create)
+        lookup = get_lookup()
+    return lookup
+
+
+def _load_attributions(path):
+    with open(path) as f:
+        return json.load(f)
+
 
-    # TODO: replace `<type>_cache` with get_or_create
+def _prepare_attributions(attributions, counters):
     # TODO: denorm data for orgs / persons too
+    org_names = set()
+    pers_names = set()
+    for attribution in attributions:
+        if attribution["organization"]:
+            org_names.add(attribution["organization"]["name"])
+        if attribution["person"]:
+            pers_names.add(attribution["person"]["name"])
+    org_lookup = _get_or_create_by_name(AttributionOrganization, org_names)
+    pers_lookup = _get_or_create_by_name(AttributionPerson, pers_names)
 
-    org_cache = {}
-    pers_cache = {}
-    for attribution in data:
+    to_create = []
+    for attribution in attributions:
         organization = attribution["organization"]
-        org_obj = None
-        if organization:
-            org_name = organization["name"]
-            org_obj = org_cache.get(org_name)
-            if not org_obj:
-                org_obj = AttributionOrganization.objects.create(name=org_name)
-                org_cache[org_name] = org_obj
+        org_id = org_lookup[organization["name"]] if organization else None
         person = attribution["person"]
-        pers_obj = None
-        if person:
-            pers_name = person["name"]
-            pers_obj = pers_cache.get(pers_name)
-            if not pers_obj:
-                pers_obj = AttributionPerson.objects.create(name=pers_name)
-                pers_cache[pers_name] = pers_obj
+        pers_id = pers_lookup[person["name"]] if person else None
 
         role = attribution["role"]
         # TODO: make use of counters[idx]
         to_create.append(
             AttributionRecord(
                 role=role,
-                person=pers_obj,
-                organization=org_obj,
+                person_id=pers_id,
+                organization_id=org_id,
                 data=attribution["data"],
             )
         )
     return to_create
 
 
+@stage_inputs(lambda: [ANNOTATIONS_DATA_PATH])
 def import_attributions(reset=False):
     if reset:
         AttributionRecord.objects.all().delete()
 
-    to_create = []
-    # TODO: IDX
-    counters = dict(idx=0)
+    attributions = []
     for path in get_paths():
-        to_create.extend(_prepare_attributions(path, counters))
+        attributions.extend(_load_attributions(path))
 
-    created = len(AttributionRecord.objects.bulk_create(to_create))
-    print(f"Created attribution records [count={created}]")
+    # TODO: IDX
+    counters = dict(idx=0)
+    to_create = _prepare_attributions(attributions, counters)
+    chunked_bulk_create(AttributionRecord, to_create)
+    print(f"Created attribution records [count={len(to_create)}]")
 
-    # TODO: Resolve references
+    resolve_references_bulk(AttributionRecord.objects.all(), field_name="urns")
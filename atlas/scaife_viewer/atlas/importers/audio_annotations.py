@@ -3,7 +3,9 @@ import os
 
 from scaife_viewer.atlas.conf import settings
 
+from ..ingestion_pipeline import stage_inputs
 from ..models import AudioAnnotation
+from .references import resolve_references_bulk
 
 
 # @@@ move these constants out to the data
@@ -43,6 +45,7 @@ def _prepare_audio_annotations(path, counters):
     return to_create
 
 
+@stage_inputs(lambda: [ANNOTATIONS_DATA_PATH])
 def import_audio_annotations(reset=False):
     if reset:
         AudioAnnotation.objects.all().delete()
@@ -55,5 +58,4 @@ def import_audio_annotations(reset=False):
     created = len(AudioAnnotation.objects.bulk_create(to_create, batch_size=500))
     print(f"Created audio annotations [count={created}]")
 
-    for audio_annotation in AudioAnnotation.objects.all():
-        audio_annotation.resolve_references()
+    resolve_references_bulk(AudioAnnotation.objects.all())
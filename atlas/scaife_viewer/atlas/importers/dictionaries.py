@@ -1,21 +1,24 @@
+import collections
+import concurrent.futures
 import json
 import logging
-from collections import defaultdict
+import os
 from pathlib import Path
 
 import jsonlines
 from tqdm import tqdm
 
+from django.db import connections
+
+from scaife_viewer.atlas.conf import settings
+
 from ..hooks import hookset
+from ..ingestion_pipeline import stage_inputs
 from ..language_utils import normalize_and_strip_marks, normalized_no_digits
-from ..models import Citation, Dictionary, DictionaryEntry, Node, Sense
-from ..utils import chunked_bulk_create
-
+from ..models import Citation, Dictionary, DictionaryEntry, Sense
+from ..utils import chunked_bulk_create, slice_large_list
+from .references import build_node_lookup
 
-# FIXME: Factor out globals into a dictionary-level attr
-ROOT_PATH_LOOKUP = []
-PARENT_PATH_LOOKUP = defaultdict(dict)
-PATH_SET = set()
 
 CitationThroughModel = Citation.text_parts.through
 RESOLVE_CITATIONS_AS_TEXT_PARTS = True
@@ -43,104 +46,94 @@ def _prepare_citation_objs(lookup_dict, citations):
     return to_create
 
 
-def _process_sense(entry, s, idx, parent=None, last_sibling=None):
-    senses = []
-    citations = []
-    if parent is None:
-        if ROOT_PATH_LOOKUP:
-            last_root = ROOT_PATH_LOOKUP.pop()
-            path = last_root._inc_path()
-        else:
-            path = Sense._get_path(None, 1, 1)
-        obj = Sense(
-            label=s["label"],
-            definition=s["definition"],
-            idx=idx,
-            urn=s["urn"],
-            depth=1,
-            path=path,
-        )
-        assert path not in PATH_SET
-        ROOT_PATH_LOOKUP.append(obj)
-    else:
-        path = None
-        depth = parent.depth + 1
-        if last_sibling:
-            last_sibling = last_sibling[0]
-            if last_sibling.path == parent.path:
-                logger.debug("this is the first child of the parent")
-                path = Sense._get_path(parent.path, depth, 1)
-                assert path not in PATH_SET
-                PARENT_PATH_LOOKUP[parent.path].update({depth: path})
-            elif last_sibling.depth == depth:
-                logger.debug("this is a sibling at the current depth")
-                path = last_sibling._inc_path()
-                assert path not in PATH_SET
-                PARENT_PATH_LOOKUP[parent.path].update({depth: path})
-            elif last_sibling.depth > depth:
-                logger.debug("this is a node at a higher depth")
-                last_sibling_path = PARENT_PATH_LOOKUP[parent.path][depth]
-                sibling_obj = Sense(depth=depth, path=last_sibling_path)
-                path = sibling_obj._inc_path()
-                PARENT_PATH_LOOKUP[parent.path].update({depth: path})
-                # last_seen_path = PARENT_PATH_LOOKUP[parent.path][depth]
-                # path = Sense._get_path(last_seen_path, depth, 1)
-                # this
-            else:
-                assert False
-        else:
-            assert False
-        logger.debug(path)
-        obj = Sense(
-            label=s["label"],
-            definition=s["definition"],
-            idx=idx,
-            urn=s["urn"],
-            depth=depth,
-            path=path,
-            # entry=entry,
-        )
-        assert path is not None
-        PATH_SET.add(obj.path)
+def get_root_path():
+    last_root = Sense.get_last_root_node()
+    if last_root:
+        return last_root._inc_path()
+    return Sense._get_path(None, 1, 1)
 
-    senses.append(obj)
 
-    citations.extend(
-        _prepare_citation_objs(
-            dict(entry_urn=entry.urn, sense_urn=obj.urn), s.get("citations", [])
-        )
+def _process_sense(entry, s, idx, path, depth):
+    children = s.get("children", [])
+    obj = Sense(
+        label=s["label"],
+        definition=s["definition"],
+        idx=idx,
+        urn=s["urn"],
+        depth=depth,
+        path=path,
+        numchild=len(children),
     )
-    idx += 1
-
-    for ss in s.get("children", []):
+    obj.entry_urn = entry.urn
+    senses = [obj]
+    citations = _prepare_citation_objs(
+        dict(entry_urn=entry.urn, sense_urn=obj.urn), s.get("citations", [])
+    )
+    for pos, ss in enumerate(children, 1):
+        child_path = Sense._get_path(path, depth + 1, pos)
         new_senses, new_citations = _process_sense(
-            entry, ss, idx, parent=obj, last_sibling=senses[-1:]
+            entry, ss, idx + 1, child_path, depth + 1
         )
         senses.extend(new_senses)
         citations.extend(new_citations)
     return senses, citations
 
 
+def _defer_entry(window, entry, data, root_path):
+    """
+    Create entry and related child objects in memory, but don't yet
+    persist them to the database.
+
+    Sense paths are calculated in memory, starting from `root_path`;
+    returns the path for the next root sense.
+    """
+    window["entries"].append(entry)
+    window["citations"].extend(
+        _prepare_citation_objs(dict(entry_urn=entry.urn), data.get("citations", []))
+    )
+    for sense in data["senses"]:
+        senses, citations = _process_sense(entry, sense, 0, root_path, 1)
+        window["senses"].extend(senses)
+        window["citations"].extend(citations)
+        root_path = senses[0]._inc_path()
+    return root_path
+
+
+def _build_entry(dictionary_id, e_idx, e):
+    headword = e["headword"]
+    return DictionaryEntry(
+        headword=headword,
+        headword_normalized=normalized_no_digits(headword),
+        headword_normalized_stripped=normalize_and_strip_marks(headword),
+        idx=e_idx,
+        urn=e["urn"],
+        dictionary_id=dictionary_id,
+        data=e.get("data", {}),
+    )
+
+
+def _get_urn_pk_lookup(model, urns):
+    lookup = {}
+    for urns_slice in slice_large_list(urns):
+        lookup.update(model.objects.filter(urn__in=urns_slice).values_list("urn", "pk"))
+    return lookup
+
+
 def _bulk_prepare_citation_through_objects(qs):
     logger.info("Retrieving URNs for citations")
-    citation_urn_pk_values = qs.values_list("data__urn", "pk")
+    citation_urn_pk_values = list(qs.values_list("data__urn", "pk"))
 
-    candidates = list(set([c[0] for c in citation_urn_pk_values]))
+    candidates = set([c[0] for c in citation_urn_pk_values])
     msg = f"URNs retrieved: {len(candidates)}"
     logger.info(msg)
 
     logger.info("Building URN to Node (TextPart) pk lookup")
-    node_urn_pk_values = Node.objects.filter(urn__in=candidates).values_list(
-        "urn", "pk"
-    )
-    text_part_lookup = {}
-    for urn, pk in node_urn_pk_values:
-        text_part_lookup[urn] = pk
+    text_part_lookup = build_node_lookup(candidates)
 
     logger.info("Preparing through objects for insert")
     to_create = []
     for urn, citation_id in citation_urn_pk_values:
-        node_id = text_part_lookup.get(urn, None)
+        node_id, _ = text_part_lookup.get(urn, (None, None))
         if node_id:
             to_create.append(
                 CitationThroughModel(node_id=node_id, citation_id=citation_id)
@@ -158,94 +151,151 @@ def _resolve_citation_textparts(qs):
     chunked_bulk_create(CitationThroughModel, prepared_objs)
 
 
-def _defer_entry(deferred, entry, data, s_idx):
+def _insert_window(dictionary, window):
     """
-    Create entry and related child objects in memory, but don't yet
-    persist them to the database.
-
-    This avoids an avalanche of SQL SELECT and INSERT statements that
-    would otherwise occur on each `.create` or `.save` call.
+    Inserts the entries, senses and citations within `window`, resolving
+    foreign keys from the URNs of the objects in the window
     """
-    senses = []
-    citations = []
-    citations.extend(
-        _prepare_citation_objs(dict(entry_urn=entry.urn), data.get("citations", []))
+    chunked_bulk_create(DictionaryEntry, window["entries"])
+    entry_urn_pk_lookup = _get_urn_pk_lookup(
+        DictionaryEntry, [e.urn for e in window["entries"]]
     )
-    for sense in data["senses"]:
-        new_senses, new_citations = _process_sense(entry, sense, s_idx, parent=None)
-        senses.extend(new_senses)
-        citations.extend(new_citations)
-    deferred["entries"].append(entry)
-    deferred["senses"].append(senses)
-    deferred["citations"].append(citations)
+    for sense in window["senses"]:
+        sense.entry_id = entry_urn_pk_lookup[sense.entry_urn]
+
+    chunked_bulk_create(Sense, window["senses"])
+    sense_urn_pk_lookup = _get_urn_pk_lookup(Sense, [s.urn for s in window["senses"]])
+    for citation in window["citations"]:
+        citation.entry_id = entry_urn_pk_lookup.get(citation.entry_urn, None)
+        citation.sense_id = sense_urn_pk_lookup.get(citation.sense_urn, None)
 
+    chunked_bulk_create(Citation, window["citations"])
 
-def process_entries(dictionary, entries, entry_count=None):
-    s_idx = 0
-    deferred = defaultdict(list)
-    logger.info("Extracting entries, senses and citations")
+    if RESOLVE_CITATIONS_AS_TEXT_PARTS:
+        citations_with_urns = Citation.objects.filter(
+            sense__entry__dictionary=dictionary,
+            sense__entry__idx__gte=window["entries"][0].idx,
+            sense__entry__idx__lte=window["entries"][-1].idx,
+        ).exclude(data__urn=None)
+        _resolve_citation_textparts(citations_with_urns)
+
+    for objs in window.values():
+        objs.clear()
+
+
+def process_entries(dictionary, entries, entry_count=None, window_size=None):
+    """
+    Streams `entries` into the database in windows of `window_size`
+    (or `SV_ATLAS_INGESTION_DICTIONARY_WINDOW_SIZE`) entries, so that
+    only a single window of objects is held in memory.
+    """
+    if window_size is None:
+        window_size = settings.SV_ATLAS_INGESTION_DICTIONARY_WINDOW_SIZE
+
+    root_path = get_root_path()
+    window = dict(entries=[], senses=[], citations=[])
+    logger.info("Processing entries, senses and citations")
     with tqdm(total=entry_count) as pbar:
         for e_idx, e in enumerate(entries):
             pbar.update(1)
-            headword = e["headword"]
-            headword_normalized = normalized_no_digits(headword)
-            headword_normalized_stripped = normalize_and_strip_marks(headword)
-            entry = DictionaryEntry(
-                headword=headword,
-                headword_normalized=headword_normalized,
-                headword_normalized_stripped=headword_normalized_stripped,
-                idx=e_idx,
-                urn=e["urn"],
-                dictionary=dictionary,
-                data=e.get("data", {}),
-            )
-            # FIXME: Ensure `s_idx` is actually getting incremented
-            _defer_entry(deferred, entry, e, s_idx)
-
-    logger.info("Inserting DictionaryEntry objects")
-    chunked_bulk_create(DictionaryEntry, deferred["entries"])
-
-    logger.info("Setting entry_id on Sense objects")
-    entry_urn_pk_lookup = {}
-    entry_urn_pk_lookup.update(
-        DictionaryEntry.objects.filter(dictionary_id=dictionary.id)
-        .order_by("pk")
-        .values_list("urn", "pk")
-    )
+            entry = _build_entry(dictionary.id, e_idx, e)
+            root_path = _defer_entry(window, entry, e, root_path)
+            if len(window["entries"]) >= window_size:
+                _insert_window(dictionary, window)
 
-    entry_ids = entry_urn_pk_lookup.values()
-    for entry_id, entry_senses in zip(entry_ids, deferred["senses"]):
-        for s in entry_senses:
-            s.entry_id = entry_id
+    if window["entries"]:
+        _insert_window(dictionary, window)
 
-    import itertools
 
-    logger.info("Inserting Sense objects")
-    chunked_bulk_create(Sense, itertools.chain.from_iterable(deferred["senses"]))
+def prepare_window(dictionary_id, start_idx, lines):
+    """
+    Parses a shard of JSONL `lines` into unsaved entries, senses and
+    citations, with sense paths relative to the first root path.
 
-    logger.info("Setting sense_id on Citation objects")
-    sense_urn_pk_lookup = {}
-    sense_urn_pk_lookup.update(
-        Sense.objects.filter(entry__dictionary_id=dictionary.id).values_list(
-            "urn", "pk"
-        )
-    )
-    for citations in deferred["citations"]:
-        for citation in citations:
-            entry_id = entry_urn_pk_lookup.get(citation.entry_urn, None)
-            citation.entry_id = entry_id
-            sense_id = sense_urn_pk_lookup.get(citation.sense_urn, None)
-            citation.sense_id = sense_id
+    Invoked from ProcessPoolExecutor workers within
+    `import_dictionaries_parallel`.
+    """
+    window = dict(entries=[], senses=[], citations=[])
+    root_path = Sense._get_path(None, 1, 1)
+    for e_idx, line in enumerate(lines, start_idx):
+        e = json.loads(line)
+        entry = _build_entry(dictionary_id, e_idx, e)
+        root_path = _defer_entry(window, entry, e, root_path)
+    return window
 
-    logger.info("Inserting Citation objects")
-    chunked_bulk_create(Citation, itertools.chain.from_iterable(deferred["citations"]))
 
-    if RESOLVE_CITATIONS_AS_TEXT_PARTS:
-        logger.info("Generating citation through models...")
-        citations_with_urns = Citation.objects.filter(
-            sense__entry__dictionary=dictionary
-        ).exclude(data__urn=None)
-        _resolve_citation_textparts(citations_with_urns)
+def _rebase_sense_paths(senses, root_path):
+    """
+    Moves senses prepared by `prepare_window` to start from `root_path`;
+    returns the path for the next root sense.
+    """
+    steplen = Sense.steplen
+    offset = Sense._str2int(root_path) - 1
+    roots = 0
+    for sense in senses:
+        step = Sense._str2int(sense.path[:steplen]) + offset
+        sense.path = Sense._get_path(None, 1, step) + sense.path[steplen:]
+        if sense.depth == 1:
+            roots += 1
+    return Sense._get_path(None, 1, offset + roots + 1)
+
+
+def _iter_shards(paths, shard_size):
+    start_idx = 0
+    shard = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                shard.append(line)
+                if len(shard) >= shard_size:
+                    yield start_idx, shard
+                    start_idx += len(shard)
+                    shard = []
+    if shard:
+        yield start_idx, shard
+
+
+def _iter_results(executor, fn, iterable, max_pending):
+    """
+    Submits `fn` for each set of args in `iterable`, yielding results in
+    order while keeping at most `max_pending` tasks in flight
+    """
+    pending = collections.deque()
+    for args in iterable:
+        pending.append(executor.submit(fn, *args))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def process_entries_parallel(dictionary, entry_paths, window_size=None):
+    """
+    Parses windows of entries from `entry_paths` within a ProcessPoolExecutor;
+    entries are inserted by the parent process, which is the only writer.
+    """
+    if window_size is None:
+        window_size = settings.SV_ATLAS_INGESTION_DICTIONARY_WINDOW_SIZE
+    max_workers = settings.SV_ATLAS_INGESTION_CONCURRENCY or os.cpu_count()
+
+    root_path = get_root_path()
+    shards = (
+        (dictionary.id, start_idx, lines)
+        for start_idx, lines in _iter_shards(entry_paths, window_size)
+    )
+    logger.info("Processing entries, senses and citations")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # NOTE: avoids locking protocol errors from SQLite
+        connections.close_all()
+        # NOTE: Bounds the number of windows held in memory
+        max_pending = max_workers * 2
+        with tqdm() as pbar:
+            for window in _iter_results(executor, prepare_window, shards, max_pending):
+                root_path = _rebase_sense_paths(window["senses"], root_path)
+                pbar.update(len(window["entries"]))
+                _insert_window(dictionary, window)
 
 
 def _iter_values(paths):
@@ -263,7 +313,7 @@ def _create_dictionary(path):
     return dictionary, data
 
 
-def _process_jsonl_entries(path):
+def _process_jsonl_entries(path, parallel=False):
     metadata_path = Path(path, "metadata.json")
     if not metadata_path.exists():
         return
@@ -275,6 +325,8 @@ def _process_jsonl_entries(path):
     if not isinstance(entries, list):
         entries = [entries]
     entry_paths = [Path(path, e) for e in entries]
+    if parallel:
+        return process_entries_parallel(dictionary, entry_paths)
     entries = _iter_values(entry_paths)
     return process_entries(dictionary, entries, entry_count=None)
 
@@ -286,17 +338,18 @@ def _process_json_entries(path):
     return process_entries(dictionary, entries, entry_count)
 
 
-def _process_dictionary_path(path):
+def _process_dictionary_path(path, parallel=False):
     # TODO: Deprecate JSON?
     # TODO: Prefer JSONL spec to avoid memory headaches
     if path.is_dir():
-        return _process_jsonl_entries(path)
+        return _process_jsonl_entries(path, parallel=parallel)
     else:
         return _process_json_entries(path)
 
 
 # TODO: Standardize metadata, token annotations and dictionaries
 # values, JSON vs YML, etc
+@stage_inputs(lambda: hookset.get_dictionary_annotation_paths())
 def import_dictionaries(reset=False):
     if reset:
         Dictionary.objects.all().delete()
@@ -304,3 +357,19 @@ def import_dictionaries(reset=False):
     dictionary_paths = hookset.get_dictionary_annotation_paths()
     for path in dictionary_paths:
         _process_dictionary_path(path)
+
+
+@stage_inputs(lambda: hookset.get_dictionary_annotation_paths())
+def import_dictionaries_parallel(reset=False):
+    """
+    Parses the entries of JSONL dictionaries within a ProcessPoolExecutor.
+
+    Headword normalization and sense path calculation are handled by
+    worker processes, while the parent process inserts each window.
+    """
+    if reset:
+        Dictionary.objects.all().delete()
+
+    dictionary_paths = hookset.get_dictionary_annotation_paths()
+    for path in dictionary_paths:
+        _process_dictionary_path(path, parallel=True)
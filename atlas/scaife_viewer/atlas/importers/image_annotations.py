@@ -1,15 +1,22 @@
+import bisect
 import itertools
 import json
 import os
 
+from django.db.models import Max
+
+from scaife_viewer.atlas import constants
 from scaife_viewer.atlas.conf import settings
 
+from ..ingestion_pipeline import stage_inputs
 from ..models import (
     IMAGE_ANNOTATION_KIND_CANVAS,
     ImageAnnotation,
     ImageROI,
     Node,
 )
+from ..utils import chunked_bulk_create
+from .references import build_node_lookup
 
 
 ANNOTATIONS_DATA_PATH = os.path.join(
@@ -27,38 +34,77 @@ def get_paths():
     ]
 
 
-def _set_textparts(ia, references):
-    text_parts = set(Node.objects.filter(urn__in=references))
-    assert len(text_parts) == len(references)
-    if settings.SV_ATLAS_EXPAND_IMAGE_ANNOTATION_REFS:
-        # Link the annotation to all descendants of the retrieved text parts.
-        # NOTE: This may overlap with ROIs, but we decided to do it to
-        # improve the display of multiple folios per pagination chunk
-        # within the reader.
-        # FIXME: `get_tree` is broken due to changes we made with bulk ingestion
-        text_parts.update(
-            set(
-                itertools.chain.from_iterable(tp.get_descendants() for tp in text_parts)
-            )
-        )
-    ia.text_parts.set(text_parts)
+ImageAnnotationThroughModel = ImageAnnotation.text_parts.through
+ImageROIThroughModel = ImageROI.text_parts.through
 
+VERSION_DEPTH = constants.CTS_URN_DEPTHS["version"]
 
-def _prepare_rois(ia, rois):
-    for roi in rois:
-        iroi = ImageROI(
-            image_annotation=ia,
-            data=roi["data"],
-            image_identifier=ia.image_identifier,
-            coordinates_value=roi["data"]["urn:cite2:hmt:va_dse.v1.imageroi:"]
-            .rsplit(":", maxsplit=1)[1]
-            .split("@")[1],
+
+def _get_max_pk(model):
+    return model.objects.aggregate(max_pk=Max("pk"))["max_pk"] or 0
+
+
+def _get_created_pks(model, max_pk):
+    """
+    Returns the pks of objects created by `chunked_bulk_create`, in the
+    order they were created
+    """
+    return list(
+        model.objects.filter(pk__gt=max_pk).order_by("pk").values_list("pk", flat=True)
+    )
+
+
+def _get_version_path(path):
+    return path[: Node.steplen * VERSION_DEPTH]
+
+
+def _build_version_path_index(version_paths):
+    """
+    Returns sorted (path, pk) values for all nodes within each version;
+    used to expand references to their descendants without a query
+    per text part.
+    """
+    index = {}
+    for version_path in version_paths:
+        index[version_path] = list(
+            Node.objects.filter(path__startswith=version_path)
+            .order_by("path")
+            .values_list("path", "pk")
         )
-        # not using bulk create because of text_parts relation
-        iroi.save()
-        references = list(Node.objects.filter(urn__in=roi["references"]))
-        assert len(references) == len(roi["references"])
-        iroi.text_parts.set(references)
+    return index
+
+
+def _get_descendants(version_path_index, path):
+    values = version_path_index[_get_version_path(path)]
+    # NOTE: Descendants of a node are contiguous when sorted by path
+    start = bisect.bisect_right(values, (path, float("inf")))
+    descendants = []
+    for descendant_path, pk in itertools.islice(values, start, None):
+        if not descendant_path.startswith(path):
+            break
+        descendants.append((pk, descendant_path))
+    return descendants
+
+
+def _resolve_text_parts(references, node_lookup):
+    text_parts = [node_lookup[urn] for urn in references if urn in node_lookup]
+    assert len(set(text_parts)) == len(references)
+    return text_parts
+
+
+def _expand_text_parts(text_parts, version_path_index):
+    # Link the annotation to all descendants of the retrieved text parts.
+    # NOTE: This may overlap with ROIs, but we decided to do it to
+    # improve the display of multiple folios per pagination chunk
+    # within the reader.
+    expanded = set(text_parts)
+    for _, path in text_parts:
+        expanded.update(_get_descendants(version_path_index, path))
+    return expanded
+
+
+def _sorted_node_ids(text_parts):
+    return [pk for pk, _ in sorted(text_parts, key=lambda x: x[1])]
 
 
 def _prepare_image_annotations(path, counters):
@@ -75,25 +121,101 @@ def _prepare_image_annotations(path, counters):
             canvas_identifier=row["canvas_url"],
             image_identifier=row["image_url"],
         )
-        # not using bulk create because of text_parts relation
-        ia.save()
         counters["idx"] += 1
-        _set_textparts(ia, row["references"])
-        _prepare_rois(ia, row["regions_of_interest"])
-
-        created.append(ia)
+        created.append((ia, row))
     return created
 
 
+def _prepare_rois(ia_id, ia, rois):
+    for roi in rois:
+        iroi = ImageROI(
+            image_annotation_id=ia_id,
+            data=roi["data"],
+            image_identifier=ia.image_identifier,
+            coordinates_value=roi["data"]["urn:cite2:hmt:va_dse.v1.imageroi:"]
+            .rsplit(":", maxsplit=1)[1]
+            .split("@")[1],
+        )
+        yield iroi, roi["references"]
+
+
+def _prepare_through_objs(through_model, source_field_name, source_ids, node_ids):
+    for source_id, text_part_ids in zip(source_ids, node_ids):
+        # NOTE: sortedm2m sort values begin at 1
+        for sort_value, node_id in enumerate(text_part_ids, 1):
+            yield through_model(
+                **{source_field_name: source_id},
+                node_id=node_id,
+                sort_value=sort_value,
+            )
+
+
+@stage_inputs(lambda: [ANNOTATIONS_DATA_PATH])
 def import_image_annotations(reset=False):
     if reset:
         ImageAnnotation.objects.all().delete()
 
-    created = []
+    prepared = []
     # @@@ we might want to preserve sequence information if we have it
     counters = dict(idx=0)
     for path in get_paths():
-        created.extend(_prepare_image_annotations(path, counters))
+        prepared.extend(_prepare_image_annotations(path, counters))
+
+    max_pk = _get_max_pk(ImageAnnotation)
+    chunked_bulk_create(ImageAnnotation, [ia for ia, _ in prepared])
+    ia_ids = _get_created_pks(ImageAnnotation, max_pk)
 
-    created_count = len(created)
+    prepared_rois = []
+    for ia_id, (ia, row) in zip(ia_ids, prepared):
+        prepared_rois.extend(_prepare_rois(ia_id, ia, row["regions_of_interest"]))
+
+    max_pk = _get_max_pk(ImageROI)
+    chunked_bulk_create(ImageROI, [iroi for iroi, _ in prepared_rois])
+    roi_ids = _get_created_pks(ImageROI, max_pk)
+
+    urns = set()
+    for _, row in prepared:
+        urns.update(row["references"])
+    for _, references in prepared_rois:
+        urns.update(references)
+    node_lookup = build_node_lookup(urns)
+
+    ia_text_parts = [
+        _resolve_text_parts(row["references"], node_lookup) for _, row in prepared
+    ]
+    if settings.SV_ATLAS_EXPAND_IMAGE_ANNOTATION_REFS:
+        version_paths = set(
+            _get_version_path(path)
+            for text_parts in ia_text_parts
+            for _, path in text_parts
+        )
+        version_path_index = _build_version_path_index(version_paths)
+        ia_text_parts = [
+            _expand_text_parts(text_parts, version_path_index)
+            for text_parts in ia_text_parts
+        ]
+    chunked_bulk_create(
+        ImageAnnotationThroughModel,
+        _prepare_through_objs(
+            ImageAnnotationThroughModel,
+            "imageannotation_id",
+            ia_ids,
+            map(_sorted_node_ids, ia_text_parts),
+        ),
+    )
+
+    roi_text_parts = (
+        _resolve_text_parts(references, node_lookup) for _, references in prepared_rois
+    )
+    chunked_bulk_create(
+        ImageROIThroughModel,
+        _prepare_through_objs(
+            ImageROIThroughModel,
+            "imageroi_id",
+            roi_ids,
+            map(_sorted_node_ids, roi_text_parts),
+        ),
+    )
+
+    created_count = len(prepared)
     print(f"Created image annotations [count={created_count}]")
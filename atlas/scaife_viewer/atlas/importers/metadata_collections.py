@@ -6,6 +6,7 @@ import jsonlines
 from tqdm import tqdm
 
 from ..hooks import hookset
+from ..ingestion_pipeline import stage_inputs
 from ..models import Metadata, Node
 from ..utils import chunked_bulk_create, slice_large_list
 
@@ -157,6 +158,7 @@ def _create_metadata(path):
     _resolve_metadata_cts_relations(metadata_qs, through_lookup)
 
 
+@stage_inputs(lambda: hookset.get_metadata_collection_annotation_paths())
 def import_metadata(reset=False):
     if reset:
         Metadata.objects.all().delete()
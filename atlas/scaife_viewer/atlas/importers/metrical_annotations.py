@@ -3,7 +3,9 @@ import os
 
 from scaife_viewer.atlas.conf import settings
 
+from ..ingestion_pipeline import stage_inputs
 from ..models import MetricalAnnotation
+from .references import resolve_references_bulk
 
 
 # @@@ move these constants out to the data
@@ -144,6 +146,7 @@ class MetricalAnnotationProcessor:
             yield (line, foot_code, line_data)
 
 
+@stage_inputs(lambda: [ANNOTATIONS_DATA_PATH])
 def import_metrical_annotations(reset=False):
     if reset:
         MetricalAnnotation.objects.all().delete()
@@ -178,5 +181,4 @@ def import_metrical_annotations(reset=False):
     created = len(MetricalAnnotation.objects.bulk_create(to_create, batch_size=500))
     print(f"Created metrical annotations [count={created}]")
 
-    for metrical_annotation in MetricalAnnotation.objects.all():
-        metrical_annotation.resolve_references()
+    resolve_references_bulk(MetricalAnnotation.objects.all())
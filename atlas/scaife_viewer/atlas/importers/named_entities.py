@@ -6,7 +6,9 @@ import yaml
 
 from scaife_viewer.atlas.conf import settings
 
-from ..models import NamedEntity, NamedEntityCollection, Node
+from ..ingestion_pipeline import stage_inputs
+from ..models import NamedEntity, NamedEntityCollection, Node, Token
+from ..utils import chunked_bulk_create, slice_large_list
 
 
 NAMED_ENTITIES_DATA_PATH = os.path.join(
@@ -15,6 +17,8 @@ NAMED_ENTITIES_DATA_PATH = os.path.join(
 COLLECTIONS_DIR = os.path.join(NAMED_ENTITIES_DATA_PATH, "processed", "collections")
 STANDOFF_DIR = os.path.join(NAMED_ENTITIES_DATA_PATH, "processed", "standoff")
 
+NamedEntityThroughModel = NamedEntity.tokens.through
+
 
 def get_collection_paths():
     if not os.path.exists(COLLECTIONS_DIR):
@@ -26,29 +30,43 @@ def get_collection_paths():
     ]
 
 
+def _get_urn_pk_lookup(model, urns):
+    lookup = {}
+    for urn_slice in slice_large_list(urns):
+        lookup.update(model.objects.filter(urn__in=urn_slice).values_list("urn", "pk"))
+    return lookup
+
+
 def _load_collections(path, lookup):
     with open(path) as f:
         collection_data = yaml.safe_load(f)
-        collection = NamedEntityCollection.objects.create(
-            label=collection_data["label"],
-            urn=collection_data["urn"],
-            data=collection_data["metadata"],
+    collection = NamedEntityCollection.objects.create(
+        label=collection_data["label"],
+        urn=collection_data["urn"],
+        data=collection_data["metadata"],
+    )
+    rows = collection_data["entities"]
+    # TODO: Revisit this; entities that already exist (e.g. from another
+    # collection) are re-used rather than re-created
+    existing = _get_urn_pk_lookup(NamedEntity, [row["urn"] for row in rows])
+    to_create = {}
+    for row in rows:
+        urn = row["urn"]
+        if urn in existing or urn in to_create:
+            continue
+        to_create[urn] = NamedEntity(
+            urn=urn,
+            title=row["title"],
+            description=row["description"],
+            url=row["url"],
+            kind=row["kind"],
+            data=row.get("data", {}),
+            collection=collection,
         )
-        for row in collection_data["entities"]:
-            urn = row["urn"]
-            # TODO: Revisit this
-            named_entity, _ = NamedEntity.objects.get_or_create(
-                urn=urn,
-                defaults={
-                    "title": row["title"],
-                    "description": row["description"],
-                    "url": row["url"],
-                    "kind": row["kind"],
-                    "data": row.get("data", {}),
-                    "collection": collection,
-                },
-            )
-            lookup[named_entity.urn] = named_entity
+    chunked_bulk_create(NamedEntity, to_create.values())
+
+    lookup.update(existing)
+    lookup.update(_get_urn_pk_lookup(NamedEntity, list(to_create)))
 
 
 def get_standoff_paths():
@@ -63,15 +81,42 @@ def get_standoff_paths():
 
 def _apply_entities(path, lookup):
     with open(path, encoding="utf-8-sig") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            named_entity = lookup[row["named_entity_urn"]]
-            text_part = Node.objects.get(urn=row["ref"])
-            position = int(row["token_position"])
-            tokens = text_part.tokens.filter(position__in=[position])
-            named_entity.tokens.add(*tokens)
+        rows = [
+            (row["named_entity_urn"], row["ref"], int(row["token_position"]))
+            for row in csv.DictReader(f)
+        ]
+
+    refs = list(set(ref for _, ref, _ in rows))
+    text_part_lookup = _get_urn_pk_lookup(Node, refs)
+    missing_refs = set(refs).difference(text_part_lookup)
+    if missing_refs:
+        raise Node.DoesNotExist(
+            f'Could not resolve text parts [refs="{",".join(sorted(missing_refs))}"]'
+        )
+
+    token_lookup = {}
+    for text_part_ids in slice_large_list(list(text_part_lookup.values())):
+        token_values = Token.objects.filter(text_part_id__in=text_part_ids).values_list(
+            "text_part_id", "position", "pk"
+        )
+        for text_part_id, position, pk in token_values:
+            token_lookup[(text_part_id, position)] = pk
+
+    through_values = set()
+    for named_entity_urn, ref, position in rows:
+        named_entity_id = lookup[named_entity_urn]
+        token_id = token_lookup.get((text_part_lookup[ref], position))
+        if token_id:
+            through_values.add((named_entity_id, token_id))
+
+    through_objs = [
+        NamedEntityThroughModel(namedentity_id=named_entity_id, token_id=token_id)
+        for named_entity_id, token_id in sorted(through_values)
+    ]
+    chunked_bulk_create(NamedEntityThroughModel, through_objs, ignore_conflicts=True)
 
 
+@stage_inputs(lambda: [NAMED_ENTITIES_DATA_PATH])
 def apply_named_entities(reset=False):
     if reset:
         NamedEntityCollection.objects.all().delete()
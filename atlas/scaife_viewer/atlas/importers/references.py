@@ -0,0 +1,80 @@
+import logging
+
+from ..models import Node
+from ..utils import chunked_bulk_create, slice_large_list
+
+
+logger = logging.getLogger(__name__)
+
+
+def build_node_lookup(urns):
+    """
+    Returns a URN to (pk, path) lookup for the Node instances matching `urns`
+    """
+    lookup = {}
+    for urn_slice in slice_large_list(list(urns)):
+        node_values = Node.objects.filter(urn__in=urn_slice).values_list(
+            "urn", "pk", "path"
+        )
+        for urn, pk, path in node_values:
+            lookup[urn] = (pk, path)
+    return lookup
+
+
+def _bulk_prepare_reference_through_objects(qs, field_name, node_lookup, references):
+    through_model = getattr(qs.model, field_name).through
+    field = qs.model._meta.get_field(field_name)
+    source_field_name = f"{field.m2m_field_name()}_id"
+    target_field_name = f"{field.m2m_reverse_field_name()}_id"
+    # NOTE: Only set for SortedManyToManyField relations
+    sort_field_name = getattr(through_model, "_sort_field_name", None)
+
+    for obj_id, urns in references:
+        resolved = sorted(
+            (node_lookup[urn] for urn in urns if urn in node_lookup),
+            key=lambda x: x[1],
+        )
+        # NOTE: Mirrors `SortedRelatedManager.set`, where sort values begin at 1
+        for sort_value, (node_id, _) in enumerate(resolved, 1):
+            fields = {source_field_name: obj_id, target_field_name: node_id}
+            if sort_field_name:
+                fields[sort_field_name] = sort_value
+            yield through_model(**fields)
+
+
+def resolve_references_bulk(qs, field_name="text_parts"):
+    """
+    Bulk equivalent of `resolve_references` on annotation models.
+
+    Links each object in `qs` to the Node instances listed in
+    `data["references"]`, by building a single URN to pk lookup and
+    bulk inserting the sorted through objects for `field_name`.
+    """
+    logger.info("Extracting URNs from references")
+    references = []
+    urns = set()
+    reference_values = qs.exclude(data__references=None).values_list(
+        "pk", "data__references"
+    )
+    for obj_id, obj_urns in reference_values:
+        obj_urns = set(obj_urns)
+        references.append((obj_id, obj_urns))
+        urns.update(obj_urns)
+    msg = f"URNs extracted: {len(urns)}"
+    logger.info(msg)
+
+    logger.info("Building URN to Node pk lookup")
+    node_lookup = build_node_lookup(urns)
+    unresolved = urns.difference(node_lookup)
+    if unresolved:
+        msg = f'Could not resolve all references [unresolved_urns="{",".join(sorted(unresolved))}"]'
+        logger.warning(msg)
+
+    through_model = getattr(qs.model, field_name).through
+    relation_label = through_model._meta.verbose_name_plural
+    msg = f"Bulk creating {relation_label}"
+    logger.info(msg)
+    prepared_objs = _bulk_prepare_reference_through_objects(
+        qs, field_name, node_lookup, references
+    )
+    chunked_bulk_create(through_model, prepared_objs)
@@ -6,6 +6,7 @@ from github import Github
 
 from scaife_viewer.atlas.conf import settings
 
+from ..ingestion_pipeline import stage_inputs
 from ..models import Node, Repo
 from ..urn import URN
 
@@ -71,6 +72,7 @@ def import_repo(data, namespaces, text_groups, works, client=None):
     print(repo_obj.name)
 
 
+@stage_inputs(lambda: [ANNOTATIONS_DATA_PATH])
 def import_repo_metadata(reset=False):
     # TODO: this assumes that the metadata is made up of
     # GitHub repos
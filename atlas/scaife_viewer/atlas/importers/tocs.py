@@ -2,7 +2,12 @@ import json
 from collections import defaultdict
 from pathlib import Path
 
+from django.utils.translation import ugettext_noop
+
+from treebeard.exceptions import PathOverflow
+
 from scaife_viewer.atlas.conf import settings
+from scaife_viewer.atlas.ingestion_pipeline import stage_inputs
 from scaife_viewer.atlas.models import Node, TOCEntry
 from scaife_viewer.atlas.urn import URN
 from scaife_viewer.atlas.utils import chunked_bulk_create
@@ -24,25 +29,68 @@ def get_paths():
                 yield path
 
 
-def add_descendants(parent, children):
-    # TODO: Bulkify
-    for pos, item in enumerate(children):
-        uri = item["uri"]
-        urn = item.get("@id")
-        if urn is None:
-            urn = f"{parent.urn}:{pos}"
-        # TODO: Distinguish between title in the parent
-        # and title for the child; Iliad folios in particular;
-        # Probably YAGNI with proper breadcrumb support...
-        child = parent.add_child(
-            urn=urn,
-            uri=uri,
-            label=item.get("title", uri),
-            description=item.get("description", ""),
-        )
-        grandchildren = item.get("items")
-        if grandchildren:
-            add_descendants(child, grandchildren)
+def check_depth(path):
+    return len(path) > TOCEntry._meta.get_field("path").max_length
+
+
+def get_root_path():
+    last_root = TOCEntry.get_last_root_node()
+    if last_root:
+        return last_root._inc_path()
+    return TOCEntry._get_path(None, 1, 1)
+
+
+def build_entries(data, root_path):
+    """
+    Builds unsaved TOCEntry instances for a TOC, calculating materialized paths
+    and `numchild` in memory instead of calling `add_child` for each entry.
+    """
+    root = TOCEntry(
+        urn=data.get("@id"),
+        label=data.get("title"),
+        description=data.get("description"),
+        uri=data.get("@id"),
+        path=root_path,
+        depth=1,
+        numchild=0,
+    )
+    entries = [root]
+    to_visit = [(root, data.get("items"))]
+    while to_visit:
+        parent, children = to_visit.pop()
+        if not children:
+            continue
+        parent.numchild = len(children)
+        depth = parent.depth + 1
+        for pos, item in enumerate(children):
+            uri = item["uri"]
+            urn = item.get("@id")
+            if urn is None:
+                urn = f"{parent.urn}:{pos}"
+            path = TOCEntry._get_path(parent.path, depth, pos + 1)
+            if check_depth(path):
+                raise PathOverflow(
+                    ugettext_noop(
+                        "The new node is too deep in the tree, try"
+                        " increasing the path.max_length property"
+                        " and UPDATE your database"
+                    )
+                )
+            # TODO: Distinguish between title in the parent
+            # and title for the child; Iliad folios in particular;
+            # Probably YAGNI with proper breadcrumb support...
+            child = TOCEntry(
+                urn=urn,
+                uri=uri,
+                label=item.get("title", uri),
+                description=item.get("description", ""),
+                path=path,
+                depth=depth,
+                numchild=0,
+            )
+            entries.append(child)
+            to_visit.append((child, item.get("items")))
+    return entries
 
 
 def link_tocs(reset=True):
@@ -81,6 +129,7 @@ def link_tocs(reset=True):
     chunked_bulk_create(CTSThroughModel, to_create)
 
 
+@stage_inputs(lambda: [ANNOTATIONS_DATA_PATH])
 def process_tocs(reset=True):
     if reset:
         TOCEntry.objects.all().delete()
@@ -89,16 +138,8 @@ def process_tocs(reset=True):
         with path.open() as f:
             data = json.load(f)
         print(f"Processing {path.name}")
-        root = TOCEntry.add_root(
-            urn=data.get("@id"),
-            label=data.get("title"),
-            description=data.get("description"),
-            uri=data.get("@id"),
-        )
-        children = data.get("items")
-        if children:
-            add_descendants(root, children)
-        created_count = root.get_descendant_count() + 1
-        print(f"Entries created: {created_count}")
+        entries = build_entries(data, get_root_path())
+        chunked_bulk_create(TOCEntry, entries)
+        print(f"Entries created: {len(entries)}")
 
     link_tocs(reset=reset)
@@ -1,11 +1,15 @@
 import csv
 import os
 import re
+from itertools import islice
 
 import yaml
 
 from ..hooks import hookset
+from ..ingestion_pipeline import stage_inputs
 from ..models import Node, Token, TokenAnnotation, TokenAnnotationCollection
+from ..utils import QUERY_BATCH_SIZE, chunked_bulk_create, slice_large_list
+from .references import build_node_lookup
 
 VE_REF_PATTTERN = re.compile(r"(?P<ref>.*).t(?P<token>.*)")
 
@@ -24,17 +28,11 @@ def extract_ref_and_token_position(row):
     return (match["ref"], int(match["token"]), row)
 
 
-def extract_lookup_and_refs(path):
-    lookup = {}
-    refs = []
+def iter_rows(path):
     with open(path, encoding="utf-8-sig") as f:
         reader = csv.DictReader(f)
         for row in reader:
-            ref, position, data = extract_ref_and_token_position(row)
-            key = (ref, position)
-            refs.append(ref)
-            lookup[key] = data
-    return lookup, refs
+            yield extract_ref_and_token_position(row)
 
 
 def update_if_not_set(token, data, fields_to_update):
@@ -44,38 +42,94 @@ def update_if_not_set(token, data, fields_to_update):
             fields_to_update.add(k)
 
 
-def create_token_annotations(collection, version, lookup, refs):
-    # TODO: Relying on an "upsert" for annotations; likely we can
-    # optimize this further
-    text_part_urns = [f"{version.urn}{ref}" for ref in refs]
-    tokens = Token.objects.filter(text_part__urn__in=text_part_urns).select_related(
-        "text_part"
-    )
+def iter_tokens(text_part_ids):
+    """
+    Yields (text_part_id, position, token_id) for the tokens of
+    `text_part_ids`, ordered by text part and position
+    """
+    for ids_slice in slice_large_list(sorted(text_part_ids)):
+        tokens = Token.objects.filter(text_part_id__in=ids_slice).order_by(
+            "text_part_id", "position"
+        )
+        yield from tokens.values_list("text_part_id", "position", "pk")
 
-    to_create = []
-    for token in tokens:
-        # TODO: Update if not set was assuming we would have fields that could get clobbered; no longer true!
-        key = (token.text_part.ref, token.position)
 
-        # TODO: Add further error logging for this
-        try:
-            data = lookup[key]
-        except KeyError:
-            data = None
+def match_rows(version, rows):
+    """
+    Matches a chunk of (ref, position, data) `rows` to the tokens of `version`.
 
-        if not data:
+    Rows and tokens are both ordered by text part and position and merge
+    joined; returns the (token_id, data) matches and the unmatched rows.
+    """
+    text_part_urns = {f"{version.urn}{ref}" for ref, _, _ in rows}
+    text_part_lookup = build_node_lookup(text_part_urns)
+    keyed_rows = {}
+    unmatched = []
+    for ref, position, data in rows:
+        text_part = text_part_lookup.get(f"{version.urn}{ref}")
+        if text_part is None:
+            unmatched.append(data)
             continue
+        text_part_id, _ = text_part
+        keyed_rows[(text_part_id, position)] = data
+
+    matches = []
+    tokens = iter_tokens({text_part_id for text_part_id, _ in keyed_rows})
+    token = next(tokens, None)
+    for key, data in sorted(keyed_rows.items()):
+        while token and token[:2] < key:
+            token = next(tokens, None)
+        if token and token[:2] == key:
+            matches.append((token[2], data))
+            token = next(tokens, None)
+        else:
+            unmatched.append(data)
+    return matches, unmatched
+
+
+def create_token_annotations(collection, version, rows, chunk_size=QUERY_BATCH_SIZE):
+    """
+    Streams `rows` into TokenAnnotation instances in chunks of `chunk_size`
+    rows, so only a single chunk of rows and tokens is held in memory.
 
-        to_create.append(
-            TokenAnnotation(
-                token=token,
-                data=data,
-                collection=collection,
+    If a token is matched by more than one row, the last row wins.
+    """
+    count = 0
+    unmatched_count = 0
+    unmatched_sample = []
+    annotated_token_ids = set()
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        matches, unmatched = match_rows(version, chunk)
+        to_create = []
+        for token_id, data in matches:
+            if token_id in annotated_token_ids:
+                # NOTE: Matched by a row within an earlier chunk
+                TokenAnnotation.objects.filter(
+                    collection=collection, token_id=token_id
+                ).update(data=data)
+                continue
+            annotated_token_ids.add(token_id)
+            to_create.append(
+                TokenAnnotation(token_id=token_id, data=data, collection=collection)
             )
+        chunked_bulk_create(TokenAnnotation, to_create)
+        count += len(to_create)
+        unmatched_count += len(unmatched)
+        unmatched_sample.extend(
+            row["ve_ref"] for row in unmatched[: 5 - len(unmatched_sample)]
+        )
+
+    if unmatched_count:
+        print(
+            f'Could not match token annotations to tokens [version="{version.urn}" count={unmatched_count} ve_refs="{",".join(unmatched_sample)}"]'
         )
-    return len(TokenAnnotation.objects.bulk_create(to_create))
+    return count
 
 
+@stage_inputs(lambda: hookset.get_token_annotation_paths())
 def apply_token_annotations(reset=True):
     """
     @@@ this is just to get the treebank data loaded and queryable;
@@ -96,7 +150,6 @@ def apply_token_annotations(reset=True):
             continue
 
         values_path = path / values
-        lookup, refs = extract_lookup_and_refs(values_path)
         # TODO: Move this to metadata and or values
         version = resolve_version(values_path)
         if not version:
@@ -108,7 +161,7 @@ def apply_token_annotations(reset=True):
             urn=collection["urn"], label=collection["label"], metadata=metadata
         )
         annotations_count = create_token_annotations(
-            collection_obj, version, lookup, refs
+            collection_obj, version, iter_rows(values_path)
         )
         print(
             f'Created token annotations [version="{version.urn}" count={annotations_count}]'
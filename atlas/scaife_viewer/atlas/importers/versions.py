@@ -1,8 +1,9 @@
+import concurrent.futures
 import logging
-from collections import defaultdict
+from collections import Counter, defaultdict
 
 from django.conf import settings
-from django.db import IntegrityError
+from django.db import IntegrityError, connections
 from django.utils.translation import ugettext_noop
 
 from tqdm import tqdm
@@ -12,12 +13,23 @@ from scaife_viewer.atlas import constants
 from scaife_viewer.atlas.parallel_tokenizers import tokenize_text_parts_parallel
 
 from ..hooks import hookset
+from ..ingestion_pipeline import incremental_stage
+from ..manifest import (
+    VERSION_KEY_PREFIX,
+    delete_manifest_entries,
+    get_manifest,
+    get_version_digest,
+    update_manifest,
+)
 from ..models import Node, Token
+from ..resolvers.common import Library
 from ..urn import URN
 from ..utils import (
     chunked_bulk_create,
     chunked_bulk_delete,
+    chunked_bulk_update,
     get_lowest_citable_depth,
+    slice_large_list,
 )
 
 
@@ -30,13 +42,10 @@ For text-part level nodes, we see a massive performance
 benefit by batching and bulk inserting the nodes. This is
 also true for corpora with hundreds of work-part level nodes.
 
-Overriding `get_descendants` and `get_children` to use
-"live" queries allows us to skip manually setting the
-`numchild` value of of each node.
-
-Skipping the queries needed to set `numchild` speeds up
-ingestion time by 180% on a test data set (64 seconds vs
-184 seconds on one test dataset).
+`numchild` is calculated in memory as children are added;
+work part nodes may be inserted before all of their children
+have been generated, so their `numchild` values are updated
+once all nodes have been inserted (see `update_workpart_numchild`).
 """
 USE_BULK_INGESTION = True
 
@@ -175,6 +184,9 @@ class CTSImporter:
         child_node.depth = parent.depth + 1
 
         last_child = self.node_last_child_lookup.get(parent.urn)
+        if not last_child and self.partial_ingestion and parent.pk:
+            # NOTE: A parent retrieved from the database may already have children
+            last_child = parent.get_children().last()
         if not last_child:
             # The node had no children, adding the first child.
             child_node.path = Node._get_path(parent.path, child_node.depth, 1)
@@ -189,6 +201,7 @@ class CTSImporter:
         else:
             # Adding the new child as the last one.
             child_node.path = last_child._inc_path()
+        parent.numchild += 1
         self.node_last_child_lookup[parent.urn] = child_node
         self.nodes_to_create.append(child_node)
         return child_node
@@ -319,9 +332,56 @@ def get_first_value_for_language(values, lang, fallback=True):
     return value.get("value")
 
 
+def prune_text_parts(nodes, node_last_child_lookup):
+    """
+    Text parts are only referenced while their version is being imported;
+    work part nodes (and the last child of each work part) are kept so paths
+    can continue to be allocated for subsequent versions.
+    """
+    text_part_urns = [urn for urn, node in nodes.items() if node.rank]
+    for urn in text_part_urns:
+        del nodes[urn]
+        node_last_child_lookup.pop(urn, None)
+
+
+def update_workpart_numchild(nodes):
+    """
+    Persists the `numchild` values calculated in memory for work part nodes.
+
+    Text parts are inserted along with all of their children, but
+    work part nodes are inserted before (or, for roots, saved with) any
+    children from subsequent versions.
+    """
+    workpart_nodes = {node.urn: node for node in nodes if not node.rank}
+    to_update = []
+    for urns in slice_large_list(list(workpart_nodes)):
+        for pk, urn in Node.objects.filter(urn__in=urns).values_list("pk", "urn"):
+            to_update.append(Node(pk=pk, numchild=workpart_nodes[urn].numchild))
+    logger.info(f"Updating numchild for {len(to_update)} work part nodes")
+    chunked_bulk_update(Node, to_update, fields=["numchild"])
+
+
+def flush_nodes(to_defer, nodes, node_last_child_lookup):
+    chunked_bulk_create(Node, to_defer)
+    to_defer.clear()
+    prune_text_parts(nodes, node_last_child_lookup)
+
+
 # TODO: Determine best signature; do we decouple partial_ingestion or
 # infer it based on the predicate?
-def import_versions(reset=False, predicate=None, partial_ingestion=False):
+def import_versions(
+    reset=False, predicate=None, partial_ingestion=False, flush_threshold=None
+):
+    """
+    When `flush_threshold` (or `SV_ATLAS_INGESTION_NODE_FLUSH_THRESHOLD`) is
+    set, nodes are inserted once at least that many nodes are pending at the
+    end of a version, rather than once for the entire library.
+
+    This keeps peak memory bounded by the size of the largest version(s).
+    """
+    if flush_threshold is None:
+        flush_threshold = settings.SV_ATLAS_INGESTION_NODE_FLUSH_THRESHOLD
+
     if reset:
         Node.objects.filter(kind="nid").delete()
     # TODO: Wire up logging
@@ -367,13 +427,154 @@ def import_versions(reset=False, predicate=None, partial_ingestion=False):
 
             lookup = importer.node_last_child_lookup
 
+            if flush_threshold and len(to_defer) >= flush_threshold:
+                logger.debug(f"Inserting {len(to_defer)} nodes")
+                flush_nodes(to_defer, nodes, lookup)
+
     logger.info("Inserting Node tree")
     chunked_bulk_create(Node, to_defer)
+    update_workpart_numchild(nodes.values())
+    logger.info(f"{Node.objects.count()} total nodes on the tree.")
+
+
+def delete_version_nodes(version_urn):
+    """
+    Deletes a version node and its descendants (and their tokens)
+    """
+    nodes = Node.objects.filter(urn__startswith=version_urn)
+    if nodes.exists():
+        chunked_bulk_delete(nodes)
+
+
+@incremental_stage
+def import_versions_incremental(reset=False):
+    """
+    Ingests only the versions whose content or metadata changed since the
+    last ingestion, as recorded by `IngestionManifestEntry`; versions that
+    were removed from the library are deleted.
+
+    Returns the URNs of the versions that were changed or deleted.
+    """
+    if reset:
+        delete_manifest_entries(VERSION_KEY_PREFIX, get_manifest(VERSION_KEY_PREFIX))
+
+    logger.info("Resolving library")
+    library = hookset.resolve_library()
+
+    logger.info("Comparing versions against the ingestion manifest")
+    digests = {
+        urn: get_version_digest(version_data)
+        for urn, version_data in library.versions.items()
+    }
+    manifest = get_manifest(VERSION_KEY_PREFIX)
+    changed = [urn for urn, digest in digests.items() if manifest.get(urn) != digest]
+    removed = [urn for urn in manifest if urn not in digests]
+    logger.info(f"Versions changed: {len(changed)}; removed: {len(removed)}")
+
+    if reset:
+        import_versions(reset=True)
+    else:
+        for version_urn in [*changed, *removed]:
+            delete_version_nodes(version_urn)
+        if changed:
+            changed_urns = set(changed)
+            import_versions(
+                predicate=lambda x: x["urn"] in changed_urns, partial_ingestion=True
+            )
+
+    delete_manifest_entries(VERSION_KEY_PREFIX, removed)
+    update_manifest(VERSION_KEY_PREFIX, {urn: digests[urn] for urn in changed})
+    return [*changed, *removed]
+
+
+def get_version_library(library, version_urn):
+    """
+    Returns the subset of `library` required to import a single version
+    """
+    urn = URN(version_urn)
+    text_group_urn = urn.up_to(urn.TEXTGROUP)
+    work_urn = urn.up_to(urn.WORK)
+    return Library(
+        text_groups={text_group_urn: library.text_groups[text_group_urn]},
+        works={work_urn: library.works[work_urn]},
+        versions={urn.absolute: library.versions[urn.absolute]},
+    )
+
+
+def generate_version_nodes(library, version_data, workpart_nodes):
+    """
+    Generates the text part nodes for a version whose work part nodes
+    (and their paths) have already been allocated.
+
+    Invoked from ProcessPoolExecutor workers within `import_versions_parallel`.
+    """
+    importer_class = hookset.get_importer_class()
+    importer = importer_class(library, version_data, workpart_nodes)
+    return importer.apply()
+
+
+def import_versions_parallel(reset=False, predicate=None):
+    """
+    Allocates paths for text group, work and version nodes serially, then
+    generates the text part nodes for each version within a ProcessPoolExecutor.
+
+    The text parts for a version are independent of any other version
+    once the version's path is known, so only the work part nodes
+    must be allocated in order. Nodes are inserted by the parent process.
+    """
+    if reset:
+        Node.objects.filter(kind="nid").delete()
+
+    logger.info("Resolving library")
+    library = hookset.resolve_library()
+
+    to_ingest = list(library.versions.values())
+    if predicate:
+        to_ingest = list(filter(predicate, to_ingest))
+
+    logger.info("Allocating work part nodes")
+    importer_class = hookset.get_importer_class()
+    nodes = {}
+    lookup = None
+    workpart_nodes = []
+    version_args = []
+    for version_data in to_ingest:
+        importer = importer_class(library, version_data, nodes, lookup)
+        importer.generate_branch(urn=importer.urn)
+        workpart_nodes.extend(importer.nodes_to_create)
+        lookup = importer.node_last_child_lookup
+
+        branch_urns = {d["urn"] for d in importer.destructure_urn(importer.urn, None)}
+        version_args.append(
+            (
+                get_version_library(library, importer.urn.absolute),
+                version_data,
+                {urn: nodes[urn] for urn in branch_urns},
+            )
+        )
+
+    logger.info("Inserting work part nodes")
+    chunked_bulk_create(Node, workpart_nodes)
+
+    logger.info("Building text part nodes")
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=settings.SV_ATLAS_INGESTION_CONCURRENCY
+    ) as executor:
+        # NOTE: avoids locking protocol errors from SQLite
+        connections.close_all()
+        results = executor.map(generate_version_nodes, *zip(*version_args))
+        for (_, version_data, branch), version_nodes in zip(version_args, results):
+            logger.debug(f'{version_data["urn"]}: {len(version_nodes)} nodes.')
+            chunked_bulk_create(Node, version_nodes)
+            # NOTE: Workers add children to copies of the work part nodes
+            child_counts = Counter(node.path[: -Node.steplen] for node in version_nodes)
+            for node in branch.values():
+                node.numchild += child_counts[node.path]
+    update_workpart_numchild(nodes.values())
     logger.info(f"{Node.objects.count()} total nodes on the tree.")
 
 
 def reset_nodes(version_urn, fast_reset=False):
-    # FIXME: Remove customizations from Node so we can use default queryset methods?
     nodes = Node.objects.filter(urn__startswith=version_urn).filter(numchild=0)
     if not nodes:
         return
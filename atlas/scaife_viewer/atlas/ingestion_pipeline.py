@@ -1,4 +1,7 @@
+import concurrent.futures
+import contextlib
 import importlib
+import time
 
 from django.core.exceptions import ImproperlyConfigured
 
@@ -19,12 +22,239 @@ def load_path_attr(path):
     return attr
 
 
-def run_ingestion_pipeline(outf):
+def incremental_stage(func):
+    """
+    Marks an ingestion pipeline stage that updates existing data itself when
+    called with `reset=False` during an incremental ingestion; the stage
+    returns a truthy value if any data was changed
+    """
+    func._incremental_stage = True
+    return func
+
+
+def stage_inputs(get_paths):
+    """
+    Declares the files (or directories) an ingestion pipeline stage reads,
+    via a callable that returns their paths.
+
+    During an incremental ingestion, the stage is skipped if its inputs are
+    unchanged and none of the stages it depends on changed any data.
+    """
+
+    def decorator(func):
+        func._stage_inputs = get_paths
+        return func
+
+    return decorator
+
+
+class Stage:
+    def __init__(self, path, depends_on=None):
+        self.path = path
+        self.depends_on = list(depends_on or [])
+        self.func = load_path_attr(path)
+
+    @property
+    def incremental(self):
+        return getattr(self.func, "_incremental_stage", False)
+
+    def get_input_digest(self):
+        from .manifest import get_digest
+
+        get_paths = getattr(self.func, "_stage_inputs", None)
+        if get_paths is None:
+            return None
+        return get_digest(get_paths())
+
+    def __repr__(self):
+        return f"<Stage: {self.path}>"
+
+
+def get_stages(pipeline):
+    """
+    Builds stages from `SV_ATLAS_INGESTION_PIPELINE`.
+
+    Entries may be a path to a callable, or a `(path, depends_on)` tuple where
+    `depends_on` lists the paths of the stages that must complete first.
+
+    A path without declared dependencies depends on the entry before it,
+    preserving the order of the pipeline.
+    """
+    stages = {}
+    previous = None
+    for entry in pipeline:
+        if isinstance(entry, str):
+            path, depends_on = entry, [previous] if previous else []
+        else:
+            path, depends_on = entry
+        if path in stages:
+            raise ImproperlyConfigured(f"Duplicate ingestion pipeline stage: {path}")
+        for dependency in depends_on:
+            if dependency not in stages:
+                raise ImproperlyConfigured(
+                    f"Ingestion pipeline stage {path} depends on {dependency}, which must be listed before it"
+                )
+        stages[path] = Stage(path, depends_on)
+        previous = path
+    return list(stages.values())
+
+
+def get_atlas_connection():
+    from django.db import connections, router
+
+    from .models import Node
+
+    return connections[router.db_for_write(Node)]
+
+
+def get_deferred_index_tables(model_labels):
+    from django.apps import apps
+
+    tables = []
+    for label in model_labels:
+        model = apps.get_model(label)
+        tables.append(model._meta.db_table)
+        for field in model._meta.local_many_to_many:
+            tables.append(field.remote_field.through._meta.db_table)
+    return tables
+
+
+@contextlib.contextmanager
+def deferred_indexes(outf):
+    """
+    Drops the non-unique secondary indexes on the tables of
+    `SV_ATLAS_INGESTION_DEFERRED_INDEX_MODELS`, then recreates them once
+    ingestion has completed.
+
+    Unique indexes are left in place, as importers rely on them to
+    ignore or surface conflicts.
+    """
     from .conf import settings  # noqa; avoids race condition
 
-    pipeline_func_paths = settings.SV_ATLAS_INGESTION_PIPELINE
+    connection = get_atlas_connection()
+    if connection.vendor != "sqlite":
+        outf.write("--[Skipping deferred indexes; ATLAS database is not SQLite]--")
+        yield
+        return
+
+    tables = get_deferred_index_tables(
+        settings.SV_ATLAS_INGESTION_DEFERRED_INDEX_MODELS
+    )
+    placeholders = ", ".join(["%s"] * len(tables))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT name, sql FROM sqlite_master
+            WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN ({placeholders})
+            """,
+            tables,
+        )
+        indexes = [
+            (name, sql)
+            for name, sql in cursor.fetchall()
+            if not sql.startswith("CREATE UNIQUE INDEX")
+        ]
+        outf.write(f"--[Dropping {len(indexes)} secondary indexes]--")
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX "{name}"')
+
+    try:
+        yield
+    finally:
+        # NOTE: Indexes are recreated even if a stage fails, so that the
+        # database is left with its full schema
+        outf.write(f"--[Recreating {len(indexes)} secondary indexes]--")
+        start = time.perf_counter()
+        with connection.cursor() as cursor:
+            for _, sql in indexes:
+                cursor.execute(sql)
+        elapsed = time.perf_counter() - start
+        outf.write(f"--[Secondary indexes recreated in {elapsed:.2f}s]--")
+
+
+def run_stage(stage, outf, incremental=False, dependencies_changed=True):
+    """
+    Runs `stage` and returns True if it may have changed any data
+    """
+    from django.db import connections
+
+    from .manifest import STAGE_KEY_PREFIX, get_manifest, update_manifest
+    from .utils import lock_db_writes, release_transaction_lock
+
+    outf.write(f"--[{stage.path}]--")
+    start = time.perf_counter()
+    connection = get_atlas_connection()
+    try:
+        # NOTE: Stages that run concurrently write to the ATLAS database one
+        # statement (or transaction) at a time; files are parsed without
+        # holding the lock
+        with connection.execute_wrapper(lock_db_writes):
+            digest = stage.get_input_digest()
+            if incremental and digest and not dependencies_changed:
+                previous_digest = get_manifest(STAGE_KEY_PREFIX).get(stage.path)
+                if digest == previous_digest:
+                    outf.write(f"--[{stage.path} inputs unchanged; skipping]--")
+                    return False
+
+            # NOTE: Other stages are re-ran from scratch
+            reset = not (incremental and stage.incremental)
+            result = stage.func(reset=reset)
+            if digest:
+                update_manifest(STAGE_KEY_PREFIX, {stage.path: digest})
+    finally:
+        # NOTE: Stages run in worker threads, each with their own connections
+        connections.close_all()
+        release_transaction_lock()
+    elapsed = time.perf_counter() - start
+    outf.write(f"--[{stage.path} completed in {elapsed:.2f}s]--")
+    if reset:
+        return True
+    return bool(result)
+
+
+def run_ingestion_pipeline(outf, defer_indexes=False, incremental=False):
+    from .conf import settings  # noqa; avoids race condition
+
+    stages = get_stages(settings.SV_ATLAS_INGESTION_PIPELINE)
+    max_workers = settings.SV_ATLAS_INGESTION_PIPELINE_CONCURRENCY
+
+    start = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        if defer_indexes:
+            stack.enter_context(deferred_indexes(outf))
+        run_stages(stages, outf, max_workers, incremental=incremental)
+
+    elapsed = time.perf_counter() - start
+    outf.write(f"--[Ingestion pipeline completed in {elapsed:.2f}s]--")
+
+
+def run_stages(stages, outf, max_workers, incremental=False):
+    completed = set()
+    changed = set()
+    pending = list(stages)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        while pending or running:
+            for stage in list(pending):
+                if completed.issuperset(stage.depends_on):
+                    pending.remove(stage)
+                    future = executor.submit(
+                        run_stage,
+                        stage,
+                        outf,
+                        incremental=incremental,
+                        dependencies_changed=bool(
+                            changed.intersection(stage.depends_on)
+                        ),
+                    )
+                    running[future] = stage
 
-    for path in pipeline_func_paths:
-        func = load_path_attr(path)
-        outf.write(f"--[{path}]--")
-        func(reset=True)
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                stage = running.pop(future)
+                # NOTE: Re-raises any exception from the stage
+                if future.result():
+                    changed.add(stage.path)
+                completed.add(stage.path)
@@ -1,13 +1,17 @@
 import os
 import shutil
+import uuid
 from pathlib import Path
 
 from django.core.exceptions import ImproperlyConfigured
 from django.core.management import call_command
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 
+from scaife_viewer.atlas.apps import BUILD_DB_PATH_ENV_VAR
 from scaife_viewer.atlas.conf import settings
 from scaife_viewer.atlas.data_model import VERSION
+from scaife_viewer.atlas.display_mode_hints import update_display_mode_hints
 
 from ...hooks import hookset
 
@@ -30,23 +34,75 @@ class Command(BaseCommand):
             action="store_true",
             help="Keeps CTS resolver cache in place",
         )
+        parser.add_argument(
+            "--defer-indexes",
+            action="store_true",
+            help="Drops secondary indexes during ingestion and recreates them afterwards",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Updates the existing ATLAS database, skipping unchanged inputs",
+        )
+
+    def get_build_path(self, database_path):
+        """
+        Returns a sibling of `database_path`, so the built database can be
+        renamed into place atomically
+        """
+        path = Path(database_path)
+        return str(path.with_name(f".{path.name}.{uuid.uuid4().hex}.build"))
 
     def do_db_prep(self, database_path, *args, **options):
         db_path_exists = os.path.exists(database_path)
 
-        reset_data = options.get("force") or not db_path_exists
+        reset_data = (
+            options.get("force") or options.get("incremental") or not db_path_exists
+        )
         if not reset_data:
             self.stdout.write(f"Found existing ATLAS data at {database_path}")
             return
 
-        if db_path_exists:
-            os.remove(database_path)
-            self.stdout.write("--[Removed existing ATLAS database]--")
-        else:
+        if not db_path_exists:
             db_dir = os.path.dirname(database_path)
             os.makedirs(db_dir, exist_ok=True)
 
+        # NOTE: The database is built in a sibling file and then swapped into
+        # place, so processes serving the existing database are unaffected
+        build_path = self.get_build_path(database_path)
         db_label = settings.SV_ATLAS_DB_LABEL
+        connection = connections[db_label]
+        connection.close()
+        db_name = connection.settings_dict["NAME"]
+        connection.settings_dict["NAME"] = build_path
+        # NOTE: Processes started during the build (e.g. ProcessPoolExecutor
+        # workers) inherit the build path via the environment
+        previous_build_path = os.environ.get(BUILD_DB_PATH_ENV_VAR)
+        os.environ[BUILD_DB_PATH_ENV_VAR] = build_path
+        try:
+            if options.get("incremental") and db_path_exists:
+                self.stdout.write("--[Copying existing ATLAS database]--")
+                shutil.copy2(database_path, build_path)
+            self.build_db(db_label, **options)
+            connections.close_all()
+            os.replace(build_path, database_path)
+        except Exception as e:
+            # if we encounter an exception, we should not keep
+            # the partially built ATLAS database around
+            connections.close_all()
+            if os.path.exists(build_path):
+                self.stderr.write(f"Removing {os.path.basename(build_path)}")
+                os.unlink(build_path)
+            raise e
+        finally:
+            connection.settings_dict["NAME"] = db_name
+            if previous_build_path is None:
+                os.environ.pop(BUILD_DB_PATH_ENV_VAR)
+            else:
+                os.environ[BUILD_DB_PATH_ENV_VAR] = previous_build_path
+        self.stdout.write(f"--[Swapped ATLAS database into place at {database_path}]--")
+
+    def build_db(self, db_label, **options):
         self.stdout.write(f'--[Running database migrations on "{db_label}"]--')
         call_command("migrate", database=db_label)
 
@@ -59,7 +115,14 @@ class Command(BaseCommand):
                 self.stdout.write("--[Removed existing CTS resolver cache]--")
 
         self.stdout.write("--[Processing ATLAS ingestion pipeline]--")
-        hookset.run_ingestion_pipeline(self.stdout)
+        pipeline_kwargs = {}
+        for option in ["defer_indexes", "incremental"]:
+            if options.get(option):
+                pipeline_kwargs[option] = True
+        hookset.run_ingestion_pipeline(self.stdout, **pipeline_kwargs)
+
+        self.stdout.write("--[Refreshing display mode hints]--")
+        update_display_mode_hints()
 
     def handle(self, *args, **options):
         database_path = settings.SV_ATLAS_DB_PATH
@@ -77,13 +140,6 @@ class Command(BaseCommand):
         open(workfile, "w")
         try:
             self.do_db_prep(database_path, *args, **options)
-        except Exception as e:
-            # if we encounter an exception, we should not keep
-            # the ATLAS database around
-            if os.path.exists(database_path):
-                self.stderr.write(f"Removing {os.path.basename(database_path)}")
-                os.unlink(database_path)
-            raise e
         finally:
             if os.path.exists(workfile):
                 os.unlink(workfile)
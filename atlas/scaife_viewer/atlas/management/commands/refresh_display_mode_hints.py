@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from scaife_viewer.atlas.display_mode_hints import update_display_mode_hints
+
+
+class Command(BaseCommand):
+    """
+    Refreshes the display mode hints for each version
+    """
+
+    help = "Refreshes the display mode hints for each version"
+
+    def handle(self, *args, **options):
+        self.stdout.write("--[Refreshing display mode hints]--")
+        update_display_mode_hints()
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from .models import IngestionManifestEntry
+from .utils import chunked_bulk_create, slice_large_list
+
+
+VERSION_KEY_PREFIX = "version:"
+STAGE_KEY_PREFIX = "stage:"
+
+READ_CHUNK_SIZE = 2 ** 20
+
+
+def iter_files(paths):
+    """
+    Yields the files within `paths` (which may be files or directories)
+    in a stable order
+    """
+    for path in sorted(Path(p) for p in paths):
+        if path.is_dir():
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    yield Path(dirpath, filename)
+        elif path.exists():
+            yield path
+
+
+def get_digest(paths, extra=None):
+    """
+    Returns a SHA-256 digest of the names and contents of the files
+    within `paths`, along with any JSON-serializable `extra` data
+    """
+    digest = hashlib.sha256()
+    for path in iter_files(paths):
+        digest.update(str(path).encode("utf-8"))
+        with path.open("rb") as f:
+            for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    if extra is not None:
+        digest.update(json.dumps(extra, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def get_version_digest(version_data):
+    metadata = {k: v for k, v in version_data.items() if k != "path"}
+    paths = [version_data["path"]] if version_data.get("path") else []
+    return get_digest(paths, extra=metadata)
+
+
+def get_manifest(prefix):
+    """
+    Returns a lookup of manifest keys (without `prefix`) to digests
+    """
+    entries = IngestionManifestEntry.objects.filter(key__startswith=prefix)
+    return {
+        key[len(prefix) :]: digest
+        for key, digest in entries.values_list("key", "digest")
+    }
+
+
+def delete_manifest_entries(prefix, keys):
+    prefixed_keys = [f"{prefix}{key}" for key in keys]
+    for keys_slice in slice_large_list(prefixed_keys):
+        IngestionManifestEntry.objects.filter(key__in=keys_slice).delete()
+
+
+def update_manifest(prefix, digests):
+    """
+    Replaces the manifest entries for each key in `digests`
+    """
+    delete_manifest_entries(prefix, digests.keys())
+    to_create = [
+        IngestionManifestEntry(key=f"{prefix}{key}", digest=digest)
+        for key, digest in digests.items()
+    ]
+    chunked_bulk_create(IngestionManifestEntry, to_create)
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.28 on 2026-10-18 01:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scaife_viewer_atlas', '0017_merge_20231228_0809'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionManifestEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('digest', models.CharField(max_length=64)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.28 on 2026-10-18 09:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django_jsonfield_backport.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scaife_viewer_atlas', '0018_ingestionmanifestentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionDisplayModeHints',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', django_jsonfield_backport.models.JSONField(blank=True, default=dict)),
+                ('version', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='display_mode_hints_entry', to='scaife_viewer_atlas.Node')),
+            ],
+        ),
+    ]
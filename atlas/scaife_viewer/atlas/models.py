@@ -1,6 +1,5 @@
 import io
 import re
-from collections import defaultdict
 
 from django.core import serializers
 from django.db import models
@@ -16,7 +15,6 @@ from scaife_viewer.atlas import constants
 from scaife_viewer.atlas.conf import settings
 
 from .hooks import hookset
-from .managers import NodeManager
 
 
 class TextAlignment(models.Model):
@@ -350,8 +348,6 @@ class Node(MP_Node):
     # https://github.com/django-treebeard/django-treebeard/pull/143#issuecomment-1871226772
     alphabet = settings.SV_ATLAS_TREE_PATH_ALPHABET
 
-    objects = NodeManager()
-
     def __str__(self):
         return f"{self.kind}: {self.urn}"
 
@@ -390,16 +386,7 @@ class Node(MP_Node):
         if up_to and up_to not in constants.CTS_URN_NODES:
             raise ValueError(f"Invalid CTS node identifier for: {up_to}")
 
-        # NOTE: This filters the queryset using path__startswith,
-        # because the default `get_tree(parent=root)` uses `self.is_leaf
-        # and the current bulk ingestion into ATLAS does not populate
-        # `numchild`.
-        qs = cls._get_serializable_model().get_tree()
-        if root:
-            qs = qs.filter(
-                path__startswith=root.path,
-                # depth__gte=parent.depth
-            ).order_by("path")
+        qs = cls._get_serializable_model().get_tree(parent=root)
         if up_to:
             depth = constants.CTS_URN_DEPTHS[up_to]
             qs = qs.exclude(depth__gt=depth)
@@ -444,31 +431,6 @@ class Node(MP_Node):
             return Node.objects.none()
         return version.get_descendants().filter(rank=self.rank)
 
-    def get_descendants(self):
-        # NOTE: This overrides `get_descendants` to avoid checking
-        # `self.is_leaf`; current bulk ingestion into ATLAS
-        # does not populate numchild.
-        # TODO: populate numchild and remove override
-        parent = self
-        return (
-            self.__class__.objects.filter(
-                path__startswith=parent.path, depth__gte=parent.depth
-            )
-            .order_by("path")
-            .exclude(pk=parent.pk)
-        )
-
-    def get_children(self):
-        # NOTE: This overrides `get_children` to avoid checking
-        # `self.is_leaf`; current bulk ingestion into ATLAS
-        # does not populate numchild.
-        # TODO: populate numchild and remove override
-
-        return self.__class__.objects.filter(
-            depth=self.depth + 1,
-            path__range=self._get_children_path_interval(self.path),
-        ).order_by("path")
-
 
 # TODO: Consider CITE obj syntax here
 # Also need to figure out if CITE declrations would be helpful
@@ -550,19 +512,16 @@ class Token(models.Model):
         # For this implementation, we always calculate the index
         # within the text part, _not_ the passage. Also see
         # http://www.homermultitext.org/hmt-doc/cite/cts-subreferences.html
-        idx = defaultdict(int)
         pieces = text_part_node.text_content.split()
+        # @@@ the word value will discard punctuation or
+        # whitespace, which means we only support "true"
+        # subrefs for word tokens
+        word_values = [cls.get_word_value(piece) for piece in pieces]
+        subref_indexes = settings.SV_ATLAS_TOKEN_SUBREF_COUNTER(word_values)
         to_create = []
         for pos, piece in enumerate(pieces):
-            # @@@ the word value will discard punctuation or
-            # whitespace, which means we only support "true"
-            # subrefs for word tokens
-            w = cls.get_word_value(piece)
-            wl = len(w)
-            for wk in (w[i : j + 1] for i in range(wl) for j in range(i, wl)):
-                idx[wk] += 1
-            subref_idx = idx[w]
-            subref_value = f"{w}[{subref_idx}]"
+            w = word_values[pos]
+            subref_value = f"{w}[{subref_indexes[pos]}]"
 
             position = pos + 1
             # TODO: Further decouple `as_dict` so we could
@@ -926,3 +885,33 @@ class TOCEntry(MP_Node):
     cts_relations = SortedManyToManyField(
         "scaife_viewer_atlas.Node", related_name="toc_entries"
     )
+
+
+class IngestionManifestEntry(models.Model):
+    """
+    Records a digest of the inputs used to ingest a version or pipeline stage,
+    so unchanged inputs can be skipped when re-ingesting incrementally
+    """
+
+    key = models.CharField(max_length=255, unique=True)
+    digest = models.CharField(max_length=64)
+
+    def __str__(self):
+        return f"{self.key}: {self.digest}"
+
+
+class VersionDisplayModeHints(models.Model):
+    """
+    Records which display modes are supported by the annotations
+    of a version, so they can be served without querying each annotation
+    """
+
+    version = models.OneToOneField(
+        "scaife_viewer_atlas.Node",
+        on_delete=models.CASCADE,
+        related_name="display_mode_hints_entry",
+    )
+    data = JSONField(default=dict, blank=True)
+
+    def __str__(self):
+        return f"{self.version.urn}: {self.data}"
@@ -0,0 +1,175 @@
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+
+from graphene.relay import PageInfo
+
+
+KEYSET_CURSOR_PREFIX = "keyset:"
+
+# NOTE: Cursors are serialized as JSON, so only fields with JSON-compatible
+# values can be used to key a page
+KEYSET_FIELD_TYPES = {
+    "AutoField",
+    "BigAutoField",
+    "BigIntegerField",
+    "CharField",
+    "IntegerField",
+    "PositiveIntegerField",
+    "PositiveSmallIntegerField",
+    "SlugField",
+    "SmallIntegerField",
+    "TextField",
+}
+
+
+def get_keyset_field(model, name):
+    """
+    Returns the field used to order `model` by `name`, or None if
+    `name` cannot be compared within a keyset filter.
+
+    Nullable fields are excluded, as `NULL` values cannot be compared.
+    """
+    if name == "pk":
+        return model._meta.pk
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    if not field.concrete or field.null or field.is_relation:
+        return None
+    if field.get_internal_type() not in KEYSET_FIELD_TYPES:
+        return None
+    return field
+
+
+def get_keyset_ordering(queryset):
+    """
+    Returns the ordering of `queryset` as a list of attribute names
+    (prefixed with "-" when descending), with the primary key appended
+    to break any ties.
+
+    Returns None if `queryset` has been sliced or is ordered by expressions,
+    related fields or nullable fields, in which case it cannot be paginated
+    via keysets.
+    """
+    query = queryset.query
+    if not query.can_filter() or query.extra_order_by:
+        return None
+    if query.order_by:
+        order_by = query.order_by
+    elif query.default_ordering:
+        order_by = queryset.model._meta.ordering
+    else:
+        order_by = []
+
+    pk_attname = queryset.model._meta.pk.attname
+    ordering = []
+    for name in order_by:
+        if not isinstance(name, str):
+            return None
+        descending = name.startswith("-")
+        field = get_keyset_field(queryset.model, name.lstrip("-"))
+        if field is None:
+            return None
+        prefix = "-" if descending else ""
+        ordering.append(f"{prefix}{field.attname}")
+    if not any(name.lstrip("-") == pk_attname for name in ordering):
+        ordering.append(pk_attname)
+    return ordering
+
+
+def encode_keyset_cursor(obj, ordering):
+    values = [getattr(obj, name.lstrip("-")) for name in ordering]
+    cursor = f"{KEYSET_CURSOR_PREFIX}{json.dumps(values)}"
+    return base64.b64encode(cursor.encode("utf-8")).decode("ascii")
+
+
+def decode_keyset_cursor(cursor, ordering):
+    try:
+        decoded = base64.b64decode(cursor).decode("utf-8")
+        assert decoded.startswith(KEYSET_CURSOR_PREFIX)
+        values = json.loads(decoded[len(KEYSET_CURSOR_PREFIX) :])
+        assert isinstance(values, list) and len(values) == len(ordering)
+    except (AssertionError, TypeError, ValueError):
+        raise Exception(f'Invalid cursor [cursor="{cursor}"]')
+    return values
+
+
+def get_keyset_predicate(ordering, values, reverse=False):
+    """
+    Returns a predicate matching the rows that are ordered after the row
+    with `values` (or before it, when `reverse` is True):
+
+    (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+    """
+    predicate = Q()
+    preceding = Q()
+    for name, value in zip(ordering, values):
+        descending = name.startswith("-")
+        attname = name.lstrip("-")
+        lookup = "lt" if descending != reverse else "gt"
+        predicate |= preceding & Q(**{f"{attname}__{lookup}": value})
+        preceding &= Q(**{attname: value})
+    return predicate
+
+
+def reverse_ordering(ordering):
+    return [name[1:] if name.startswith("-") else f"-{name}" for name in ordering]
+
+
+def resolve_keyset_connection(connection_type, queryset, ordering, args):
+    """
+    Resolves a page of `queryset` by filtering on the `ordering` values
+    encoded within the `after` and `before` cursors, rather than by
+    counting and then offsetting into `queryset`.
+
+    The total count of `queryset` is only queried if requested.
+    """
+    first = args.get("first")
+    last = args.get("last")
+    after = args.get("after")
+    before = args.get("before")
+
+    page = queryset
+    if after:
+        values = decode_keyset_cursor(after, ordering)
+        page = page.filter(get_keyset_predicate(ordering, values))
+    if before:
+        values = decode_keyset_cursor(before, ordering)
+        page = page.filter(get_keyset_predicate(ordering, values, reverse=True))
+
+    has_previous_page = False
+    has_next_page = False
+    if first is None:
+        # NOTE: Query `last + 1` objects from the end of the page to
+        # determine if there is a previous page
+        objs = list(page.order_by(*reverse_ordering(ordering))[: last + 1])
+        has_previous_page = len(objs) > last
+        objs = objs[:last][::-1]
+    else:
+        objs = list(page.order_by(*ordering)[: first + 1])
+        has_next_page = len(objs) > first
+        objs = objs[:first]
+        if last is not None:
+            has_previous_page = len(objs) > last
+            objs = objs[-last:] if last else []
+
+    edges = [
+        connection_type.Edge(node=obj, cursor=encode_keyset_cursor(obj, ordering))
+        for obj in objs
+    ]
+    connection = connection_type(
+        edges=edges,
+        page_info=PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=has_previous_page,
+            has_next_page=has_next_page,
+        ),
+    )
+    connection.iterable = queryset
+    connection.length = None
+    return connection
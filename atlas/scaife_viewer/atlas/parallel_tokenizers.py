@@ -1,16 +1,18 @@
 import concurrent.futures
 import csv
 import logging
+import pickle
 import sqlite3
-import sys
+import tempfile
 import time
+from itertools import islice
 from pathlib import Path
-from tempfile import TemporaryDirectory
 
 import django
-import pandas
 import tqdm
 
+from .ingestion_pipeline import incremental_stage
+
 
 # NOTE: django.setup() is invoked due to how macOS spawns the ProcessPool workers;
 # as a result, the usual django imports are done slightly differently in this file.
@@ -19,6 +21,19 @@ django.setup()
 
 logger = logging.getLogger(__name__)
 
+TOKEN_TABLE_NAME = "scaife_viewer_atlas_token"
+TOKEN_FIELDS = [
+    "text_part_id",
+    "value",
+    "word_value",
+    "position",
+    "ve_ref",
+    "idx",
+    "subref_value",
+    "space_after",
+]
+TOKEN_INSERT_BATCH_SIZE = 10000
+
 
 def _get_lowest_citable_nodes(urn):
     # NOTE: This is done to wrap get_lowest_citable_nodes;
@@ -71,16 +86,53 @@ def write_to_csv(dirpath, urn, token_instances, fields=None):
 
 
 def insert_from_csv(path):
+    # NOTE: pandas is only required when inserting tokens from CSV;
+    # `tokenize_text_parts_parallel` inserts rows via `insert_token_rows`
+    import pandas
+
     logger.info("Inserting...")
     start = time.time()
-    table_name = "scaife_viewer_atlas_token"
     sv_atlas_db_name = django.conf.settings.DATABASES[
         django.conf.settings.SV_ATLAS_DB_LABEL
     ]["NAME"]
     conn = sqlite3.connect(sv_atlas_db_name)
-    pandas.read_csv(path).to_sql(table_name, conn, if_exists="append", index=False)
+    pandas.read_csv(path).to_sql(
+        TOKEN_TABLE_NAME, conn, if_exists="append", index=False
+    )
     end = time.time()
-    logger.info(f"Inserted tokens [elapsed={end - start}]", file=sys.stderr)
+    logger.info(f"Inserted tokens [elapsed={end - start}]")
+
+
+def prepare_token_rows(node_urn):
+    """
+    Returns prepared tokens as tuples of `TOKEN_FIELDS` values, which are
+    cheaper to pass back from ProcessPoolExecutor workers than dicts
+    """
+    from .hooks import hookset
+
+    tokens = hookset.get_prepared_tokens(node_urn)
+    return [tuple(token[field] for field in TOKEN_FIELDS) for token in tokens]
+
+
+def insert_token_rows(rows, batch_size=TOKEN_INSERT_BATCH_SIZE):
+    """
+    Inserts token rows via `executemany`, using one transaction per batch
+    """
+    Token = django.apps.apps.get_model("scaife_viewer_atlas.Token")
+    db_label = django.db.router.db_for_write(Token)
+    columns = ", ".join(TOKEN_FIELDS)
+    placeholders = ", ".join(["%s"] * len(TOKEN_FIELDS))
+    sql = f"INSERT INTO {TOKEN_TABLE_NAME} ({columns}) VALUES ({placeholders})"
+
+    connection = django.db.connections[db_label]
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        with django.db.transaction.atomic(using=db_label):
+            with connection.cursor() as cursor:
+                cursor.executemany(sql, batch)
 
 
 def tokenize_text_parts(dirpath, node_urn):
@@ -127,55 +179,69 @@ def tokenize_textparts_and_insert(dirpath, node_urn, reset=False):
 
 
 def tokenize_text_parts_parallel(node_urns):
+    """
+    Tokenizes versions within ProcessPoolExecutor workers; as each
+    worker completes, its token rows are spooled to a temporary file,
+    and are inserted by the parent process once all workers have finished.
+    """
     exceptions = []
     start = time.time()
-    paths_to_ingest = []
-    # TODO: Make tempdir configurable
-    tempdir = TemporaryDirectory()
-    dirpath = Path(tempdir.name)
-    with concurrent.futures.ProcessPoolExecutor(
-        max_workers=django.conf.settings.SV_ATLAS_INGESTION_CONCURRENCY
-    ) as executor:
-        # NOTE: avoids locking protocol errors from SQLite
-        django.db.connections.close_all()
-        urn_futures = {
-            executor.submit(tokenize_text_parts, dirpath, urn): urn for urn in node_urns
-        }
-        for f in tqdm.tqdm(
-            concurrent.futures.as_completed(urn_futures), total=len(node_urns)
-        ):
-            urn = urn_futures[f]
+    # NOTE: Rows are not inserted while workers are still reading text parts
+    # from the same SQLite database; spooling them to disk keeps memory usage
+    # bounded by the largest version
+    with tempfile.TemporaryFile() as spool:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=django.conf.settings.SV_ATLAS_INGESTION_CONCURRENCY
+        ) as executor:
+            # NOTE: avoids locking protocol errors from SQLite
+            django.db.connections.close_all()
+            urn_futures = {
+                executor.submit(prepare_token_rows, urn): urn for urn in node_urns
+            }
+            for f in tqdm.tqdm(
+                concurrent.futures.as_completed(urn_futures), total=len(node_urns)
+            ):
+                urn = urn_futures[f]
+                try:
+                    rows = f.result()
+                except Exception as exc:
+                    exceptions.append(exc)
+                    logger.info("{} generated an exception: {}".format(urn, exc))
+                    continue
+                if rows:
+                    pickle.dump(rows, spool, protocol=pickle.HIGHEST_PROTOCOL)
+
+        spool.seek(0)
+        while True:
             try:
-                path = f.result()
-                if path:
-                    paths_to_ingest.append(path)
-            except Exception as exc:
-                exceptions.append(exc)
-                logger.info("{} generated an exception: {}".format(urn, exc))
+                rows = pickle.load(spool)
+            except EOFError:
+                break
+            insert_token_rows(rows)
     if exceptions:
         raise exceptions[0]
 
-    process_csvs(paths_to_ingest)
     end = time.time()
     duration = "{:.2f}".format(end - start)
     logger.info(f"Elapsed: {duration}")
-    # TODO: call `cleanup` on failure too
-    tempdir.cleanup()
 
 
+@incremental_stage
 def tokenize_all_text_parts_parallel(node_urns=None, reset=False):
+    """
+    Unless `reset` is set, only versions and exemplars without tokens are
+    tokenized; returns the URNs that were tokenized
+    """
     from django.conf import settings
 
+    from .tokenizers import get_version_exemplar_urns
+
     Token = django.apps.apps.get_model("scaife_viewer_atlas.Token")
-    Node = django.apps.apps.get_model("scaife_viewer_atlas.Node")
 
     if reset:
         # NOTE: Using must specify the ATLAS db alias
         Token.objects.all()._raw_delete(using=settings.SV_ATLAS_DB_LABEL)
     if node_urns is None:
-        node_urns = list(
-            Node.objects.filter(kind__in=["version", "exemplar"]).values_list(
-                "urn", flat=True
-            )
-        )
-    return tokenize_text_parts_parallel(node_urns)
+        node_urns = get_version_exemplar_urns(reset=reset)
+    tokenize_text_parts_parallel(node_urns)
+    return node_urns
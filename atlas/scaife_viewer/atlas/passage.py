@@ -1,7 +1,18 @@
+import functools
+from collections import namedtuple
+
+from scaife_viewer.atlas.conf import settings
+
+from .citation_index import get_citation_index, get_db_identity
 from .models import Node as TextPart
 from .utils import extract_version_urn_and_ref, get_chunker
 
 
+ResolvedPassage = namedtuple(
+    "ResolvedPassage", ["reference", "healed", "version_id", "start_id", "end_id"]
+)
+
+
 class Passage:
     def __init__(self, reference):
         self.reference = reference
@@ -61,15 +72,23 @@ class Passage:
             self.initialize_version()
         return getattr(self, "_version")
 
+    def get_text_part_pk(self, ref):
+        pk = get_citation_index(self.version).get_pk(ref)
+        if pk is None:
+            raise TextPart.DoesNotExist(f"{self.version.urn}{ref} was not found.")
+        return pk
+
     def initialize_start_and_end_objs(self):
         refs = self.reference.rsplit(":", maxsplit=1)[1].split("-")
         first_ref = refs[0]
         last_ref = refs[-1]
-        if first_ref == last_ref:
-            start_obj = end_obj = self.version.get_descendants().get(ref=first_ref)
-        else:
-            start_obj = self.version.get_descendants().get(ref=first_ref)
-            end_obj = self.version.get_descendants().get(ref=last_ref)
+        # NOTE: Refs are resolved to pks via the citation index, so that
+        # start and end are retrieved with a single query
+        start_pk = self.get_text_part_pk(first_ref)
+        end_pk = self.get_text_part_pk(last_ref)
+        text_parts = TextPart.objects.in_bulk([start_pk, end_pk])
+        start_obj = text_parts[start_pk]
+        end_obj = start_obj if start_pk == end_pk else text_parts[end_pk]
 
         self._start_obj = start_obj
         self._end_obj = end_obj
@@ -272,3 +291,44 @@ class PassageMetadata:
             lcp = tp["ref"].split(".").pop()
             data.append({"lcp": lcp, "urn": tp.get("urn")})
         return data
+
+
+@functools.lru_cache(maxsize=settings.SV_ATLAS_PASSAGE_CACHE_SIZE)
+def _resolve_passage(reference, db_identity):
+    from .backports.scaife_viewer.cts import passage_heal
+
+    passage, healed = passage_heal(reference)
+    try:
+        start_id, end_id = passage.start.pk, passage.end.pk
+    except TextPart.DoesNotExist:
+        # NOTE: Defers the exception until start or end are accessed
+        start_id = end_id = None
+    return ResolvedPassage(
+        passage.reference, healed, passage.version.pk, start_id, end_id
+    )
+
+
+def resolve_passage(reference):
+    """
+    Heals `reference` and returns the resulting passage (with its version,
+    start and end objects) and whether or not it was healed.
+
+    Healing is memoized per process and ATLAS database, so repeated
+    references retrieve the version, start and end with a single query.
+    """
+    from .backports.scaife_viewer.cts.passage import Passage as HealedPassage
+
+    resolved = _resolve_passage(reference, get_db_identity())
+    pks = [resolved.version_id, resolved.start_id, resolved.end_id]
+    text_parts = TextPart.objects.in_bulk([pk for pk in pks if pk])
+
+    passage = HealedPassage(resolved.reference)
+    passage._version = text_parts[resolved.version_id]
+    if resolved.start_id:
+        passage._start_obj = text_parts[resolved.start_id]
+        passage._end_obj = text_parts[resolved.end_id]
+    return passage, resolved.healed
+
+
+def clear_passage_cache():
+    _resolve_passage.cache_clear()
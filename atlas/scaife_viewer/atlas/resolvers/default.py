@@ -1,4 +1,5 @@
 import json
+import logging
 import os
 
 from scaife_viewer.atlas.conf import settings
@@ -7,6 +8,9 @@ from .common import Library
 
 
 LIBRARY_DATA_PATH = os.path.join(settings.SV_ATLAS_DATA_DIR, "library")
+LIBRARY_MANIFEST_FORMAT = 1
+
+logger = logging.getLogger(__name__)
 
 
 class LibraryDataResolver:
@@ -52,6 +56,78 @@ class LibraryDataResolver:
         return self.text_groups, self.works, self.versions
 
 
+def get_library_stamps(data_dir_path):
+    """
+    Returns the modification times of each directory (and the modification
+    time and size of each `metadata.json` file) within `data_dir_path`.
+
+    Adding, removing or renaming a version file updates the mtime of its
+    directory, so version files themselves do not need to be checked.
+    """
+    stamps = {}
+    for dirpath, dirnames, filenames in os.walk(data_dir_path):
+        stamp = [os.stat(dirpath).st_mtime_ns]
+        if "metadata.json" in filenames:
+            metadata_stat = os.stat(os.path.join(dirpath, "metadata.json"))
+            stamp.extend([metadata_stat.st_mtime_ns, metadata_stat.st_size])
+        stamps[os.path.relpath(dirpath, data_dir_path)] = stamp
+    return stamps
+
+
+def load_library_manifest(manifest_path, data_dir_path, stamps):
+    """
+    Returns the text groups, works and versions from the manifest at
+    `manifest_path`, or None if it is missing or stale
+    """
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("format") != LIBRARY_MANIFEST_FORMAT:
+        return None
+    if manifest.get("data_dir_path") != data_dir_path:
+        return None
+    if manifest.get("stamps") != stamps:
+        return None
+    return manifest["text_groups"], manifest["works"], manifest["versions"]
+
+
+def write_library_manifest(manifest_path, data_dir_path, stamps, resolved):
+    text_groups, works, versions = resolved
+    manifest = {
+        "format": LIBRARY_MANIFEST_FORMAT,
+        "data_dir_path": data_dir_path,
+        "stamps": stamps,
+        "text_groups": text_groups,
+        "works": works,
+        "versions": versions,
+    }
+    # NOTE: Written to a sibling file and renamed into place, so concurrent
+    # readers never load a partially written manifest
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+    except OSError as e:
+        # NOTE: The library is still resolved, but is not cached
+        msg = f'Could not write library manifest [path="{manifest_path}" error="{e}"]'
+        logger.warning(msg)
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
 def resolve_library():
-    text_groups, works, versions = LibraryDataResolver(LIBRARY_DATA_PATH).resolved
+    manifest_path = settings.SV_ATLAS_LIBRARY_MANIFEST_PATH
+    if not manifest_path:
+        text_groups, works, versions = LibraryDataResolver(LIBRARY_DATA_PATH).resolved
+        return Library(text_groups, works, versions)
+
+    stamps = get_library_stamps(LIBRARY_DATA_PATH)
+    resolved = load_library_manifest(manifest_path, LIBRARY_DATA_PATH, stamps)
+    if resolved is None:
+        resolved = LibraryDataResolver(LIBRARY_DATA_PATH).resolved
+        write_library_manifest(manifest_path, LIBRARY_DATA_PATH, stamps, resolved)
+    text_groups, works, versions = resolved
     return Library(text_groups, works, versions)
@@ -1,19 +1,30 @@
 import os
 
-from django.db.models import Q
+from django.db.models import Q, QuerySet
 from django.utils.functional import cached_property
 
 import django_filters
-from graphene import Boolean, Connection, Field, ObjectType, String, relay
+from graphene import Boolean, Connection, Field, Int, ObjectType, String, relay
 from graphene.types import generic
 from graphene_django import DjangoObjectType
 from graphene_django.filter import DjangoFilterConnectionField
-from graphene_django.utils import camelize
+from graphene_django.utils import camelize, maybe_queryset
+from promise import Promise
+
+from scaife_viewer.atlas.conf import settings
 
 from . import constants
 
 # @@@ ensure convert signal is registered
 from .compat import convert_jsonfield_to_string  # noqa
+from .dataloaders import (
+    get_access_loader,
+    get_instance_loader,
+    get_related_loader,
+    get_sense_tree_loader,
+    get_text_part_by_token_loader,
+)
+from .display_mode_hints import get_display_mode_hints
 from .hooks import hookset
 from .language_utils import (
     icu_transliterator,
@@ -23,6 +34,8 @@ from .language_utils import (
 
 # from .models import Node as TextPart
 from .models import (
+    AttributionOrganization,
+    AttributionPerson,
     AttributionRecord,
     AudioAnnotation,
     Citation,
@@ -48,11 +61,14 @@ from .models import (
     Token,
     TokenAnnotation,
     TokenAnnotationCollection,
+    VersionDisplayModeHints,
 )
+from .pagination import get_keyset_ordering, resolve_keyset_connection
 from .passage import (
     PassageMetadata,
     PassageOverviewMetadata,
     PassageSiblingMetadata,
+    resolve_passage,
 )
 from .utils import (
     extract_version_urn_and_ref,
@@ -71,6 +87,17 @@ RESOLVE_CITATIONS_VIA_TEXT_PARTS = bool(
 TextPart = Node
 
 
+CONNECTION_ARGS = {"first", "last", "before", "after"}
+
+
+def has_filter_args(kwargs):
+    """
+    Returns True if any filters were passed to a connection field, in which
+    case related objects are queried rather than batched via a DataLoader
+    """
+    return bool(set(kwargs) - CONNECTION_ARGS)
+
+
 class LimitedConnectionField(DjangoFilterConnectionField):
     """
     Ensures that queries without `first` or `last` return up to
@@ -108,6 +135,37 @@ class LimitedConnectionField(DjangoFilterConnectionField):
             **resolver_kwargs,
         )
 
+    @classmethod
+    def resolve_connection(cls, connection, default_manager, args, iterable):
+        if settings.SV_ATLAS_KEYSET_PAGINATION:
+            queryset = maybe_queryset(default_manager if iterable is None else iterable)
+            ordering = None
+            if isinstance(queryset, QuerySet):
+                if queryset is not default_manager:
+                    queryset = cls.merge_querysets(default_manager, queryset)
+                ordering = get_keyset_ordering(queryset)
+            if ordering:
+                return resolve_keyset_connection(
+                    connection, queryset.order_by(*ordering), ordering, args
+                )
+        return super(LimitedConnectionField, cls).resolve_connection(
+            connection, default_manager, args, iterable
+        )
+
+
+class CountableConnection(Connection):
+    total_count = Int()
+
+    class Meta:
+        abstract = True
+
+    def resolve_total_count(self, info, *args, **kwargs):
+        # NOTE: Keyset pagination leaves `length` unset, so the count is
+        # only queried when `totalCount` is requested
+        if self.length is None:
+            self.length = self.iterable.count()
+        return self.length
+
 
 class PassageOverviewNode(ObjectType):
     all_top_level = generic.GenericScalar(
@@ -210,7 +268,7 @@ class PassageMetadataNode(ObjectType):
         return getattr(info.context, "healed_passage_reference", None)
 
 
-class PassageTextPartConnection(Connection):
+class PassageTextPartConnection(CountableConnection):
     metadata = Field(PassageMetadataNode)
 
     class Meta:
@@ -259,9 +317,14 @@ def initialize_passage(gql_context, reference):
 
     Where possible, we'll reference gql_context for consistency.
     """
-    from scaife_viewer.atlas.backports.scaife_viewer.cts import passage_heal
-
-    passage, healed = passage_heal(reference)
+    # NOTE: Passages are memoized for the duration of the request, as each
+    # filterset within a query resolves the same references
+    if not hasattr(gql_context, "passage_lookup"):
+        gql_context.passage_lookup = {}
+    if reference not in gql_context.passage_lookup:
+        gql_context.passage_lookup[reference] = resolve_passage(reference)
+
+    passage, healed = gql_context.passage_lookup[reference]
     gql_context.passage = passage
     if healed:
         gql_context.healed_passage_reference = passage.reference
@@ -271,8 +334,13 @@ def initialize_passage(gql_context, reference):
 class TextPartsReferenceFilterMixin:
     def get_lowest_textparts_queryset(self, value):
         value = initialize_passage(self.request, value)
-        version = self.request.passage.version
-        return get_textparts_from_passage_reference(value, version=version)
+        if not hasattr(self.request, "lowest_textparts_lookup"):
+            self.request.lowest_textparts_lookup = {}
+        lookup = self.request.lowest_textparts_lookup
+        if value not in lookup:
+            version = self.request.passage.version
+            lookup[value] = get_textparts_from_passage_reference(value, version=version)
+        return lookup[value]
 
 
 class PassageTextPartFilterSet(TextPartsReferenceFilterMixin, django_filters.FilterSet):
@@ -303,11 +371,23 @@ class AbstractTextPartNode(DjangoObjectType):
                 "filterset_class": TextPartFilterSet,
             }
         )
+        meta_options.setdefault("connection_class", CountableConnection)
         super().__init_subclass_with_meta__(**meta_options)
 
     def resolve_metadata(obj, *args, **kwargs):
         return camelize(obj.metadata)
 
+    def resolve_attribution_records(obj, info, **kwargs):
+        if has_filter_args(kwargs):
+            return obj.attribution_records.all()
+        # NOTE: Connections resolved from a list or a Promise skip
+        # `AttributionRecordNode.get_queryset`, so its `select_related` is not
+        # applied; only `AttributionRecordNode.resolve_name` loads the person
+        # and organization itself, and any other field that relies on
+        # `get_queryset` must do the same
+        loader = get_related_loader(info, AttributionRecord, "urns")
+        return loader.load(obj.pk)
+
 
 class TextGroupNode(AbstractTextPartNode):
     # @@@ work or version relations
@@ -353,6 +433,7 @@ class RepoNode(DjangoObjectType):
     class Meta:
         model = Repo
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filter_fields = ["name"]
 
     def resolve_versions(obj, *args, **kwargs):
@@ -377,13 +458,16 @@ class VersionNode(AbstractTextPartNode):
     def get_queryset(cls, queryset, info):
         # TODO: set a default somewhere
         # return queryset.filter(kind="version").order_by("urn")
-        return queryset.filter(depth=constants.CTS_URN_DEPTHS["version"]).order_by("pk")
+        return (
+            queryset.filter(depth=constants.CTS_URN_DEPTHS["version"])
+            .select_related("display_mode_hints_entry")
+            .order_by("pk")
+        )
 
     # TODO: Determine how tightly coupled these fields
     # should be to metadata (including ["key"] vs .get("key"))
     def resolve_access(obj, info, *args, **kwargs):
-        request = info.context
-        return hookset.can_access_urn(request, obj.urn)
+        return get_access_loader(info).load(obj.urn)
 
     def resolve_human_lang(obj, *args, **kwargs):
         lang = obj.metadata["lang"]
@@ -420,47 +504,20 @@ class VersionNode(AbstractTextPartNode):
         )
         return camelize(metadata)
 
-    # TODO: These are pretty strongly tied to the constants defined in
-    # scaife-viewer/frontend:
-    # https://github.com/scaife-viewer/frontend/blob/355522a29b2e3013ee217b590205f778203d72eb/packages/store/src/constants.js#L38
     def resolve_display_mode_hints(obj, *args, **kwargs):
-        # TODO: Memoize these lookups; for now, we'll rely on the frontend to cache
-        # the displayModeHints queries
-        has_token_annotations = TokenAnnotation.objects.filter(
-            token__text_part__urn__startswith=obj.urn
-        ).exists()
+        try:
+            hints = obj.display_mode_hints_entry.data
+        except VersionDisplayModeHints.DoesNotExist:
+            # NOTE: Hints are calculated by `update_display_mode_hints` at
+            # the end of ingestion; fall back to querying annotations
+            hints = get_display_mode_hints(obj)
         fallback_mode = obj.metadata.get("fallback_display_mode", False)
         default_mode = not fallback_mode
         data = {
             "default": default_mode,
             "fallback": fallback_mode,
-            "grammatical-entries": GrammaticalEntry.objects.filter(
-                tokens__text_part__urn__startswith=obj.urn
-            ).exists(),
-            "syntax-trees": TextAnnotation.objects.filter(
-                text_parts__urn__startswith=obj.urn
-            )
-            .filter(kind=constants.TEXT_ANNOTATION_KIND_SYNTAX_TREE)
-            .exists(),
-            "interlinear": has_token_annotations,
-            "metrical": MetricalAnnotation.objects.filter(
-                text_parts__urn__startswith=obj.urn
-            ).exists(),
-            "dictionary-entries": has_token_annotations
-            or Citation.objects.filter(text_parts__urn__startswith=obj.urn).exists(),
-            "commentaries": TextAnnotation.objects.filter(
-                text_parts__urn__startswith=obj.urn
-            )
-            .filter(kind=constants.TEXT_ANNOTATION_KIND_COMMENTARY)
-            .exists(),
-            "named-entities": NamedEntity.objects.filter(
-                tokens__text_part__urn__startswith=obj.urn
-            ).exists(),
-            "folio": ImageAnnotation.objects.filter(
-                roi__text_parts__urn__startswith=obj.urn
-            ).exists(),
-            "alignments": obj.text_alignments.exists(),
         }
+        data.update(hints)
         return camelize(data)
 
 
@@ -515,6 +572,7 @@ class TextPartByLemmaNode(DjangoObjectType):
     class Meta:
         model = TextPart
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filterset_class = TextPartByLemmaFilterSet
 
 
@@ -561,6 +619,7 @@ class TextAlignmentNode(DjangoObjectType):
     class Meta:
         model = TextAlignment
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filterset_class = TextAlignmentFilterSet
 
     def resolve_metadata(obj, info, *args, **kwargs):
@@ -705,7 +764,7 @@ class TextAlignmentMetadataNode(ObjectType):
         return self.language_map
 
 
-class TextAlignmentConnection(Connection):
+class TextAlignmentConnection(CountableConnection):
     metadata = Field(TextAlignmentMetadataNode)
 
     class Meta:
@@ -758,13 +817,29 @@ class TextAlignmentRecordNode(DjangoObjectType):
         # https://github.com/scaife-viewer/beyond-translation-site/issues/29
         return obj.metadata.get("items", None)
 
+    def resolve_relations(obj, info, **kwargs):
+        if has_filter_args(kwargs):
+            return obj.relations.all()
+        loader = get_related_loader(info, TextAlignmentRecordRelation, "record")
+        return loader.load(obj.pk)
+
 
 class TextAlignmentRecordRelationNode(DjangoObjectType):
     class Meta:
         model = TextAlignmentRecordRelation
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filter_fields = ["tokens__text_part__urn"]
 
+    def resolve_version(obj, info, **kwargs):
+        return get_instance_loader(info, Node).load(obj.version_id)
+
+    def resolve_tokens(obj, info, **kwargs):
+        if has_filter_args(kwargs):
+            return obj.tokens.all()
+        loader = get_related_loader(info, Token, "alignment_record_relations")
+        return loader.load(obj.pk)
+
 
 class TextAnnotationCollectionFilterSet(
     TextPartsReferenceFilterMixin, django_filters.FilterSet
@@ -792,6 +867,7 @@ class TextAnnotationCollectionNode(DjangoObjectType):
     class Meta:
         model = TextAnnotationCollection
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filterset_class = TextAnnotationCollectionFilterSet
 
 
@@ -827,6 +903,7 @@ class AbstractTextAnnotationNode(DjangoObjectType):
                 "filterset_class": TextAnnotationFilterSet,
             }
         )
+        meta_options.setdefault("connection_class", CountableConnection)
         super().__init_subclass_with_meta__(**meta_options)
 
     def resolve_data(obj, *args, **kwargs):
@@ -867,6 +944,7 @@ class MetricalAnnotationNode(DjangoObjectType):
     class Meta:
         model = MetricalAnnotation
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filter_fields = ["urn"]
 
 
@@ -893,6 +971,7 @@ class ImageAnnotationNode(DjangoObjectType):
     class Meta:
         model = ImageAnnotation
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filterset_class = ImageAnnotationFilterSet
 
 
@@ -910,6 +989,7 @@ class AudioAnnotationNode(DjangoObjectType):
     class Meta:
         model = AudioAnnotation
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filter_fields = ["urn"]
 
 
@@ -925,6 +1005,7 @@ class TokenNode(DjangoObjectType):
     class Meta:
         model = Token
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filterset_class = TokenFilterSet
 
     def resolve_transliterated_word_value(obj, *args, **kwargs):
@@ -953,6 +1034,7 @@ class TokenAnnotationCollectionNode(DjangoObjectType):
     class Meta:
         model = TokenAnnotationCollection
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filterset_class = TokenAnnotationCollectionFilterSet
 
 
@@ -979,6 +1061,7 @@ class TokenAnnotationNode(DjangoObjectType):
     class Meta:
         model = TokenAnnotation
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filterset_class = TokenAnnotationFilterSet
 
     def resolve_data(obj, *args, **kwargs):
@@ -1044,11 +1127,16 @@ class TokenAnnotationByLemmaNode(TokenAnnotationNode):
     class Meta:
         model = TokenAnnotation
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filterset_class = TokenAnnotationByLemmaFilterSet
 
     def resolve_text_part_urn(obj, info, **kwargs):
         # TODO: Denorm this further
-        return obj.token.text_part.urn
+        token_field = TokenAnnotation.token
+        if token_field.is_cached(obj) and Token.text_part.is_cached(obj.token):
+            return obj.token.text_part.urn
+        loader = get_text_part_by_token_loader(info)
+        return loader.load(obj.token_id).then(lambda text_part: text_part.urn)
 
     @classmethod
     def get_queryset(cls, queryset, info):
@@ -1077,6 +1165,7 @@ class NamedEntityCollectionNode(DjangoObjectType):
     class Meta:
         model = NamedEntityCollection
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filterset_class = NamedEntityCollectionFilterSet
 
 
@@ -1098,6 +1187,7 @@ class NamedEntityNode(DjangoObjectType):
     class Meta:
         model = NamedEntity
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filterset_class = NamedEntityFilterSet
 
 
@@ -1110,7 +1200,16 @@ class AttributionRecordFilterSet(django_filters.FilterSet):
 
     def reference_filter(self, queryset, name, value):
         # TODO: Handle path expansion, healed URNs, etc here
-        return queryset.filter(data__references__icontains=value)
+        node = Node.objects.filter(urn=value).first()
+        if node is None:
+            # NOTE: References that could not be resolved to nodes at
+            # ingestion are only available via `data`
+            return queryset.filter(data__references__icontains=value)
+        # NOTE: Matches records related to the node or its descendants;
+        # a range (unlike `path__startswith`) can use the path index on SQLite
+        max_length = Node._meta.get_field("path").max_length
+        upper_bound = node.path.ljust(max_length, Node.alphabet[-1])
+        return queryset.filter(urns__path__range=(node.path, upper_bound)).distinct()
 
 
 class AttributionRecordNode(DjangoObjectType):
@@ -1119,12 +1218,31 @@ class AttributionRecordNode(DjangoObjectType):
     class Meta:
         model = AttributionRecord
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filterset_class = AttributionRecordFilterSet
 
     @classmethod
     def get_queryset(cls, queryset, info):
         return queryset.select_related("person", "organization")
 
+    def resolve_name(obj, info, **kwargs):
+        fields = [AttributionRecord.person, AttributionRecord.organization]
+        if all(field.is_cached(obj) for field in fields):
+            return obj.name
+
+        def load(model, pk):
+            if pk is None:
+                return Promise.resolve(None)
+            return get_instance_loader(info, model).load(pk)
+
+        parts = [
+            load(AttributionPerson, obj.person_id),
+            load(AttributionOrganization, obj.organization_id),
+        ]
+        return Promise.all(parts).then(
+            lambda objs: ", ".join(obj.name for obj in objs if obj)
+        )
+
 
 class DictionaryNode(DjangoObjectType):
     # FIXME: Implement access checking for all queries
@@ -1133,6 +1251,7 @@ class DictionaryNode(DjangoObjectType):
     class Meta:
         model = Dictionary
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filter_fields = ["urn"]
 
 
@@ -1238,15 +1357,6 @@ class DictionaryEntryFilterSet(TextPartsReferenceFilterMixin, django_filters.Fil
         return queryset.filter(headword_normalized=value)
 
 
-def _crush_sense(tree):
-    # TODO: Prefer GraphQL Ids
-    urn = tree["data"].pop("urn")
-    tree["id"] = urn
-    tree.pop("data")
-    for child in tree.get("children", []):
-        _crush_sense(child)
-
-
 class DictionaryEntryNode(DjangoObjectType):
     headword_display = String()
     data = generic.GenericScalar()
@@ -1270,16 +1380,12 @@ class DictionaryEntryNode(DjangoObjectType):
 
     def resolve_sense_tree(obj, info, **kwargs):
         # TODO: Proper GraphQL field for crushed tree nodes
-        data = []
-        for sense in obj.senses.filter(depth=1):
-            tree = sense.dump_bulk(parent=sense)[0]
-            _crush_sense(tree)
-            data.append(tree)
-        return data
+        return get_sense_tree_loader(info).load(obj.pk)
 
     class Meta:
         model = DictionaryEntry
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filterset_class = DictionaryEntryFilterSet
 
 
@@ -1319,6 +1425,7 @@ class SenseNode(DjangoObjectType):
     class Meta:
         model = Sense
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filterset_class = SenseFilterSet
 
 
@@ -1367,6 +1474,7 @@ class CitationNode(DjangoObjectType):
     class Meta:
         model = Citation
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filterset_class = CitationFilterSet
 
 
@@ -1392,6 +1500,7 @@ class GrammaticalEntryCollectionNode(DjangoObjectType):
     class Meta:
         model = GrammaticalEntryCollection
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filterset_class = GrammaticalEntryCollectionFilterSet
 
 
@@ -1415,6 +1524,7 @@ class GrammaticalEntryNode(DjangoObjectType):
     class Meta:
         model = GrammaticalEntry
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filterset_class = GrammaticalEntryFilterSet
 
 
@@ -1442,6 +1552,7 @@ class TOCEntryNode(DjangoObjectType):
     class Meta:
         model = TOCEntry
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filterset_class = TOCEntryFilterSet
 
 
@@ -1497,6 +1608,7 @@ class MetadataNode(DjangoObjectType):
     class Meta:
         model = Metadata
         interfaces = (relay.Node,)
+        connection_class = CountableConnection
         filterset_class = MetadataFilterSet
 
         # TODO: Resolve with a future update to graphene-django
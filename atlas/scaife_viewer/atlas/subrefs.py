@@ -0,0 +1,143 @@
+"""
+Calculates the occurrence index used for CTS subreferences, e.g. `μῆνιν[1]`.
+
+Within a text part, the value for a word is the number of times that word
+has occurred as a substring (overlapping occurrences included) of the words
+up to and including itself.
+
+Also see http://www.homermultitext.org/hmt-doc/cite/cts-subreferences.html
+"""
+from collections import defaultdict, deque
+
+
+def count_subrefs_via_substrings(words):
+    """
+    Counts every substring of every word.
+
+    This is quadratic per word, but has very little overhead for the short
+    text parts found in most corpora.
+    """
+    idx = defaultdict(int)
+    subref_indexes = []
+    for w in words:
+        wl = len(w)
+        for wk in (w[i : j + 1] for i in range(wl) for j in range(i, wl)):
+            idx[wk] += 1
+        subref_indexes.append(idx[w])
+    return subref_indexes
+
+
+class SubrefAutomaton:
+    """
+    An Aho-Corasick automaton built from the (distinct) words of a text part.
+
+    Scanning a word visits one automaton state per character; a word `w`
+    occurs at each position whose state lies within the subtree of the state
+    for `w` in the failure link tree. Visits are recorded in a Fenwick tree
+    ordered by the failure tree's Euler tour, so both recording a visit and
+    counting the occurrences of a word are logarithmic in the number of
+    states.
+    """
+
+    def __init__(self, words):
+        self.goto = [{}]
+        self.terminals = {}
+        for word in words:
+            self.add_word(word)
+        self.fail = self.build_failure_links()
+        self.tin, self.tout = self.build_euler_tour()
+        self.tree = [0] * (len(self.goto) + 1)
+
+    def add_word(self, word):
+        if word in self.terminals:
+            return
+        state = 0
+        for char in word:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto.append({})
+                self.goto[state][char] = next_state
+            state = next_state
+        self.terminals[word] = state
+
+    def build_failure_links(self):
+        fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = fail[fallback]
+                candidate = self.goto[fallback].get(char, 0)
+                fail[next_state] = candidate if candidate != next_state else 0
+        return fail
+
+    def build_euler_tour(self):
+        children = defaultdict(list)
+        for state in range(1, len(self.goto)):
+            children[self.fail[state]].append(state)
+
+        tin = [0] * len(self.goto)
+        tout = [0] * len(self.goto)
+        counter = 0
+        stack = [(0, False)]
+        while stack:
+            state, exiting = stack.pop()
+            if exiting:
+                tout[state] = counter
+                continue
+            counter += 1
+            tin[state] = counter
+            stack.append((state, True))
+            stack.extend((child, False) for child in children[state])
+        return tin, tout
+
+    def transition(self, state, char):
+        while state and char not in self.goto[state]:
+            state = self.fail[state]
+        return self.goto[state].get(char, 0)
+
+    def record_visit(self, state):
+        pos = self.tin[state]
+        while pos < len(self.tree):
+            self.tree[pos] += 1
+            pos += pos & -pos
+
+    def prefix_sum(self, pos):
+        total = 0
+        while pos > 0:
+            total += self.tree[pos]
+            pos -= pos & -pos
+        return total
+
+    def scan(self, word):
+        # NOTE: Subreferences never span words, so each scan restarts at the root
+        state = 0
+        for char in word:
+            state = self.transition(state, char)
+            self.record_visit(state)
+
+    def count(self, word):
+        state = self.terminals[word]
+        return self.prefix_sum(self.tout[state]) - self.prefix_sum(self.tin[state] - 1)
+
+
+def count_subrefs_via_automaton(words):
+    """
+    Counts word occurrences via `SubrefAutomaton`, which is linear (up to a
+    logarithmic factor) in the number of characters within the text part.
+    """
+    automaton = SubrefAutomaton(w for w in words if w)
+    subref_indexes = []
+    for w in words:
+        if not w:
+            # NOTE: Mirrors `count_subrefs_via_substrings`, where a word
+            # without any characters is never counted
+            subref_indexes.append(0)
+            continue
+        automaton.scan(w)
+        subref_indexes.append(automaton.count(w))
+    return subref_indexes
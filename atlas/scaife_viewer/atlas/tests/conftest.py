@@ -0,0 +1,14 @@
+import pytest
+
+from scaife_viewer.atlas.citation_index import clear_citation_index_cache
+from scaife_viewer.atlas.passage import clear_passage_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # NOTE: Test databases are rolled back (reusing URNs and pks) between tests
+    clear_citation_index_cache()
+    clear_passage_cache()
+    yield
+    clear_citation_index_cache()
+    clear_passage_cache()
@@ -0,0 +1,169 @@
+import pytest
+
+from scaife_viewer.atlas.importers import alignments
+from scaife_viewer.atlas.models import (
+    Node,
+    TextAlignment,
+    TextAlignmentRecord,
+    TextAlignmentRecordRelation,
+    Token,
+)
+from scaife_viewer.atlas.urn import URN
+
+
+GREEK_URN = "urn:cts:greekLit:tlg0012.tlg001.perseus-grc2:"
+ENGLISH_URN = "urn:cts:greekLit:tlg0012.tlg001.perseus-eng4:"
+
+RECORD_PREFIX = "urn:cite2:ducat:alignments.temp:2019"
+ALIGNS = "urn:cite2:cite:verbs.v1:aligns"
+
+# (record, citation) pairs, in the (unsorted) order Ducat exports them
+CEX_ALIGNMENTS = [
+    ("3", f"{GREEK_URN}2.2"),
+    ("3", f"{ENGLISH_URN}2.1"),
+    ("1", f"{GREEK_URN}1.2"),
+    ("1", f"{GREEK_URN}1.1"),
+    ("1", f"{ENGLISH_URN}1.1"),
+    ("1", f"{ENGLISH_URN}1.3"),
+    ("2", f"{GREEK_URN}1.3"),
+    ("2", f"{GREEK_URN}2.1"),
+    ("4", f"{GREEK_URN}2.3"),
+]
+
+METADATA = {
+    "label": "Iliad Word Alignment",
+    "urn": "urn:cite2:scaife-viewer:alignment.v1:iliad-word-alignment",
+    "format": "ducat-cex",
+    "filename": "alignment.cex",
+    "versions": [GREEK_URN, ENGLISH_URN],
+}
+
+
+def _create_version(urn):
+    version = Node.add_root(urn=urn, kind="version")
+    for ref in ["1", "2"]:
+        line = version.add_child(urn=f"{urn}{ref}", kind="line", ref=ref, rank=1)
+        for position in range(1, 4):
+            Token.objects.create(
+                text_part=line,
+                value=f"{ref}.t{position}",
+                position=position,
+                idx=position - 1,
+            )
+
+
+def _process_cex_per_row(metadata):
+    """
+    Imports records and relations one row at a time, as `process_cex` did
+    before it used bulk inserts
+    """
+    versions = metadata["versions"]
+    path = alignments.os.path.join(alignments.RAW_PATH, metadata["filename"])
+    record_relations = alignments.extract_alignment_record_relations(versions, path)
+    records = alignments.build_sorted_records(versions, record_relations)
+
+    version_objs = [Node.objects.get(urn=version) for version in versions]
+    alignment = TextAlignment.objects.create(
+        label=metadata["label"], urn=metadata["urn"]
+    )
+    alignment.versions.set(version_objs)
+    for idx, (_, record_urn, relations) in enumerate(records):
+        record = TextAlignmentRecord.objects.create(
+            idx=idx, alignment=alignment, urn=record_urn
+        )
+        first_relation = None
+        for version_obj, relation in zip(version_objs, relations):
+            relation_obj = TextAlignmentRecordRelation.objects.create(
+                version=version_obj, record=record
+            )
+            first_relation = first_relation or relation_obj
+            tokens = []
+            for entry in relation:
+                ref = URN(entry).passage
+                text_part_ref, position = ref.rsplit(".", maxsplit=1)
+                tokens.append(
+                    Token.objects.get(
+                        text_part__urn=f"{version_obj.urn}{text_part_ref}",
+                        position=position,
+                    )
+                )
+            relation_obj.tokens.set(tokens)
+        tokens = list(first_relation.tokens.all())
+        if tokens:
+            refs = [tokens[0].text_part.ref]
+            if tokens[0].text_part_id != tokens[-1].text_part_id:
+                refs.append(tokens[-1].text_part.ref)
+            record.metadata["label"] = "-".join(refs)
+            record.save()
+
+
+def _get_alignment_snapshot():
+    alignment = TextAlignment.objects.get(urn=METADATA["urn"])
+    snapshot = [list(alignment.versions.order_by("pk").values_list("urn", flat=True))]
+    for record in alignment.records.order_by("idx"):
+        relations = [
+            (
+                relation.version.urn,
+                sorted(relation.tokens.values_list("pk", flat=True)),
+            )
+            for relation in record.relations.order_by("pk")
+        ]
+        snapshot.append((record.idx, record.urn, record.metadata, relations))
+    return snapshot
+
+
+@pytest.mark.django_db
+def test_process_cex(monkeypatch, tmp_path):
+    _create_version(GREEK_URN)
+    _create_version(ENGLISH_URN)
+    lines = [
+        f"{RECORD_PREFIX}{record}#{ALIGNS}#{citation}"
+        for record, citation in CEX_ALIGNMENTS
+    ]
+    (tmp_path / METADATA["filename"]).write_text("\n".join(["#!relations", *lines]))
+    monkeypatch.setattr(alignments, "RAW_PATH", str(tmp_path))
+
+    _process_cex_per_row(METADATA)
+    expected = _get_alignment_snapshot()
+    TextAlignment.objects.all().delete()
+
+    alignments.process_cex(METADATA)
+    assert _get_alignment_snapshot() == expected
+
+    # NOTE: Sanity checks the expected snapshot itself
+    records = expected[1:]
+    assert [record[1][-1] for record in records] == ["1", "2", "3", "4"]
+    assert [record[2] for record in records] == [
+        {"label": "1"},
+        {"label": "1-2"},
+        {"label": "2"},
+        {"label": "2"},
+    ]
+    tokens = dict(
+        ((token.text_part.urn, token.position), token.pk)
+        for token in Token.objects.select_related("text_part")
+    )
+    assert records[0][3] == [
+        (GREEK_URN, [tokens[(f"{GREEK_URN}1", 1)], tokens[(f"{GREEK_URN}1", 2)]]),
+        (
+            ENGLISH_URN,
+            [tokens[(f"{ENGLISH_URN}1", 1)], tokens[(f"{ENGLISH_URN}1", 3)]],
+        ),
+    ]
+    # NOTE: Relations without any aligned tokens are still created
+    assert records[3][3] == [
+        (GREEK_URN, [tokens[(f"{GREEK_URN}2", 3)]]),
+        (ENGLISH_URN, []),
+    ]
+
+
+@pytest.mark.django_db
+def test_process_cex_missing_token(monkeypatch, tmp_path):
+    _create_version(GREEK_URN)
+    _create_version(ENGLISH_URN)
+    line = f"{RECORD_PREFIX}1#{ALIGNS}#{GREEK_URN}1.9"
+    (tmp_path / METADATA["filename"]).write_text(line)
+    monkeypatch.setattr(alignments, "RAW_PATH", str(tmp_path))
+
+    with pytest.raises(Token.DoesNotExist):
+        alignments.process_cex(METADATA)
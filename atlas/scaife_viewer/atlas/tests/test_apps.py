@@ -0,0 +1,103 @@
+import concurrent.futures
+import multiprocessing
+import os
+
+from scaife_viewer.atlas import apps
+from scaife_viewer.atlas.apps import (
+    BUILD_DB_PATH_ENV_VAR,
+    get_db_file_identity,
+    reopen_swapped_atlas_db,
+)
+
+
+class FakeConnection:
+    vendor = "sqlite"
+    alias = "atlas"
+
+    def __init__(self, path):
+        self.settings_dict = {"NAME": path}
+        self.connection = object()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def _write_db(path, content):
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def test_get_db_file_identity_changes_on_swap(tmp_path):
+    db_path = tmp_path / "atlas.sqlite"
+    build_path = tmp_path / ".atlas.sqlite.build"
+    _write_db(db_path, "current")
+    identity = get_db_file_identity(db_path)
+    assert identity == get_db_file_identity(db_path)
+
+    _write_db(build_path, "rebuilt")
+    os.replace(build_path, db_path)
+    assert get_db_file_identity(db_path) != identity
+    assert get_db_file_identity(build_path) is None
+
+
+def test_reopen_swapped_atlas_db(settings, monkeypatch, tmp_path):
+    db_path = tmp_path / "atlas.sqlite"
+    _write_db(db_path, "current")
+    connection = FakeConnection(db_path)
+    apps.record_db_file_identity(sender=None, connection=connection)
+    monkeypatch.setattr(apps, "connections", {settings.SV_ATLAS_DB_LABEL: connection})
+
+    reopen_swapped_atlas_db(sender=None)
+    assert connection.closed is False
+
+    build_path = tmp_path / ".atlas.sqlite.build"
+    _write_db(build_path, "rebuilt")
+    os.replace(build_path, db_path)
+    reopen_swapped_atlas_db(sender=None)
+    assert connection.closed is True
+
+
+def get_atlas_db_file():
+    """
+    Returns the file opened by the ATLAS connection within a "spawn"-started
+    worker, which loads settings from scratch
+    """
+    import django
+    from django.conf import settings
+    from django.db import connections
+
+    # NOTE: The test settings do not define a separate ATLAS database
+    settings.SV_ATLAS_DB_LABEL = "default"
+    django.setup()
+    with connections["default"].cursor() as cursor:
+        cursor.execute("PRAGMA database_list")
+        return cursor.fetchone()[2]
+
+
+def test_prepare_atlas_db_build_path_in_workers(settings, monkeypatch, tmp_path):
+    # NOTE: Imported here, as workers import this module before Django is set up
+    from scaife_viewer.atlas.management.commands.prepare_atlas_db import Command
+
+    db_path = tmp_path / "atlas.sqlite"
+    settings.SV_ATLAS_DB_PATH = str(db_path)
+    settings.SV_ATLAS_DB_LABEL = "default"
+    opened = []
+
+    def build_db(self, db_label, **options):
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            opened.append(executor.submit(get_atlas_db_file).result())
+
+    monkeypatch.delenv(BUILD_DB_PATH_ENV_VAR, raising=False)
+    monkeypatch.setattr(Command, "build_db", build_db)
+    Command().do_db_prep(str(db_path), force=True)
+
+    (build_path,) = opened
+    assert os.path.dirname(build_path) == str(tmp_path)
+    assert os.path.basename(build_path).startswith(".atlas.sqlite.")
+    assert not os.path.exists(build_path)
+    # NOTE: The file opened by the worker was swapped into place
+    assert db_path.exists()
+    assert BUILD_DB_PATH_ENV_VAR not in os.environ
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from scaife_viewer.atlas.importers import attributions
+from scaife_viewer.atlas.models import (
+    AttributionOrganization,
+    AttributionPerson,
+    AttributionRecord,
+    Node,
+)
+from scaife_viewer.atlas.schema import AttributionRecordFilterSet
+
+
+VERSION_URN = "urn:cts:greekLit:tlg0012.tlg001.perseus-grc2:"
+OTHER_VERSION_URN = "urn:cts:greekLit:tlg0012.tlg002.perseus-grc2:"
+
+ATTRIBUTIONS = [
+    {
+        "role": "editor",
+        "person": {"name": "Gregory Crane"},
+        "organization": {"name": "Perseus Digital Library"},
+        "data": {"references": [VERSION_URN]},
+    },
+    {
+        "role": "annotator",
+        "person": {"name": "Gregory Crane"},
+        "organization": None,
+        "data": {"references": [f"{VERSION_URN}1.2", f"{VERSION_URN}1.1"]},
+    },
+    {
+        "role": "editor",
+        "person": None,
+        "organization": {"name": "Perseus Digital Library"},
+        "data": {"references": [OTHER_VERSION_URN]},
+    },
+]
+
+
+@pytest.mark.django_db
+def test_import_attributions(monkeypatch, tmp_path):
+    version = Node.add_root(urn=VERSION_URN, kind="version")
+    for ref in ["1.1", "1.2"]:
+        version.add_child(urn=f"{VERSION_URN}{ref}", kind="line", ref=ref, rank=1)
+    (tmp_path / "attributions.json").write_text(json.dumps(ATTRIBUTIONS))
+    monkeypatch.setattr(attributions, "ANNOTATIONS_DATA_PATH", str(tmp_path))
+
+    attributions.import_attributions(reset=True)
+
+    assert AttributionPerson.objects.count() == 1
+    assert AttributionOrganization.objects.count() == 1
+    records = list(AttributionRecord.objects.order_by("pk"))
+    assert [record.name for record in records] == [
+        "Gregory Crane, Perseus Digital Library",
+        "Gregory Crane",
+        "Perseus Digital Library",
+    ]
+    assert [list(r.urns.values_list("urn", flat=True)) for r in records] == [
+        [VERSION_URN],
+        [f"{VERSION_URN}1.1", f"{VERSION_URN}1.2"],
+        [],
+    ]
+
+    def filter_records(value):
+        queryset = AttributionRecord.objects.all()
+        filterset = AttributionRecordFilterSet({"reference": value}, queryset)
+        return list(filterset.qs.order_by("pk"))
+
+    assert filter_records(VERSION_URN) == records[:2]
+    assert filter_records(f"{VERSION_URN}1.1") == records[1:2]
+    # NOTE: Unresolved references fall back to `data`
+    assert filter_records(OTHER_VERSION_URN) == records[2:]
@@ -0,0 +1,79 @@
+import pytest
+
+from scaife_viewer.atlas.citation_index import get_citation_index
+from scaife_viewer.atlas.models import Node
+from scaife_viewer.atlas.passage import Passage
+from scaife_viewer.atlas.utils import (
+    build_textpart_predicate,
+    filter_via_ref_predicate,
+    get_lowest_citable_nodes,
+    get_textparts_from_passage_reference,
+)
+
+
+VERSION_URN = "urn:cts:greekLit:tlg0012.tlg001.perseus-grc2:"
+
+
+def _create_version():
+    nid = Node.add_root(urn="urn:", kind="nid")
+    namespace = nid.add_child(urn="urn:cts:", kind="namespace")
+    textgroup = namespace.add_child(urn="urn:cts:greekLit:tlg0012:", kind="textgroup")
+    work = textgroup.add_child(urn="urn:cts:greekLit:tlg0012.tlg001:", kind="work")
+    version = work.add_child(
+        urn=VERSION_URN, kind="version", metadata={"citation_scheme": ["book", "line"]},
+    )
+    line_idx = 0
+    for book_idx, book_ref in enumerate(["1", "2", "10"]):
+        book = version.add_child(
+            urn=f"{VERSION_URN}{book_ref}",
+            kind="book",
+            ref=book_ref,
+            rank=1,
+            idx=book_idx,
+        )
+        for line in range(1, 4):
+            ref = f"{book_ref}.{line}"
+            book.add_child(
+                urn=f"{VERSION_URN}{ref}", kind="line", ref=ref, rank=2, idx=line_idx
+            )
+            line_idx += 1
+    return version
+
+
+def _resolve_via_predicate(passage_reference, version):
+    queryset = get_lowest_citable_nodes(version)
+    _, ref = passage_reference.rsplit(":", maxsplit=1)
+    predicate = build_textpart_predicate(queryset, ref, 2)
+    return filter_via_ref_predicate(queryset, predicate)
+
+
+@pytest.mark.django_db
+def test_get_textparts_from_passage_reference(django_assert_num_queries):
+    version = _create_version()
+    get_citation_index(version)
+
+    for ref in ["", "1", "1.2", "1.2-2.1", "2-10", "1-1.2", "10.1", "3", "3-2.2"]:
+        reference = f"{VERSION_URN}{ref}"
+        with django_assert_num_queries(0):
+            queryset = get_textparts_from_passage_reference(reference, version)
+        expected = _resolve_via_predicate(reference, version)
+        assert list(queryset) == list(expected), ref
+
+    with pytest.raises(ValueError):
+        get_textparts_from_passage_reference(f"{VERSION_URN}1-", version)
+
+
+@pytest.mark.django_db
+def test_passage_start_and_end(django_assert_num_queries):
+    _create_version()
+
+    passage = Passage(f"{VERSION_URN}1.2-10")
+    passage.version
+    get_citation_index(passage.version)
+    with django_assert_num_queries(1):
+        assert passage.start.urn == f"{VERSION_URN}1.2"
+        assert passage.end.urn == f"{VERSION_URN}10"
+
+    passage = Passage(f"{VERSION_URN}1.4")
+    with pytest.raises(Node.DoesNotExist):
+        passage.start
@@ -0,0 +1,314 @@
+import graphene
+import pytest
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from scaife_viewer.atlas.hooks import hookset
+from scaife_viewer.atlas.models import (
+    AttributionOrganization,
+    AttributionPerson,
+    AttributionRecord,
+    Dictionary,
+    DictionaryEntry,
+    Node,
+    Sense,
+    TextAlignment,
+    TextAlignmentRecord,
+    TextAlignmentRecordRelation,
+    Token,
+    TokenAnnotation,
+    TokenAnnotationCollection,
+)
+from scaife_viewer.atlas.schema import Query
+
+
+VERSION_URN = "urn:cts:greekLit:tlg0012.tlg001.perseus-grc2:"
+
+schema = graphene.Schema(query=Query)
+
+
+def _execute(query):
+    request = RequestFactory().get("/graphql/")
+    with CaptureQueriesContext(connection) as context:
+        result = schema.execute(query, context_value=request)
+    assert not result.errors, result.errors
+    return result.data, len(context.captured_queries)
+
+
+def _create_lines(count):
+    version = Node.add_root(urn=VERSION_URN, kind="version")
+    lines = []
+    for pos in range(1, count + 1):
+        line = version.add_child(
+            urn=f"{VERSION_URN}1.{pos}", kind="line", ref=f"1.{pos}", rank=1, idx=pos
+        )
+        for idx in range(2):
+            Token.objects.create(
+                text_part=line, value=f"{pos}-{idx}", position=idx + 1, idx=idx
+            )
+        lines.append(line)
+    return version, lines
+
+
+def _create_alignment_records(version, count):
+    alignment = TextAlignment.objects.create(urn="urn:cite2:scaife-viewer:al:1")
+    tokens = list(Token.objects.order_by("pk"))
+    for idx in range(count):
+        record = TextAlignmentRecord.objects.create(
+            urn=f"urn:cite2:scaife-viewer:al.1:{idx}", idx=idx, alignment=alignment
+        )
+        for relation_tokens in [
+            tokens[idx * 2 : idx * 2 + 1],
+            tokens[idx * 2 + 1 :][:1],
+        ]:
+            relation = TextAlignmentRecordRelation.objects.create(
+                version=version, record=record
+            )
+            relation.tokens.set(relation_tokens)
+
+
+ALIGNMENT_RECORDS_QUERY = """
+{
+    textAlignmentRecords(first: %d) {
+        edges {
+            node {
+                urn
+                relations {
+                    edges {
+                        node {
+                            version { urn }
+                            tokens { edges { node { value } } }
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
+"""
+
+
+@pytest.mark.django_db
+def test_text_alignment_record_relations():
+    version, _ = _create_lines(6)
+    _create_alignment_records(version, 6)
+
+    data, small_count = _execute(ALIGNMENT_RECORDS_QUERY % 2)
+    assert len(data["textAlignmentRecords"]["edges"]) == 2
+
+    data, large_count = _execute(ALIGNMENT_RECORDS_QUERY % 6)
+    assert len(data["textAlignmentRecords"]["edges"]) == 6
+    assert large_count == small_count
+
+    relations = data["textAlignmentRecords"]["edges"][1]["node"]["relations"]
+    assert [
+        [t["node"]["value"] for t in r["node"]["tokens"]["edges"]]
+        for r in relations["edges"]
+    ] == [["2-0"], ["2-1"]]
+    assert relations["edges"][0]["node"]["version"] == {"urn": VERSION_URN}
+
+
+VERSIONS_QUERY = """
+{
+    versions(first: %d) {
+        edges { node { urn access } }
+    }
+}
+"""
+
+
+@pytest.mark.django_db
+def test_version_access(monkeypatch):
+    calls = []
+
+    def can_access_urns(request, urns):
+        calls.append(urns)
+        return [not urn.endswith("eng3:") for urn in urns]
+
+    monkeypatch.setattr(hookset, "can_access_urns", can_access_urns)
+    nid = Node.add_root(urn="urn:", kind="nid")
+    namespace = nid.add_child(urn="urn:cts:", kind="namespace")
+    textgroup = namespace.add_child(urn="urn:cts:greekLit:tlg0012:", kind="textgroup")
+    work = textgroup.add_child(urn="urn:cts:greekLit:tlg0012.tlg001:", kind="work")
+    for name in ["perseus-grc1", "perseus-grc2", "perseus-eng3", "perseus-eng4"]:
+        work.add_child(urn=f"urn:cts:greekLit:tlg0012.tlg001.{name}:", kind="version")
+
+    data, small_count = _execute(VERSIONS_QUERY % 1)
+    data, large_count = _execute(VERSIONS_QUERY % 4)
+    assert large_count == small_count
+    assert [e["node"]["access"] for e in data["versions"]["edges"]] == [
+        True,
+        True,
+        False,
+        True,
+    ]
+    assert len(calls) == 2
+    assert len(calls[-1]) == 4
+
+
+def _create_senses(entry, urn, children, path):
+    Sense.objects.create(
+        entry=entry,
+        urn=urn,
+        label="",
+        definition="",
+        idx=0,
+        path=path,
+        depth=len(path) // Sense.steplen,
+        numchild=len(children),
+    )
+    for pos, child in enumerate(children, 1):
+        child_path = Sense._get_path(path, len(path) // Sense.steplen + 1, pos)
+        _create_senses(entry, f"{urn}.{pos}", child, child_path)
+
+
+DICTIONARY_ENTRIES_QUERY = """
+{
+    dictionaryEntries(first: %d) {
+        edges { node { urn senseTree } }
+    }
+}
+"""
+
+
+@pytest.mark.django_db
+def test_dictionary_entry_sense_tree():
+    dictionary = Dictionary.objects.create(
+        label="LSJ", urn="urn:cite2:scaife-viewer:dictionaries.v1:lsj"
+    )
+    root_pos = 1
+    for idx in range(4):
+        entry = DictionaryEntry.objects.create(
+            headword=f"headword-{idx}",
+            idx=idx,
+            urn=f"urn:cite2:scaife-viewer:entries.v1:{idx}",
+            dictionary=dictionary,
+        )
+        for sense_idx in range(2):
+            _create_senses(
+                entry,
+                f"urn:cite2:scaife-viewer:senses.v1:{idx}.{sense_idx}",
+                [[[]], []],
+                Sense._get_path(None, 1, root_pos),
+            )
+            root_pos += 1
+
+    data, small_count = _execute(DICTIONARY_ENTRIES_QUERY % 1)
+    data, large_count = _execute(DICTIONARY_ENTRIES_QUERY % 4)
+    assert large_count == small_count
+
+    urn = "urn:cite2:scaife-viewer:senses.v1:3.1"
+    assert data["dictionaryEntries"]["edges"][3]["node"]["senseTree"][1] == {
+        "id": urn,
+        "children": [
+            {"id": f"{urn}.1", "children": [{"id": f"{urn}.1.1"}]},
+            {"id": f"{urn}.2"},
+        ],
+    }
+
+
+TEXT_PARTS_QUERY = """
+{
+    textParts(first: %d, depth: 2) {
+        edges {
+            node {
+                urn
+                attributionRecords { edges { node { name } } }
+            }
+        }
+    }
+}
+"""
+
+
+@pytest.mark.django_db
+def test_attribution_record_name():
+    _, lines = _create_lines(4)
+    person = AttributionPerson.objects.create(name="Jane Doe")
+    organization = AttributionOrganization.objects.create(name="Perseus")
+    for line in lines:
+        record = AttributionRecord.objects.create(
+            person=person, organization=organization, role="editor"
+        )
+        record.urns.add(line)
+
+    data, small_count = _execute(TEXT_PARTS_QUERY % 1)
+    data, large_count = _execute(TEXT_PARTS_QUERY % 4)
+    assert large_count == small_count
+
+    records = data["textParts"]["edges"][3]["node"]["attributionRecords"]
+    assert records["edges"] == [{"node": {"name": "Jane Doe, Perseus"}}]
+
+
+ATTRIBUTION_RECORDS_QUERY = """
+{
+    textParts(first: %d, depth: 2) {
+        edges {
+            node {
+                attributionRecords { edges { node { role } } }
+            }
+        }
+    }
+}
+"""
+
+
+@pytest.mark.django_db
+def test_text_part_attribution_records():
+    _, lines = _create_lines(4)
+    for line in lines:
+        for role in ["editor", "translator"]:
+            record = AttributionRecord.objects.create(role=role)
+            record.urns.add(line)
+
+    _, small_count = _execute(ATTRIBUTION_RECORDS_QUERY % 1)
+    data, large_count = _execute(ATTRIBUTION_RECORDS_QUERY % 4)
+    assert large_count == small_count
+
+    for edge in data["textParts"]["edges"]:
+        records = edge["node"]["attributionRecords"]["edges"]
+        assert [record["node"]["role"] for record in records] == [
+            "editor",
+            "translator",
+        ]
+
+
+TOKEN_ANNOTATIONS_BY_LEMMA_QUERY = """
+{
+    tokenAnnotationsByLemma(versionUrn: "%s", lemma: "μῆνις", first: %d) {
+        edges { node { textPartUrn } }
+    }
+}
+"""
+
+
+@pytest.mark.django_db
+def test_token_annotations_by_lemma_text_part_urn():
+    nid = Node.add_root(urn="urn:", kind="nid")
+    namespace = nid.add_child(urn="urn:cts:", kind="namespace")
+    textgroup = namespace.add_child(urn="urn:cts:greekLit:tlg0012:", kind="textgroup")
+    work = textgroup.add_child(urn="urn:cts:greekLit:tlg0012.tlg001:", kind="work")
+    version = work.add_child(
+        urn=VERSION_URN, kind="version", metadata={"citation_scheme": ["line"]}
+    )
+    collection = TokenAnnotationCollection.objects.create(
+        urn="urn:cite2:scaife-viewer:tokenannotations:1", label="Lemmas"
+    )
+    for pos in range(1, 5):
+        line = version.add_child(
+            urn=f"{VERSION_URN}{pos}", kind="line", ref=str(pos), rank=1, idx=pos
+        )
+        token = Token.objects.create(text_part=line, value="μῆνιν", position=1, idx=pos)
+        TokenAnnotation.objects.create(
+            token=token, collection=collection, data={"lemma": "μῆνις"}
+        )
+
+    _, small_count = _execute(TOKEN_ANNOTATIONS_BY_LEMMA_QUERY % (VERSION_URN, 1))
+    data, large_count = _execute(TOKEN_ANNOTATIONS_BY_LEMMA_QUERY % (VERSION_URN, 4))
+    assert large_count == small_count
+
+    edges = data["tokenAnnotationsByLemma"]["edges"]
+    assert [edge["node"]["textPartUrn"] for edge in edges] == [
+        f"{VERSION_URN}{pos}" for pos in range(1, 5)
+    ]
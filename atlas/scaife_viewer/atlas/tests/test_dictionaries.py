@@ -0,0 +1,139 @@
+import json
+
+import pytest
+
+from scaife_viewer.atlas.importers.dictionaries import (
+    _process_jsonl_entries,
+    process_entries,
+)
+from scaife_viewer.atlas.models import Citation, Dictionary, Node, Sense
+
+
+VERSION_URN = "urn:cts:greekLit:tlg0012.tlg001.perseus-grc2:"
+
+
+def _get_entries(prefix):
+    return [
+        {
+            "headword": "λόγος",
+            "urn": f"urn:cite2:scaife-viewer:entries.{prefix}:1",
+            "citations": [
+                {
+                    "urn": f"urn:cite2:scaife-viewer:citations.{prefix}:1",
+                    "data": {"urn": f"{VERSION_URN}1.1"},
+                }
+            ],
+            "senses": [
+                {
+                    "label": "A",
+                    "definition": "word",
+                    "urn": f"urn:cite2:scaife-viewer:senses.{prefix}:1",
+                    "children": [
+                        {
+                            "label": "I",
+                            "definition": "speech",
+                            "urn": f"urn:cite2:scaife-viewer:senses.{prefix}:2",
+                            "citations": [
+                                {
+                                    "urn": f"urn:cite2:scaife-viewer:citations.{prefix}:2",
+                                    "data": {"urn": f"{VERSION_URN}1.2"},
+                                }
+                            ],
+                        },
+                        {
+                            "label": "II",
+                            "definition": "reason",
+                            "urn": f"urn:cite2:scaife-viewer:senses.{prefix}:3",
+                        },
+                    ],
+                },
+            ],
+        },
+        {
+            "headword": "μῆνις",
+            "urn": f"urn:cite2:scaife-viewer:entries.{prefix}:2",
+            "senses": [
+                {
+                    "label": "A",
+                    "definition": "wrath",
+                    "urn": f"urn:cite2:scaife-viewer:senses.{prefix}:4",
+                }
+            ],
+        },
+    ]
+
+
+@pytest.mark.django_db
+def test_process_entries():
+    version = Node.add_root(urn=VERSION_URN, kind="version")
+    for ref in ["1.1", "1.2"]:
+        version.add_child(urn=f"{VERSION_URN}{ref}", kind="line", ref=ref, rank=1)
+
+    for prefix in ["lsj", "cunliffe"]:
+        dictionary = Dictionary.objects.create(
+            label=prefix, urn=f"urn:cite2:scaife-viewer:dictionaries.{prefix}:"
+        )
+        process_entries(dictionary, iter(_get_entries(prefix)), window_size=1)
+
+    senses = Sense.objects.filter(entry__dictionary__label="cunliffe")
+    assert list(senses.values_list("path", "depth", "numchild", "entry__idx")) == [
+        ("0003", 1, 2, 0),
+        ("00030001", 2, 0, 0),
+        ("00030002", 2, 0, 0),
+        ("0004", 1, 0, 1),
+    ]
+    assert [s.label for s in Sense.get_root_nodes()[0].get_children()] == ["I", "II"]
+
+    citation = Citation.objects.get(urn="urn:cite2:scaife-viewer:citations.lsj:2")
+    assert citation.sense.urn == "urn:cite2:scaife-viewer:senses.lsj:2"
+    assert citation.entry.urn == "urn:cite2:scaife-viewer:entries.lsj:1"
+    assert [tp.urn for tp in citation.text_parts.all()] == [f"{VERSION_URN}1.2"]
+
+    citation = Citation.objects.get(urn="urn:cite2:scaife-viewer:citations.lsj:1")
+    assert citation.sense is None
+    assert citation.entry.urn == "urn:cite2:scaife-viewer:entries.lsj:1"
+
+
+def _get_dictionary_values():
+    return (
+        list(
+            Sense.objects.values_list("urn", "path", "depth", "numchild", "entry__urn")
+        ),
+        list(Citation.objects.values_list("urn", "entry__urn", "sense__urn")),
+        list(
+            Citation.text_parts.through.objects.values_list(
+                "citation__urn", "node__urn"
+            )
+        ),
+    )
+
+
+@pytest.mark.django_db
+def test_process_jsonl_entries_parallel(settings, tmp_path):
+    settings.SV_ATLAS_INGESTION_CONCURRENCY = 2
+    settings.SV_ATLAS_INGESTION_DICTIONARY_WINDOW_SIZE = 1
+    version = Node.add_root(urn=VERSION_URN, kind="version")
+    for ref in ["1.1", "1.2"]:
+        version.add_child(urn=f"{VERSION_URN}{ref}", kind="line", ref=ref, rank=1)
+
+    for prefix in ["lsj", "cunliffe"]:
+        path = tmp_path / prefix
+        path.mkdir()
+        metadata = {
+            "label": prefix,
+            "urn": f"urn:cite2:scaife-viewer:dictionaries.{prefix}:",
+            "entries": ["entries.jsonl"],
+        }
+        (path / "metadata.json").write_text(json.dumps(metadata))
+        with (path / "entries.jsonl").open("w") as f:
+            for entry in _get_entries(prefix):
+                f.write(f"{json.dumps(entry)}\n")
+
+    for prefix in ["lsj", "cunliffe"]:
+        _process_jsonl_entries(tmp_path / prefix)
+    expected = _get_dictionary_values()
+    Dictionary.objects.all().delete()
+
+    for prefix in ["lsj", "cunliffe"]:
+        _process_jsonl_entries(tmp_path / prefix, parallel=True)
+    assert _get_dictionary_values() == expected
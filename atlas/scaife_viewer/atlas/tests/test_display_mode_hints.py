@@ -0,0 +1,109 @@
+import pytest
+
+from scaife_viewer.atlas import constants
+from scaife_viewer.atlas.display_mode_hints import (
+    build_display_mode_hints,
+    get_display_mode_hints,
+    update_display_mode_hints,
+)
+from scaife_viewer.atlas.models import (
+    Citation,
+    MetricalAnnotation,
+    Node,
+    TextAlignment,
+    TextAnnotation,
+)
+from scaife_viewer.atlas.schema import VersionNode
+
+
+WORK_URN = "urn:cts:greekLit:tlg0012.tlg001"
+
+
+def _create_versions():
+    nid = Node.add_root(urn="urn:", kind="nid")
+    namespace = nid.add_child(urn="urn:cts:", kind="namespace")
+    textgroup = namespace.add_child(urn="urn:cts:greekLit:tlg0012:", kind="textgroup")
+    work = textgroup.add_child(urn=f"{WORK_URN}:", kind="work")
+    versions = []
+    for name in ["perseus-grc2", "perseus-eng3"]:
+        version = work.add_child(
+            urn=f"{WORK_URN}.{name}:", kind="version", metadata={"lang": "grc"}
+        )
+        for ref in ["1", "2"]:
+            version.add_child(
+                urn=f"{WORK_URN}.{name}:{ref}", kind="book", ref=ref, rank=1
+            )
+        versions.append(version)
+    return versions
+
+
+@pytest.mark.django_db
+def test_build_display_mode_hints():
+    greek, english = _create_versions()
+    greek_line = Node.objects.get(urn=f"{greek.urn}2")
+    english_line = Node.objects.get(urn=f"{english.urn}1")
+
+    metrical = MetricalAnnotation.objects.create(html_content="", short_form="", idx=0)
+    metrical.text_parts.add(greek_line)
+    commentary = TextAnnotation.objects.create(
+        kind=constants.TEXT_ANNOTATION_KIND_COMMENTARY, idx=0
+    )
+    commentary.text_parts.add(english_line)
+    citation = Citation.objects.create(urn="urn:cite2:scaife-viewer:citations:1")
+    citation.text_parts.add(greek_line)
+    alignment = TextAlignment.objects.create(urn="urn:cite2:scaife-viewer:al:1")
+    alignment.versions.add(english)
+
+    hints = build_display_mode_hints()
+    assert hints == {
+        greek.pk: get_display_mode_hints(greek),
+        english.pk: get_display_mode_hints(english),
+    }
+    assert [k for k, v in hints[greek.pk].items() if v] == [
+        "metrical",
+        "dictionary-entries",
+    ]
+    assert [k for k, v in hints[english.pk].items() if v] == [
+        "commentaries",
+        "alignments",
+    ]
+
+
+@pytest.mark.django_db
+def test_build_display_mode_hints_exemplar():
+    greek, english = _create_versions()
+    exemplar = greek.add_child(
+        urn=f"{WORK_URN}.perseus-grc2.tokenized:", kind="exemplar"
+    )
+    exemplar_line = exemplar.add_child(
+        urn=f"{exemplar.urn}1", kind="book", ref="1", rank=1
+    )
+
+    # NOTE: Annotations of exemplar text parts do not apply to the version
+    syntax_tree = TextAnnotation.objects.create(
+        kind=constants.TEXT_ANNOTATION_KIND_SYNTAX_TREE, idx=0
+    )
+    syntax_tree.text_parts.add(exemplar_line)
+    metrical = MetricalAnnotation.objects.create(html_content="", short_form="", idx=0)
+    metrical.text_parts.add(exemplar_line, Node.objects.get(urn=f"{greek.urn}1"))
+
+    hints = build_display_mode_hints()
+    assert hints == {
+        greek.pk: get_display_mode_hints(greek),
+        english.pk: get_display_mode_hints(english),
+    }
+    assert [k for k, v in hints[greek.pk].items() if v] == ["metrical"]
+
+
+@pytest.mark.django_db
+def test_resolve_display_mode_hints(django_assert_num_queries):
+    _create_versions()
+    versions = VersionNode.get_queryset(Node.objects.all(), None)
+    expected = [VersionNode.resolve_display_mode_hints(v) for v in versions]
+    assert expected[0]["default"] is True
+
+    update_display_mode_hints()
+    versions = list(VersionNode.get_queryset(Node.objects.all(), None))
+    with django_assert_num_queries(0):
+        resolved = [VersionNode.resolve_display_mode_hints(v) for v in versions]
+    assert resolved == expected
@@ -0,0 +1,154 @@
+import json
+
+import pytest
+
+from scaife_viewer.atlas.importers import image_annotations
+from scaife_viewer.atlas.models import ImageAnnotation, ImageROI, Node
+
+
+VERSION_URN = "urn:cts:greekLit:tlg0012.tlg001.perseus-grc2:"
+ROI_KEY = "urn:cite2:hmt:va_dse.v1.imageroi:"
+
+
+def _create_version():
+    nid = Node.add_root(urn="urn:", kind="nid")
+    namespace = nid.add_child(urn="urn:cts:", kind="namespace")
+    textgroup = namespace.add_child(urn="urn:cts:greekLit:tlg0012:", kind="textgroup")
+    work = textgroup.add_child(urn="urn:cts:greekLit:tlg0012.tlg001:", kind="work")
+    version = work.add_child(urn=VERSION_URN, kind="version")
+    for book_ref in ["1", "2", "3"]:
+        book = version.add_child(
+            urn=f"{VERSION_URN}{book_ref}", kind="book", ref=book_ref
+        )
+        for line in ["1", "2"]:
+            ref = f"{book_ref}.{line}"
+            book.add_child(urn=f"{VERSION_URN}{ref}", kind="line", ref=ref)
+
+
+def _roi(coordinates, refs):
+    return {
+        "data": {ROI_KEY: f"urn:cite2:hmt:vaimg.2017a:VA012RN_0013@{coordinates}"},
+        "references": [f"{VERSION_URN}{ref}" for ref in refs],
+    }
+
+
+def _annotation(idx, refs, rois):
+    return {
+        "urn": f"urn:cite2:hmt:vaimg.2017a:VA012RN_00{idx}",
+        "data": {"label": f"Folio {idx}"},
+        "canvas_url": f"https://example.com/canvas/{idx}",
+        "image_url": f"https://example.com/image/{idx}",
+        "references": [f"{VERSION_URN}{ref}" for ref in refs],
+        "regions_of_interest": rois,
+    }
+
+
+ANNOTATIONS = [
+    _annotation(
+        12,
+        # NOTE: References are linked in path order, regardless of their order
+        # within the annotation
+        ["2", "1"],
+        [_roi("0.1,0.2,0.3,0.4", ["1.2", "1.1"]), _roi("0.5,0.6,0.7,0.8", ["2.1"])],
+    ),
+    _annotation(13, ["3.2"], []),
+]
+
+
+def _get_through_values(through_model, source_field_name, source_id):
+    queryset = through_model.objects.filter(**{source_field_name: source_id})
+    return list(queryset.order_by("sort_value").values_list("node__ref", "sort_value"))
+
+
+def _get_text_part_refs(obj):
+    return [text_part.ref for text_part in obj.text_parts.all()]
+
+
+def _import(tmp_path, monkeypatch, reset=True):
+    (tmp_path / "annotations.json").write_text(json.dumps(ANNOTATIONS))
+    monkeypatch.setattr(image_annotations, "ANNOTATIONS_DATA_PATH", str(tmp_path))
+    image_annotations.import_image_annotations(reset=reset)
+
+
+@pytest.mark.django_db
+def test_import_image_annotations(tmp_path, monkeypatch):
+    _create_version()
+    # NOTE: Existing annotations and ROIs are left as is when `reset` is False,
+    # and only newly created objects are linked to text parts
+    existing = ImageAnnotation.objects.create(idx=0, urn="urn:existing")
+    existing_roi = ImageROI.objects.create(
+        image_annotation=existing, image_identifier="existing", coordinates_value=""
+    )
+
+    _import(tmp_path, monkeypatch, reset=False)
+
+    assert _get_text_part_refs(existing) == []
+    assert _get_text_part_refs(existing_roi) == []
+
+    first, second = ImageAnnotation.objects.exclude(pk=existing.pk).order_by("idx")
+    assert (first.idx, first.urn) == (0, ANNOTATIONS[0]["urn"])
+    assert (second.idx, second.urn) == (1, ANNOTATIONS[1]["urn"])
+    assert first.image_identifier == "https://example.com/image/12"
+    assert first.canvas_identifier == "https://example.com/canvas/12"
+
+    # NOTE: Annotations are expanded to the descendants of their references
+    through_model = image_annotations.ImageAnnotationThroughModel
+    assert _get_through_values(through_model, "imageannotation", first.pk) == [
+        ("1", 1),
+        ("1.1", 2),
+        ("1.2", 3),
+        ("2", 4),
+        ("2.1", 5),
+        ("2.2", 6),
+    ]
+    assert _get_text_part_refs(second) == ["3.2"]
+
+    rois = list(first.roi.order_by("pk"))
+    assert [(roi.image_identifier, roi.coordinates_value) for roi in rois] == [
+        ("https://example.com/image/12", "0.1,0.2,0.3,0.4"),
+        ("https://example.com/image/12", "0.5,0.6,0.7,0.8"),
+    ]
+    through_model = image_annotations.ImageROIThroughModel
+    assert _get_through_values(through_model, "imageroi", rois[0].pk) == [
+        ("1.1", 1),
+        ("1.2", 2),
+    ]
+    assert _get_text_part_refs(rois[1]) == ["2.1"]
+    assert not second.roi.exists()
+
+
+@pytest.mark.django_db
+def test_import_image_annotations_without_expanding_refs(
+    tmp_path, monkeypatch, settings
+):
+    settings.SV_ATLAS_EXPAND_IMAGE_ANNOTATION_REFS = False
+    _create_version()
+
+    _import(tmp_path, monkeypatch)
+
+    first, second = ImageAnnotation.objects.order_by("idx")
+    assert _get_text_part_refs(first) == ["1", "2"]
+    assert _get_text_part_refs(second) == ["3.2"]
+    assert [_get_text_part_refs(roi) for roi in first.roi.order_by("pk")] == [
+        ["1.1", "1.2"],
+        ["2.1"],
+    ]
+
+
+def test_get_descendants(monkeypatch):
+    index = {
+        "0001": [
+            ("0001", 1),
+            ("00010001", 2),
+            ("000100010001", 3),
+            ("000100010002", 4),
+            ("00010002", 5),
+            ("000100020001", 6),
+        ]
+    }
+    monkeypatch.setattr(image_annotations, "VERSION_DEPTH", 1)
+    assert image_annotations._get_descendants(index, "00010001") == [
+        (3, "000100010001"),
+        (4, "000100010002"),
+    ]
+    assert image_annotations._get_descendants(index, "000100020001") == []
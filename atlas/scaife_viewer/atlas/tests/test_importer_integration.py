@@ -4,7 +4,12 @@ from unittest import mock
 import pytest
 from treebeard.exceptions import PathOverflow
 
-from scaife_viewer.atlas.importers.versions import CTSImporter
+from scaife_viewer.atlas.importers.versions import (
+    CTSImporter,
+    import_versions,
+    import_versions_incremental,
+    import_versions_parallel,
+)
 from scaife_viewer.atlas.models import Node
 from scaife_viewer.atlas.resolvers.common import Library
 from scaife_viewer.atlas.tests import constants
@@ -98,3 +103,119 @@ def test_importer_with_exemplar(mock_open):
     assert all(
         line.urn == f"{exemplar_urn}{1}.{idx}" for idx, line in enumerate(lines, 1)
     )
+
+
+def _get_numchild_values():
+    return [
+        (node.urn, node.numchild, node.get_children().count())
+        for node in Node.objects.all()
+    ]
+
+
+def _get_streaming_library():
+    library_ = copy.deepcopy(library)
+    odyssey = library_.works["urn:cts:greekLit:tlg0012.tlg002:"]
+    odyssey["title"] = odyssey.pop("label")
+    return library_
+
+
+@pytest.mark.django_db
+@mock.patch("scaife_viewer.atlas.importers.versions.hookset")
+@mock.patch(
+    "scaife_viewer.atlas.importers.versions.open",
+    new_callable=mock.mock_open,
+    read_data=constants.PASSAGE,
+)
+def test_import_versions_flush_threshold(mock_open, mock_hookset):
+    mock_hookset.resolve_library.return_value = _get_streaming_library()
+    mock_hookset.get_importer_class.return_value = CTSImporter
+    fields = ["urn", "path", "depth", "idx"]
+
+    import_versions()
+    expected = list(Node.objects.values_list(*fields))
+    Node.objects.all().delete()
+
+    import_versions(flush_threshold=1)
+    assert list(Node.objects.values_list(*fields)) == expected
+    assert all(numchild == count for _, numchild, count in _get_numchild_values())
+    assert Node.objects.filter(kind="version").count() == 2
+    assert Node.objects.filter(kind="line").count() == 14
+
+
+@pytest.mark.django_db
+@mock.patch("scaife_viewer.atlas.importers.versions.hookset")
+@mock.patch(
+    "scaife_viewer.atlas.importers.versions.open",
+    new_callable=mock.mock_open,
+    read_data=constants.PASSAGE,
+)
+def test_import_versions_parallel(mock_open, mock_hookset):
+    mock_hookset.resolve_library.return_value = _get_streaming_library()
+    mock_hookset.get_importer_class.return_value = CTSImporter
+    fields = ["urn", "path", "depth", "idx", "ref", "rank", "text_content"]
+
+    import_versions()
+    expected = list(Node.objects.values_list(*fields))
+    Node.objects.all().delete()
+
+    import_versions_parallel()
+    assert list(Node.objects.values_list(*fields)) == expected
+    assert all(numchild == count for _, numchild, count in _get_numchild_values())
+
+
+@pytest.mark.django_db
+@mock.patch("scaife_viewer.atlas.importers.versions.hookset")
+@mock.patch(
+    "scaife_viewer.atlas.importers.versions.open",
+    new_callable=mock.mock_open,
+    read_data=constants.PASSAGE,
+)
+def test_import_versions_incremental(mock_open, mock_hookset):
+    library_ = _get_streaming_library()
+    mock_hookset.resolve_library.return_value = library_
+    mock_hookset.get_importer_class.return_value = CTSImporter
+    iliad_urn = "urn:cts:greekLit:tlg0012.tlg001.perseus-grc2:"
+    odyssey_urn = "urn:cts:greekLit:tlg0012.tlg002.perseus-grc2:"
+
+    assert sorted(import_versions_incremental(reset=True)) == [iliad_urn, odyssey_urn]
+    iliad_ids = set(Node.objects.filter(urn__startswith=iliad_urn).values_list("id"))
+
+    assert import_versions_incremental() == []
+
+    library_.versions[odyssey_urn]["label"][0]["value"] = "Odyssey (revised)"
+    assert import_versions_incremental() == [odyssey_urn]
+    assert (
+        set(Node.objects.filter(urn__startswith=iliad_urn).values_list("id"))
+        == iliad_ids
+    )
+    odyssey = Node.objects.get(urn=odyssey_urn)
+    assert odyssey.metadata["label"] == "Odyssey (revised)"
+    assert odyssey.get_descendants().filter(kind="line").count() == 7
+
+    del library_.versions[odyssey_urn]
+    assert import_versions_incremental() == [odyssey_urn]
+    assert not Node.objects.filter(urn__startswith=odyssey_urn).exists()
+    assert all(numchild == count for _, numchild, count in _get_numchild_values())
+
+
+@pytest.mark.django_db
+@mock.patch("scaife_viewer.atlas.importers.versions.hookset")
+@mock.patch(
+    "scaife_viewer.atlas.importers.versions.open",
+    new_callable=mock.mock_open,
+    read_data=constants.PASSAGE,
+)
+def test_import_versions_numchild(mock_open, mock_hookset, django_assert_num_queries):
+    mock_hookset.resolve_library.return_value = _get_streaming_library()
+    mock_hookset.get_importer_class.return_value = CTSImporter
+
+    import_versions()
+
+    values = _get_numchild_values()
+    assert all(numchild == count for _, numchild, count in values)
+    work = Node.objects.get(urn="urn:cts:greekLit:tlg0012.tlg001:")
+    assert work.numchild == 1
+    line = Node.objects.get(urn="urn:cts:greekLit:tlg0012.tlg001.perseus-grc2:1.1")
+    assert line.is_leaf()
+    with django_assert_num_queries(0):
+        assert list(line.get_children()) == []
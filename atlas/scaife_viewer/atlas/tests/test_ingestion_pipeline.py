@@ -0,0 +1,308 @@
+import concurrent.futures
+import multiprocessing
+import threading
+from io import StringIO
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.signals import connection_created
+
+from scaife_viewer.atlas.ingestion_pipeline import (
+    get_stages,
+    run_ingestion_pipeline,
+    stage_inputs,
+)
+from scaife_viewer.atlas import utils
+from scaife_viewer.atlas.models import Node, TextAnnotation
+
+
+MODULE = "scaife_viewer.atlas.tests.test_ingestion_pipeline"
+CALLS = []
+INDEXES = set()
+VERSIONS_STARTED = threading.Event()
+ANNOTATIONS_CREATED = threading.Event()
+PARSING = {"scholia": threading.Event(), "syntax-trees": threading.Event()}
+INPUT_PATHS = []
+
+
+def import_versions(reset=False):
+    VERSIONS_STARTED.set()
+    CALLS.append("import_versions")
+
+
+def import_dictionaries(reset=False):
+    # NOTE: Runs alongside `import_versions`
+    assert VERSIONS_STARTED.wait(timeout=5)
+    CALLS.append("import_dictionaries")
+
+
+def apply_token_annotations(reset=False):
+    CALLS.append("apply_token_annotations")
+
+
+def get_token_annotation_indexes():
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT name FROM sqlite_master
+            WHERE type = 'index' AND tbl_name = 'scaife_viewer_atlas_tokenannotation'
+            """
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def read_indexes(reset=False):
+    INDEXES.update(get_token_annotation_indexes())
+
+
+def fail_with_indexes(reset=False):
+    read_indexes()
+    raise ValueError("Invalid annotations")
+
+
+def create_annotations(kind):
+    from scaife_viewer.atlas.models import Node, TextAnnotation
+
+    version = Node.objects.get(kind="version")
+    for idx in range(25):
+        annotation = TextAnnotation.objects.create(kind=kind, idx=idx, data={})
+        annotation.urn = f"urn:{kind}:{idx}"
+        annotation.save()
+        annotation.text_parts.set([version])
+    TextAnnotation.objects.filter(kind=kind, idx__gte=20).delete()
+
+
+def create_scholia(reset=False):
+    create_annotations("scholia")
+
+
+def create_syntax_trees(reset=False):
+    create_annotations("syntax-trees")
+    ANNOTATIONS_CREATED.set()
+
+
+def parse_annotations(reset=False):
+    from scaife_viewer.atlas.models import Node
+
+    assert Node.objects.exists()
+    # NOTE: Other stages can use the database while this stage is parsing
+    assert ANNOTATIONS_CREATED.wait(timeout=5)
+    assert Node.objects.exists()
+
+
+def parse_and_create_annotations(kind, other_kind):
+    from scaife_viewer.atlas.models import TextAnnotation
+
+    TextAnnotation.objects.create(kind=kind, idx=0, data={})
+    # NOTE: Both stages must be parsing at the same time
+    PARSING[kind].set()
+    assert PARSING[other_kind].wait(timeout=5)
+    TextAnnotation.objects.create(kind=kind, idx=1, data={})
+
+
+def parse_scholia(reset=False):
+    parse_and_create_annotations("scholia", "syntax-trees")
+
+
+def parse_syntax_trees(reset=False):
+    parse_and_create_annotations("syntax-trees", "scholia")
+
+
+def acquire_db_write_lock():
+    return utils.DB_WRITE_LOCK.acquire(timeout=5)
+
+
+@stage_inputs(lambda: INPUT_PATHS)
+def import_annotations(reset=False):
+    CALLS.append("import_annotations")
+
+
+def set_read_uncommitted(sender, connection, **kwargs):
+    connection.cursor().execute("PRAGMA read_uncommitted=ON;")
+
+
+@pytest.fixture
+def read_uncommitted():
+    # NOTE: Django's in-memory test database uses a shared cache, where reads
+    # lock tables and writes from other connections fail (rather than wait,
+    # as they do with the database files built by `prepare_atlas_db`)
+    connection_created.connect(set_read_uncommitted)
+    yield
+    connection_created.disconnect(set_read_uncommitted)
+
+
+@pytest.fixture
+def calls():
+    CALLS.clear()
+    VERSIONS_STARTED.clear()
+    yield CALLS
+
+
+def test_get_stages_defaults_to_previous_stage():
+    stages = get_stages(
+        [
+            f"{MODULE}.import_versions",
+            f"{MODULE}.apply_token_annotations",
+            (f"{MODULE}.import_dictionaries", []),
+        ]
+    )
+    assert [stage.depends_on for stage in stages] == [
+        [],
+        [f"{MODULE}.import_versions"],
+        [],
+    ]
+
+
+def test_get_stages_requires_dependencies_listed_first():
+    with pytest.raises(ImproperlyConfigured):
+        get_stages(
+            [
+                (f"{MODULE}.apply_token_annotations", [f"{MODULE}.import_versions"]),
+                f"{MODULE}.import_versions",
+            ]
+        )
+
+
+def test_run_ingestion_pipeline(settings, calls):
+    settings.SV_ATLAS_INGESTION_PIPELINE = [
+        f"{MODULE}.import_versions",
+        (f"{MODULE}.import_dictionaries", []),
+        (f"{MODULE}.apply_token_annotations", [f"{MODULE}.import_versions"]),
+    ]
+    settings.SV_ATLAS_INGESTION_PIPELINE_CONCURRENCY = 2
+    outf = StringIO()
+    run_ingestion_pipeline(outf)
+
+    assert calls.index("import_versions") < calls.index("apply_token_annotations")
+    assert sorted(calls) == [
+        "apply_token_annotations",
+        "import_dictionaries",
+        "import_versions",
+    ]
+    output = outf.getvalue()
+    assert f"--[{MODULE}.apply_token_annotations completed in" in output
+    assert output.endswith("s]--")
+    assert "--[Ingestion pipeline completed in" in output
+
+
+@pytest.mark.django_db(transaction=True)
+def test_run_ingestion_pipeline_defer_indexes(settings):
+    settings.SV_ATLAS_INGESTION_PIPELINE = [f"{MODULE}.read_indexes"]
+    settings.SV_ATLAS_INGESTION_DEFERRED_INDEX_MODELS = [
+        "scaife_viewer_atlas.TokenAnnotation"
+    ]
+    expected = get_token_annotation_indexes()
+    assert expected
+
+    INDEXES.clear()
+    outf = StringIO()
+    run_ingestion_pipeline(outf, defer_indexes=True)
+
+    assert INDEXES == set()
+    assert get_token_annotation_indexes() == expected
+    assert f"--[Recreating {len(expected)} secondary indexes]--" in outf.getvalue()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_run_ingestion_pipeline_defer_indexes_failed_stage(settings):
+    settings.SV_ATLAS_INGESTION_PIPELINE = [f"{MODULE}.fail_with_indexes"]
+    settings.SV_ATLAS_INGESTION_DEFERRED_INDEX_MODELS = [
+        "scaife_viewer_atlas.TokenAnnotation"
+    ]
+    expected = get_token_annotation_indexes()
+
+    INDEXES.clear()
+    with pytest.raises(ValueError, match="Invalid annotations"):
+        run_ingestion_pipeline(StringIO(), defer_indexes=True)
+
+    assert INDEXES == set()
+    assert get_token_annotation_indexes() == expected
+
+
+@pytest.mark.django_db
+def test_run_ingestion_pipeline_incremental(settings, calls, tmp_path):
+    input_path = tmp_path / "annotations.csv"
+    input_path.write_text("a,b")
+    INPUT_PATHS[:] = [input_path]
+    settings.SV_ATLAS_INGESTION_PIPELINE = [
+        f"{MODULE}.import_versions",
+        (f"{MODULE}.import_annotations", []),
+        f"{MODULE}.apply_token_annotations",
+    ]
+
+    run_ingestion_pipeline(StringIO(), incremental=True)
+    assert calls == ["import_versions", "import_annotations", "apply_token_annotations"]
+
+    calls.clear()
+    outf = StringIO()
+    run_ingestion_pipeline(outf, incremental=True)
+    # NOTE: Stages without declared inputs are always re-ran
+    assert calls == ["import_versions", "apply_token_annotations"]
+    assert f"--[{MODULE}.import_annotations inputs unchanged; skipping]--" in (
+        outf.getvalue()
+    )
+
+    calls.clear()
+    input_path.write_text("a,b,c")
+    run_ingestion_pipeline(StringIO(), incremental=True)
+    assert "import_annotations" in calls
+
+
+@pytest.mark.django_db(transaction=True)
+def test_run_ingestion_pipeline_concurrent_writes(settings, read_uncommitted):
+    ANNOTATIONS_CREATED.clear()
+    Node.add_root(urn="urn:cts:greekLit:tlg0012.tlg001.perseus-grc2:", kind="version")
+    settings.SV_ATLAS_INGESTION_PIPELINE = [
+        f"{MODULE}.parse_annotations",
+        (f"{MODULE}.create_scholia", []),
+        (f"{MODULE}.create_syntax_trees", []),
+    ]
+    settings.SV_ATLAS_INGESTION_PIPELINE_CONCURRENCY = 3
+    run_ingestion_pipeline(StringIO())
+
+    for kind in ["scholia", "syntax-trees"]:
+        annotations = TextAnnotation.objects.filter(kind=kind)
+        assert annotations.count() == 20
+        assert annotations.filter(urn__startswith=f"urn:{kind}:").count() == 20
+        assert annotations.filter(text_parts__isnull=False).count() == 20
+
+
+@pytest.mark.django_db(transaction=True)
+def test_run_ingestion_pipeline_concurrent_parsing(settings, read_uncommitted):
+    for event in PARSING.values():
+        event.clear()
+    settings.SV_ATLAS_INGESTION_PIPELINE = [
+        f"{MODULE}.parse_scholia",
+        (f"{MODULE}.parse_syntax_trees", []),
+    ]
+    settings.SV_ATLAS_INGESTION_PIPELINE_CONCURRENCY = 2
+    run_ingestion_pipeline(StringIO())
+
+    for kind in ["scholia", "syntax-trees"]:
+        assert TextAnnotation.objects.filter(kind=kind).count() == 2
+
+
+def test_db_write_lock_forked_worker():
+    locked = threading.Event()
+    unlock = threading.Event()
+
+    def hold_lock():
+        with utils.DB_WRITE_LOCK:
+            locked.set()
+            unlock.wait(timeout=10)
+
+    thread = threading.Thread(target=hold_lock)
+    thread.start()
+    try:
+        assert locked.wait(timeout=5)
+        context = multiprocessing.get_context("fork")
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=1, mp_context=context
+        ) as executor:
+            # NOTE: The lock is held by another thread when the worker is forked
+            assert executor.submit(acquire_db_write_lock).result()
+    finally:
+        unlock.set()
+        thread.join()
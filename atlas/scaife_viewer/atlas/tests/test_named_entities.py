@@ -0,0 +1,137 @@
+import pytest
+import yaml
+
+from scaife_viewer.atlas.importers import named_entities
+from scaife_viewer.atlas.models import NamedEntity, NamedEntityCollection, Node, Token
+
+
+VERSION_URN = "urn:cts:greekLit:tlg0012.tlg001.perseus-grc2:"
+
+ACHILLES = "urn:cite2:exploreHomer:entities.v1:1"
+PELEUS = "urn:cite2:exploreHomer:entities.v1:2"
+TROY = "urn:cite2:exploreHomer:entities.v1:3"
+
+
+def _entity(urn, title, kind="person"):
+    return {
+        "urn": urn,
+        "title": title,
+        "description": f"{title} description",
+        "url": f"https://example.com/{title}",
+        "kind": kind,
+    }
+
+
+COLLECTIONS = {
+    "people.yml": {
+        "label": "People",
+        "urn": "urn:cite2:exploreHomer:named_entity_collection.v1:people",
+        "metadata": {},
+        # NOTE: Duplicate URNs within a collection are only created once
+        "entities": [
+            _entity(ACHILLES, "Achilles"),
+            _entity(PELEUS, "Peleus"),
+            _entity(ACHILLES, "Achilles (duplicate)"),
+        ],
+    },
+    "places.yaml": {
+        "label": "Places",
+        "urn": "urn:cite2:exploreHomer:named_entity_collection.v1:places",
+        "metadata": {"attributions": []},
+        # NOTE: Entities that already exist are re-used
+        "entities": [_entity(TROY, "Troy", kind="place"), _entity(PELEUS, "Peleus")],
+    },
+}
+
+STANDOFF_HEADER = "named_entity_urn,ref,token_position"
+
+
+def _create_version():
+    version = Node.add_root(urn=VERSION_URN, kind="version")
+    for ref in ["1.1", "1.2"]:
+        line = version.add_child(urn=f"{VERSION_URN}{ref}", kind="line", ref=ref)
+        for position in range(1, 4):
+            Token.objects.create(
+                text_part=line, value=f"{ref}.t{position}", position=position, idx=0
+            )
+
+
+def _write_data(tmp_path, monkeypatch, standoff):
+    collections_dir = tmp_path / "collections"
+    standoff_dir = tmp_path / "standoff"
+    collections_dir.mkdir()
+    standoff_dir.mkdir()
+    for name, data in COLLECTIONS.items():
+        (collections_dir / name).write_text(yaml.safe_dump(data))
+    for name, rows in standoff.items():
+        lines = [STANDOFF_HEADER] + [",".join(map(str, row)) for row in rows]
+        (standoff_dir / name).write_text("\n".join(lines))
+    monkeypatch.setattr(named_entities, "COLLECTIONS_DIR", str(collections_dir))
+    monkeypatch.setattr(named_entities, "STANDOFF_DIR", str(standoff_dir))
+
+
+def _get_token_links():
+    links = {}
+    for entity in NamedEntity.objects.order_by("urn"):
+        links[entity.urn] = [
+            f"{token.text_part.ref}.t{token.position}"
+            for token in entity.tokens.order_by("text_part__ref", "position")
+        ]
+    return links
+
+
+@pytest.mark.django_db
+def test_apply_named_entities(tmp_path, monkeypatch):
+    _create_version()
+    standoff = {
+        "book-1.csv": [
+            (ACHILLES, f"{VERSION_URN}1.1", 1),
+            (PELEUS, f"{VERSION_URN}1.1", 3),
+            # NOTE: Duplicate through rows within a file are inserted once
+            (ACHILLES, f"{VERSION_URN}1.1", 1),
+            (TROY, f"{VERSION_URN}1.2", 2),
+            # NOTE: Positions without a token are skipped
+            (TROY, f"{VERSION_URN}1.2", 9),
+        ],
+        # NOTE: Through rows that were inserted from another file are ignored
+        "book-1-revised.csv": [
+            (ACHILLES, f"{VERSION_URN}1.1", 1),
+            (ACHILLES, f"{VERSION_URN}1.2", 1),
+        ],
+    }
+    _write_data(tmp_path, monkeypatch, standoff)
+
+    named_entities.apply_named_entities(reset=True)
+
+    assert NamedEntityCollection.objects.count() == 2
+    entities = {
+        entity.urn: (entity.title, entity.kind, entity.collection.label)
+        for entity in NamedEntity.objects.select_related("collection")
+    }
+    # NOTE: Peleus belongs to whichever collection was loaded first
+    assert entities.pop(PELEUS)[:2] == ("Peleus", "person")
+    assert entities == {
+        ACHILLES: ("Achilles", "person", "People"),
+        TROY: ("Troy", "place", "Places"),
+    }
+    assert _get_token_links() == {
+        ACHILLES: ["1.1.t1", "1.2.t1"],
+        PELEUS: ["1.1.t3"],
+        TROY: ["1.2.t2"],
+    }
+    assert NamedEntity.tokens.through.objects.count() == 4
+
+    # NOTE: Re-importing with `reset` replaces the existing entities
+    named_entities.apply_named_entities(reset=True)
+    assert NamedEntity.objects.count() == 3
+    assert NamedEntity.tokens.through.objects.count() == 4
+
+
+@pytest.mark.django_db
+def test_apply_named_entities_missing_ref(tmp_path, monkeypatch):
+    _create_version()
+    standoff = {"book-1.csv": [(ACHILLES, f"{VERSION_URN}1.9", 1)]}
+    _write_data(tmp_path, monkeypatch, standoff)
+
+    with pytest.raises(Node.DoesNotExist, match=f"{VERSION_URN}1.9"):
+        named_entities.apply_named_entities(reset=True)
@@ -0,0 +1,161 @@
+import graphene
+import pytest
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from scaife_viewer.atlas.models import Node, TextAlignmentRecord, Token
+from scaife_viewer.atlas.pagination import get_keyset_ordering
+from scaife_viewer.atlas.schema import Query
+
+
+VERSION_URN = "urn:cts:greekLit:tlg0012.tlg001.perseus-grc2:"
+
+schema = graphene.Schema(query=Query)
+
+
+@pytest.fixture
+def keyset_pagination(settings):
+    settings.SV_ATLAS_KEYSET_PAGINATION = True
+
+
+def _execute(query, **variables):
+    request = RequestFactory().get("/graphql/")
+    with CaptureQueriesContext(connection) as context:
+        result = schema.execute(query, context_value=request, variable_values=variables)
+    return result, context.captured_queries
+
+
+def _create_tokens():
+    version = Node.add_root(urn=VERSION_URN, kind="version")
+    for pos in range(1, 6):
+        line = version.add_child(
+            urn=f"{VERSION_URN}1.{pos}", kind="line", ref=f"1.{pos}", rank=1, idx=pos
+        )
+        for idx in range(5):
+            Token.objects.create(
+                text_part=line, value=f"{pos}.{idx}", position=idx + 1, idx=idx
+            )
+    return version
+
+
+TOKENS_QUERY = """
+query ($first: Int, $after: String, $last: Int, $before: String) {
+    tokens(
+        textPart_Urn_Startswith: "%s",
+        first: $first,
+        after: $after,
+        last: $last,
+        before: $before
+    ) {
+        edges { node { value } }
+        pageInfo { hasNextPage hasPreviousPage startCursor endCursor }
+    }
+}
+""" % (
+    VERSION_URN
+)
+
+
+def _get_values(result):
+    return [e["node"]["value"] for e in result.data["tokens"]["edges"]]
+
+
+def _page_forwards(**kwargs):
+    values = []
+    query_counts = []
+    after = None
+    while True:
+        result, queries = _execute(TOKENS_QUERY, after=after, **kwargs)
+        assert not result.errors, result.errors
+        values.extend(_get_values(result))
+        query_counts.append(len(queries))
+        page_info = result.data["tokens"]["pageInfo"]
+        if not page_info["hasNextPage"]:
+            return values, query_counts
+        after = page_info["endCursor"]
+
+
+@pytest.mark.django_db
+def test_keyset_pagination_matches_offset_pagination(keyset_pagination, settings):
+    _create_tokens()
+
+    values, query_counts = _page_forwards(first=4)
+    assert set(query_counts) == {1}
+    assert len(values) == 25
+
+    settings.SV_ATLAS_KEYSET_PAGINATION = False
+    assert _page_forwards(first=4)[0] == values
+
+
+@pytest.mark.django_db
+def test_keyset_pagination_backwards(keyset_pagination):
+    _create_tokens()
+    expected = list(Token.objects.order_by("pk").values_list("value", flat=True))
+
+    values = []
+    before = None
+    while True:
+        result, _ = _execute(TOKENS_QUERY, last=7, before=before)
+        assert not result.errors, result.errors
+        values = _get_values(result) + values
+        page_info = result.data["tokens"]["pageInfo"]
+        if not page_info["hasPreviousPage"]:
+            break
+        before = page_info["startCursor"]
+    assert values == expected
+
+    result, _ = _execute(TOKENS_QUERY, first=10, last=3)
+    assert _get_values(result) == expected[7:10]
+    assert result.data["tokens"]["pageInfo"]["hasPreviousPage"]
+
+
+@pytest.mark.django_db
+def test_keyset_pagination_invalid_cursor(keyset_pagination):
+    _create_tokens()
+    result, _ = _execute(TOKENS_QUERY, first=2, after="YXJyYXljb25uZWN0aW9uOjE=")
+    assert "Invalid cursor" in str(result.errors[0])
+
+
+TEXT_PARTS_QUERY = """
+query ($after: String) {
+    textParts(urn_Startswith: "%s", first: 2, after: $after) {
+        %s
+        edges { node { urn } }
+        pageInfo { endCursor }
+    }
+}
+"""
+
+
+@pytest.mark.django_db
+def test_keyset_pagination_total_count(keyset_pagination):
+    _create_tokens()
+
+    result, queries = _execute(TEXT_PARTS_QUERY % (VERSION_URN, ""))
+    assert not result.errors, result.errors
+    assert not any("COUNT(" in query["sql"] for query in queries)
+
+    after = result.data["textParts"]["pageInfo"]["endCursor"]
+    result, queries = _execute(
+        TEXT_PARTS_QUERY % (VERSION_URN, "totalCount"), after=after
+    )
+    assert not result.errors, result.errors
+    assert result.data["textParts"]["totalCount"] == 6
+    assert [e["node"]["urn"] for e in result.data["textParts"]["edges"]] == [
+        f"{VERSION_URN}1.2",
+        f"{VERSION_URN}1.3",
+    ]
+    assert sum("COUNT(" in query["sql"] for query in queries) == 1
+
+
+def test_get_keyset_ordering():
+    assert get_keyset_ordering(Node.objects.all()) == ["path", "id"]
+    assert get_keyset_ordering(Token.objects.all()) == ["id"]
+    assert get_keyset_ordering(TextAlignmentRecord.objects.all()) == ["idx", "id"]
+    assert get_keyset_ordering(Token.objects.order_by("-idx")) == ["-idx", "id"]
+    assert get_keyset_ordering(Token.objects.order_by("-pk")) == ["-id"]
+    # nullable, related and sliced orderings are paginated via offsets
+    assert get_keyset_ordering(Node.objects.order_by("idx")) is None
+    assert get_keyset_ordering(Token.objects.order_by("text_part__idx")) is None
+    assert get_keyset_ordering(Token.objects.all()[:10]) is None
@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import pytest
+
+from scaife_viewer.atlas.models import Node
+from scaife_viewer.atlas.passage import resolve_passage
+from scaife_viewer.atlas.schema import initialize_passage
+
+
+VERSION_URN = "urn:cts:greekLit:tlg0012.tlg001.perseus-grc2:"
+
+
+def _create_version():
+    nid = Node.add_root(urn="urn:", kind="nid")
+    namespace = nid.add_child(urn="urn:cts:", kind="namespace")
+    textgroup = namespace.add_child(urn="urn:cts:greekLit:tlg0012:", kind="textgroup")
+    work = textgroup.add_child(urn="urn:cts:greekLit:tlg0012.tlg001:", kind="work")
+    version = work.add_child(
+        urn=VERSION_URN, kind="version", metadata={"citation_scheme": ["book", "line"]}
+    )
+    for book_ref in ["1", "2"]:
+        book = version.add_child(
+            urn=f"{VERSION_URN}{book_ref}", kind="book", ref=book_ref, rank=1
+        )
+        for line in range(1, 4):
+            ref = f"{book_ref}.{line}"
+            book.add_child(urn=f"{VERSION_URN}{ref}", kind="line", ref=ref, rank=2)
+    return version
+
+
+@pytest.mark.django_db
+def test_resolve_passage(django_assert_num_queries):
+    version = _create_version()
+    passage, healed = resolve_passage(f"{VERSION_URN}1.5-2.2")
+    assert healed is True
+    assert passage.reference == f"{VERSION_URN}1.3-2.2"
+
+    with django_assert_num_queries(1):
+        passage, healed = resolve_passage(f"{VERSION_URN}1.5-2.2")
+        assert healed is True
+        assert passage.reference == f"{VERSION_URN}1.3-2.2"
+        assert passage.version == version
+        assert passage.start.urn == f"{VERSION_URN}1.3"
+        assert passage.end.urn == f"{VERSION_URN}2.2"
+        assert passage.exists()
+
+
+@pytest.mark.django_db
+def test_initialize_passage(django_assert_num_queries):
+    _create_version()
+    request = SimpleNamespace()
+    assert initialize_passage(request, f"{VERSION_URN}1.1") == f"{VERSION_URN}1.1"
+    assert not hasattr(request, "healed_passage_reference")
+    passage = request.passage
+
+    with django_assert_num_queries(0):
+        initialize_passage(request, f"{VERSION_URN}1.1")
+    assert request.passage is passage
+
+    assert initialize_passage(request, f"{VERSION_URN}2.9") == f"{VERSION_URN}2.3"
+    assert request.healed_passage_reference == f"{VERSION_URN}2.3"
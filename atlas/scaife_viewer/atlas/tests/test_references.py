@@ -0,0 +1,90 @@
+import pytest
+
+from scaife_viewer.atlas.importers.references import resolve_references_bulk
+from scaife_viewer.atlas.models import AttributionRecord, Node, TextAnnotation
+
+
+VERSION_URN = "urn:cts:greekLit:tlg0012.tlg001.perseus-grc2:"
+
+
+def _create_version():
+    version = Node.add_root(urn=VERSION_URN, kind="version")
+    for book_ref in ["1", "2"]:
+        book = version.add_child(
+            urn=f"{VERSION_URN}{book_ref}", kind="book", ref=book_ref
+        )
+        for line in ["1", "2"]:
+            ref = f"{book_ref}.{line}"
+            book.add_child(urn=f"{VERSION_URN}{ref}", kind="line", ref=ref)
+
+
+def _references(*refs):
+    return {"references": [f"{VERSION_URN}{ref}" for ref in refs]}
+
+
+ANNOTATION_DATA = [
+    # NOTE: References are linked in path order, regardless of their order
+    # within the annotation
+    _references("2.1", "1.2", "1"),
+    # NOTE: Ranges are not expanded, matching `resolve_references`
+    _references("1.1-1.2", "2.2"),
+    _references("1.9"),
+    _references(),
+    # NOTE: Annotations without references are skipped
+    {"label": "no references"},
+]
+
+
+def _create_annotations():
+    for idx, data in enumerate(ANNOTATION_DATA):
+        TextAnnotation.objects.create(idx=idx, data=data, urn=f"urn:annotation:{idx}")
+
+
+def _get_text_part_links():
+    through_model = TextAnnotation.text_parts.through
+    links = {}
+    for annotation in TextAnnotation.objects.order_by("idx"):
+        links[annotation.urn] = list(
+            through_model.objects.filter(textannotation=annotation)
+            .order_by("sort_value")
+            .values_list("node__ref", "sort_value")
+        )
+    return links
+
+
+@pytest.mark.django_db
+def test_resolve_references_bulk(caplog):
+    _create_version()
+    _create_annotations()
+
+    for annotation in TextAnnotation.objects.all():
+        annotation.resolve_references()
+    expected = _get_text_part_links()
+    TextAnnotation.text_parts.through.objects.all().delete()
+
+    resolve_references_bulk(TextAnnotation.objects.all())
+    assert _get_text_part_links() == expected
+
+    # NOTE: Sanity checks the expected links themselves
+    assert list(expected.values()) == [
+        [("1", 1), ("1.2", 2), ("2.1", 3)],
+        [("2.2", 1)],
+        [],
+        [],
+        [],
+    ]
+    unresolved = f"{VERSION_URN}1.1-1.2,{VERSION_URN}1.9"
+    assert f'unresolved_urns="{unresolved}"' in caplog.text
+
+
+@pytest.mark.django_db
+def test_resolve_references_bulk_urns():
+    _create_version()
+    AttributionRecord.objects.create(role="editor", data=_references("2", "1.1"))
+    AttributionRecord.objects.create(role="translator", data={})
+
+    resolve_references_bulk(AttributionRecord.objects.all(), field_name="urns")
+
+    editor, translator = AttributionRecord.objects.order_by("pk")
+    assert sorted(editor.urns.values_list("ref", flat=True)) == ["1.1", "2"]
+    assert not translator.urns.exists()
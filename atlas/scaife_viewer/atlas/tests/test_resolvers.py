@@ -0,0 +1,80 @@
+import json
+import os
+from unittest import mock
+
+from scaife_viewer.atlas.resolvers import default
+
+
+TEXT_GROUP = {
+    "urn": "urn:cts:greekLit:tlg0012:",
+    "node_kind": "textgroup",
+    "name": [{"lang": "eng", "value": "Homer"}],
+}
+WORK = {
+    "urn": "urn:cts:greekLit:tlg0012.tlg001:",
+    "node_kind": "work",
+    "group_urn": "urn:cts:greekLit:tlg0012:",
+    "lang": "grc",
+    "title": [{"lang": "eng", "value": "Iliad"}],
+    "versions": [{"urn": "urn:cts:greekLit:tlg0012.tlg001.perseus-grc2:"}],
+}
+
+
+def _write_library(path):
+    work_path = path / "tlg0012" / "tlg001"
+    work_path.mkdir(parents=True)
+    (path / "tlg0012" / "metadata.json").write_text(json.dumps(TEXT_GROUP))
+    (work_path / "metadata.json").write_text(json.dumps(WORK))
+    (work_path / "tlg0012.tlg001.perseus-grc2.txt").write_text("1.1 μῆνιν\n")
+    return work_path
+
+
+def test_resolve_library_manifest(settings, monkeypatch, tmp_path):
+    library_path = tmp_path / "library"
+    work_path = _write_library(library_path)
+    manifest_path = tmp_path / "library-manifest.json"
+    monkeypatch.setattr(default, "LIBRARY_DATA_PATH", str(library_path))
+    settings.SV_ATLAS_LIBRARY_MANIFEST_PATH = str(manifest_path)
+
+    library = default.resolve_library()
+    assert list(library.versions) == [WORK["versions"][0]["urn"]]
+    assert manifest_path.exists()
+
+    with mock.patch.object(default, "LibraryDataResolver") as resolver:
+        cached = default.resolve_library()
+    resolver.assert_not_called()
+    assert cached.text_groups == library.text_groups
+    assert cached.works == library.works
+    assert cached.versions == library.versions
+
+    # NOTE: Updating metadata invalidates the manifest
+    work = {
+        **WORK,
+        "versions": [
+            *WORK["versions"],
+            {"urn": "urn:cts:greekLit:tlg0012.tlg001.perseus-eng3:"},
+        ],
+    }
+    (work_path / "tlg0012.tlg001.perseus-eng3.txt").write_text("1.1 Sing\n")
+    (work_path / "metadata.json").write_text(json.dumps(work))
+    os.utime(work_path, ns=(0, 0))
+    library = default.resolve_library()
+    assert len(library.versions) == 2
+
+
+def test_resolve_library_unwritable_manifest(settings, monkeypatch, tmp_path, caplog):
+    library_path = tmp_path / "library"
+    _write_library(library_path)
+    # NOTE: The manifest cannot be renamed over a directory
+    manifest_path = tmp_path / "library-manifest.json"
+    manifest_path.mkdir()
+    monkeypatch.setattr(default, "LIBRARY_DATA_PATH", str(library_path))
+    settings.SV_ATLAS_LIBRARY_MANIFEST_PATH = str(manifest_path)
+
+    library = default.resolve_library()
+    assert list(library.versions) == [WORK["versions"][0]["urn"]]
+    assert "Could not write library manifest" in caplog.text
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "library",
+        "library-manifest.json",
+    ]
@@ -0,0 +1,41 @@
+import pytest
+
+from scaife_viewer.atlas.models import Node, Token
+from scaife_viewer.atlas.subrefs import (
+    count_subrefs_via_automaton,
+    count_subrefs_via_substrings,
+)
+
+
+TEXT_PARTS = [
+    # Iliad 1.1-1.2
+    "μῆνιν ἄειδε θεὰ Πηληϊάδεω Ἀχιλῆος οὐλομένην, ἣ μυρί᾽ Ἀχαιοῖς ἄλγε᾽ ἔθηκε,",
+    # Odyssey 1.1
+    "ἄνδρα μοι ἔννεπε, μοῦσα, πολύτροπον, ὃς μάλα πολλὰ",
+    # Aeneid 1.1
+    "Arma virumque cano, Troiae qui primus ab oris",
+    # Catullus 5.7-5.9
+    "da mi basia mille, deinde centum, dein mille altera, dein secunda centum,",
+    "a a aa aaa a — aa",
+]
+
+
+@pytest.mark.parametrize("text_content", TEXT_PARTS)
+def test_automaton_matches_substrings(text_content):
+    words = [Token.get_word_value(piece) for piece in text_content.split()]
+    assert count_subrefs_via_automaton(words) == count_subrefs_via_substrings(words)
+
+
+def test_substrings_counts_overlapping_occurrences():
+    words = ["a", "aa", "aaa", "", "a", "aa"]
+    assert count_subrefs_via_substrings(words) == [1, 1, 1, 0, 7, 4]
+
+
+@pytest.mark.parametrize("text_content", TEXT_PARTS)
+def test_tokenize_with_automaton(settings, text_content):
+    text_part = Node(ref="1.1", text_content=text_content)
+    expected = Token.tokenize(text_part, {"token_idx": 0}, as_dict=True)
+
+    settings.SV_ATLAS_TOKEN_SUBREF_COUNTER = count_subrefs_via_automaton
+    tokens = Token.tokenize(text_part, {"token_idx": 0}, as_dict=True)
+    assert tokens == expected
@@ -0,0 +1,80 @@
+import pytest
+
+from scaife_viewer.atlas.importers.tocs import build_entries, get_root_path
+from scaife_viewer.atlas.models import TOCEntry
+
+
+TOC_DATA = {
+    "@id": "urn:cite:scaife-viewer:toc.iliad-folios",
+    "title": "Iliad Folios",
+    "description": "Venetus A folios",
+    "items": [
+        {
+            "title": "Folio 12 recto",
+            "uri": "urn:cts:greekLit:tlg0012.tlg001.msA:1.1-1.25",
+            "items": [
+                {
+                    "title": "Lines 1-12",
+                    "uri": "urn:cts:greekLit:tlg0012.tlg001.msA:1.1-1.12",
+                },
+                {"uri": "urn:cts:greekLit:tlg0012.tlg001.msA:1.13-1.25"},
+            ],
+        },
+        {
+            "@id": "urn:cite:scaife-viewer:toc.iliad-folios.12v",
+            "title": "Folio 12 verso",
+            "uri": "urn:cts:greekLit:tlg0012.tlg001.msA:1.26-1.50",
+        },
+    ],
+}
+
+
+def _add_descendants(parent, children):
+    for pos, item in enumerate(children):
+        child = parent.add_child(
+            urn=item.get("@id") or f"{parent.urn}:{pos}",
+            uri=item["uri"],
+            label=item.get("title", item["uri"]),
+            description=item.get("description", ""),
+        )
+        if item.get("items"):
+            _add_descendants(child, item["items"])
+
+
+def _get_tree_values():
+    return list(
+        TOCEntry.objects.order_by("path").values_list(
+            "path", "depth", "numchild", "urn", "uri", "label", "description"
+        )
+    )
+
+
+@pytest.mark.django_db
+def test_build_entries_matches_add_child():
+    root = TOCEntry.add_root(
+        urn=TOC_DATA["@id"],
+        label=TOC_DATA["title"],
+        description=TOC_DATA["description"],
+        uri=TOC_DATA["@id"],
+    )
+    _add_descendants(root, TOC_DATA["items"])
+    expected = _get_tree_values()
+    TOCEntry.objects.all().delete()
+
+    TOCEntry.objects.bulk_create(build_entries(TOC_DATA, get_root_path()))
+    assert _get_tree_values() == expected
+    assert [e.label for e in TOCEntry.get_root_nodes()[0].get_children()] == [
+        "Folio 12 recto",
+        "Folio 12 verso",
+    ]
+
+
+@pytest.mark.django_db
+def test_get_root_path_follows_last_root():
+    TOCEntry.objects.bulk_create(build_entries(TOC_DATA, get_root_path()))
+    other = dict(TOC_DATA, **{"@id": "urn:cite:scaife-viewer:toc.other", "items": []})
+    TOCEntry.objects.bulk_create(build_entries(other, get_root_path()))
+    assert list(TOCEntry.get_root_nodes().values_list("urn", flat=True)) == [
+        TOC_DATA["@id"],
+        other["@id"],
+    ]
@@ -0,0 +1,92 @@
+import csv
+
+import pytest
+
+from scaife_viewer.atlas.importers.token_annotations import (
+    create_token_annotations,
+    iter_rows,
+)
+from scaife_viewer.atlas.models import (
+    Node,
+    Token,
+    TokenAnnotation,
+    TokenAnnotationCollection,
+)
+
+
+VERSION_URN = "urn:cts:greekLit:tlg0012.tlg001.perseus-grc2:"
+
+
+def _create_version():
+    version = Node.add_root(urn=VERSION_URN, kind="version")
+    counters = {"token_idx": 0}
+    for ref, text_content in [("1.1", "μῆνιν ἄειδε θεὰ"), ("1.2", "οὐλομένην ἣ")]:
+        text_part = version.add_child(
+            urn=f"{VERSION_URN}{ref}",
+            kind="line",
+            ref=ref,
+            rank=1,
+            text_content=text_content,
+        )
+        Token.objects.bulk_create(Token.tokenize(text_part, counters))
+    return version
+
+
+def _write_rows(tmp_path, rows):
+    path = tmp_path / "tlg0012.tlg001.perseus-grc2.csv"
+    with path.open("w", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["ve_ref", "lemma"])
+        writer.writeheader()
+        for ve_ref, lemma in rows:
+            writer.writerow({"ve_ref": ve_ref, "lemma": lemma})
+    return path
+
+
+def _get_annotations():
+    annotations = TokenAnnotation.objects.order_by("token__idx")
+    return [(a.token.ve_ref, a.data["lemma"]) for a in annotations]
+
+
+@pytest.mark.django_db
+def test_create_token_annotations(tmp_path, capsys):
+    version = _create_version()
+    path = _write_rows(
+        tmp_path,
+        [
+            ("1.2.t2", "ὅς"),
+            ("1.1.t1", "μῆνις"),
+            ("1.1.t4", "missing"),
+            ("1.3.t1", "missing"),
+            ("1.1.t3", "θεά"),
+            ("1.2.t1", "οὐλόμενος"),
+        ],
+    )
+
+    collection = TokenAnnotationCollection.objects.create(urn="urn:test:", label="")
+    count = create_token_annotations(collection, version, iter_rows(path), chunk_size=2)
+
+    assert count == 4
+    assert _get_annotations() == [
+        ("1.1.t1", "μῆνις"),
+        ("1.1.t3", "θεά"),
+        ("1.2.t1", "οὐλόμενος"),
+        ("1.2.t2", "ὅς"),
+    ]
+    output = capsys.readouterr().out
+    assert "Could not match token annotations to tokens" in output
+    assert 'count=2 ve_refs="1.3.t1,1.1.t4"' in output
+
+
+@pytest.mark.django_db
+def test_create_token_annotations_repeated_ve_ref(tmp_path):
+    version = _create_version()
+    path = _write_rows(
+        tmp_path, [("1.1.t1", "first"), ("1.1.t2", "ἀείδω"), ("1.1.t1", "μῆνις")]
+    )
+
+    collection = TokenAnnotationCollection.objects.create(urn="urn:test:", label="")
+    # NOTE: The repeated row is within a later chunk
+    count = create_token_annotations(collection, version, iter_rows(path), chunk_size=1)
+
+    assert count == 2
+    assert _get_annotations() == [("1.1.t1", "μῆνις"), ("1.1.t2", "ἀείδω")]
@@ -0,0 +1,26 @@
+import pytest
+
+from scaife_viewer.atlas.models import Node, Token
+from scaife_viewer.atlas.parallel_tokenizers import TOKEN_FIELDS, insert_token_rows
+from scaife_viewer.atlas.tests import constants
+
+
+@pytest.mark.django_db
+def test_insert_token_rows():
+    text_parts = []
+    for line in constants.PASSAGE.splitlines():
+        ref, text_content = line.strip().split(maxsplit=1)
+        text_parts.append(
+            Node.add_root(
+                kind="line", urn=f"urn:{ref}", ref=ref, text_content=text_content
+            )
+        )
+    counters = {"token_idx": 0}
+    tokens = []
+    for text_part in text_parts:
+        tokens.extend(Token.tokenize(text_part, counters, as_dict=True))
+    rows = [tuple(token[field] for field in TOKEN_FIELDS) for token in tokens]
+
+    insert_token_rows(rows, batch_size=10)
+
+    assert list(Token.objects.order_by("idx").values(*TOKEN_FIELDS)) == tokens
@@ -1,6 +1,7 @@
 import csv
 import sys
 
+from .ingestion_pipeline import incremental_stage
 from .models import Node, Token
 from .utils import get_lowest_citable_nodes
 
@@ -54,20 +55,43 @@ def tokenize_text_parts(version_exemplar_urn, force=True):
     print(f"Created {created} tokens for {version_exemplar}", file=sys.stderr)
 
 
+def get_version_exemplar_urns(reset=True):
+    """
+    Returns the URNs of version and exemplar nodes to tokenize; unless `reset`
+    is set, nodes that already have tokens are excluded
+    """
+    urns = Node.objects.filter(kind__in=["version", "exemplar"]).values_list(
+        "urn", flat=True
+    )
+    if reset:
+        return list(urns)
+    return [
+        urn
+        for urn in urns
+        if not Token.objects.filter(text_part__urn__startswith=urn).exists()
+    ]
+
+
 def tokenize_all_text_parts_serial(reset=False):
-    version_exemplar_nodes = Node.objects.filter(kind__in=["version", "exemplar"])
-    for node in version_exemplar_nodes:
-        tokenize_text_parts(node.urn, force=reset)
+    version_exemplar_urns = get_version_exemplar_urns(reset=reset)
+    for urn in version_exemplar_urns:
+        tokenize_text_parts(urn, force=reset)
+    return version_exemplar_urns
 
 
+@incremental_stage
 def tokenize_all_text_parts(reset=False):
+    """
+    Unless `reset` is set, only versions and exemplars without tokens are
+    tokenized; returns the URNs that were tokenized
+    """
     token_callable = tokenize_all_text_parts_serial
-    # TODO: We may want to make pandas an explicit dependency of ATLAS
     try:
-        print("Using parallel tokenizer via pandas.read_csv")
         from .parallel_tokenizers import (
             tokenize_all_text_parts_parallel as token_callable,
         )
+
+        print("Using parallel tokenizer")
     except ImportError:
-        print("pandas not found; falling back to serial tokenizer")
-    token_callable(reset=reset)
+        print("Parallel tokenizer unavailable; falling back to serial tokenizer")
+    return token_callable(reset=reset)
@@ -1,3 +1,5 @@
+import os
+import threading
 from itertools import islice
 
 from django.db.models import Max, Min, Q
@@ -13,6 +15,12 @@ from .constants import CTS_URN_DEPTHS
 CREATE_UPDATE_DELETE_BATCH_SIZE = 500
 QUERY_BATCH_SIZE = 2000
 
+# NOTE: Serializes writes from ingestion pipeline stages that are running
+# concurrently (see `ingestion_pipeline.run_stage`); SQLite only supports a
+# single writer at a time.
+DB_WRITE_LOCK = threading.RLock()
+_db_write_lock_state = threading.local()
+
 
 class BaseSiblingChunker:
     def __init__(self, queryset, start_idx, chunk_length, queryset_values=None):
@@ -180,12 +188,25 @@ def get_lowest_citable_nodes(version):
 
 
 def get_textparts_from_passage_reference(passage_reference, version):
+    """
+    Resolves `passage_reference` to a range of the lowest citable text parts
+    within `version`, via the version's citation index (see
+    `citation_index.get_citation_index`) rather than querying the database
+    """
+    from .citation_index import get_citation_index  # noqa; avoids circular import
+
     citation_scheme = version.metadata["citation_scheme"]
-    max_rank = len(citation_scheme)
+    lowest_citable_depth = get_lowest_citable_depth(citation_scheme)
     queryset = get_lowest_citable_nodes(version)
     _, ref = passage_reference.rsplit(":", maxsplit=1)
-    predicate = build_textpart_predicate(queryset, ref, max_rank)
-    return filter_via_ref_predicate(queryset, predicate)
+    index = get_citation_index(version)
+    idx_range = index.get_idx_range(ref, lowest_citable_depth)
+    if idx_range is None:
+        if not ref:
+            return queryset
+        # TODO: Handle SV 1 where not all text parts are ingested
+        return queryset.none()
+    return queryset.filter(idx__gte=idx_range[0], idx__lte=idx_range[1])
 
 
 def lazy_iterable(iterable):
@@ -225,7 +246,11 @@ def slice_large_list(iterable, total=None, batch_size=QUERY_BATCH_SIZE):
 
 
 def chunked_bulk_create(
-    model, iterable, total=None, batch_size=CREATE_UPDATE_DELETE_BATCH_SIZE
+    model,
+    iterable,
+    total=None,
+    batch_size=CREATE_UPDATE_DELETE_BATCH_SIZE,
+    ignore_conflicts=False,
 ):
     """
     Use islice to lazily pass subsets of the iterable for bulk creation
@@ -239,7 +264,11 @@ def chunked_bulk_create(
             subset = list(islice(generator, batch_size))
             if not subset:
                 break
-            created = len(model.objects.bulk_create(subset, batch_size=batch_size))
+            created = len(
+                model.objects.bulk_create(
+                    subset, batch_size=batch_size, ignore_conflicts=ignore_conflicts
+                )
+            )
             pbar.update(created)
 
 
@@ -251,7 +280,9 @@ def chunked_bulk_delete(queryset, batch_size=CREATE_UPDATE_DELETE_BATCH_SIZE):
     pk_values = queryset.values_list("pk", flat=True)
 
     generator = lazy_iterable(pk_values.iterator(chunk_size=batch_size))
-    with tqdm(total=total) as pbar:
+    # NOTE: The lock is held while `pk_values` is being read, as other
+    # connections cannot commit until its cursor is exhausted
+    with DB_WRITE_LOCK, tqdm(total=total) as pbar:
         while True:
             subset = list(islice(generator, batch_size))
             if not subset:
@@ -276,10 +307,50 @@ def chunked_bulk_update(
             if not subset:
                 break
             model.objects.bulk_update(subset, fields=fields, batch_size=batch_size)
-            updated = model.objects.bulk_update(
-                subset, fields=fields, batch_size=batch_size
-            )
-            pbar.update(updated)
+            pbar.update(len(subset))
+
+
+def lock_db_writes(execute, sql, params, many, context):
+    """
+    Execute wrapper that holds `DB_WRITE_LOCK` while each write is executed.
+
+    Within a transaction (e.g. a `bulk_create` batch or an `atomic()` block),
+    the lock is held from the first query until the transaction is committed,
+    so that transactions from other threads are not interleaved. Reads outside
+    of a transaction do not acquire the lock.
+    """
+    connection = context["connection"]
+    if connection.in_atomic_block:
+        if not getattr(_db_write_lock_state, "in_transaction", False):
+            DB_WRITE_LOCK.acquire()
+            _db_write_lock_state.in_transaction = True
+            connection.on_commit(release_transaction_lock)
+        return execute(sql, params, many, context)
+
+    # NOTE: Releases the lock held by a transaction that was rolled back, as
+    # callbacks registered via `on_commit` are discarded
+    release_transaction_lock()
+    if sql.lstrip()[:6].upper() == "SELECT":
+        return execute(sql, params, many, context)
+    with DB_WRITE_LOCK:
+        return execute(sql, params, many, context)
+
+
+def release_transaction_lock():
+    if getattr(_db_write_lock_state, "in_transaction", False):
+        _db_write_lock_state.in_transaction = False
+        DB_WRITE_LOCK.release()
+
+
+def _reset_db_write_lock():
+    global DB_WRITE_LOCK, _db_write_lock_state
+    DB_WRITE_LOCK = threading.RLock()
+    _db_write_lock_state = threading.local()
+
+
+# NOTE: ProcessPoolExecutor workers may be forked while another stage holds
+# the lock, which would never be released within the worker
+os.register_at_fork(after_in_child=_reset_db_write_lock)
 
 
 def get_paths_matching_predicate(path, predicate=None):